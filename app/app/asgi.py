@@ -9,8 +9,11 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+# the recipe reads run as coroutines here, see recipe.asyncviews.
+os.environ.setdefault("ASYNC_READ_VIEWS", "true")
 
+# streams the export off the event loop, see core.asgi.
 application = get_asgi_application()
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 from pathlib import Path
 import os
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -38,6 +40,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "core",
     "rest_framework",
     "rest_framework.authtoken",
@@ -47,6 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.MetricsMiddleware",
+    "core.middleware.QueryContextMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -58,6 +63,34 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "app.urls"
 
+# /metrics is only served to requests with METRICS_TOKEN as a bearer
+# token, without one only while DEBUG is on, see core.views.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# queries of a request slower than SLOW_QUERY_MS are logged with their
+# plan, for a SLOW_QUERY_SAMPLE_RATE share of them, see core.querylog.
+SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", 500))
+SLOW_QUERY_SAMPLE_RATE = float(os.environ.get("SLOW_QUERY_SAMPLE_RATE", 1.0))
+
+# the slow query log is written to stderr as JSON lines.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {"message": {"format": "%(message)s"}},
+    "handlers": {
+        "json": {"class": "logging.StreamHandler", "formatter": "message"},
+    },
+    "loggers": {
+        "core.querylog": {"handlers": ["json"], "level": "INFO", "propagate": False},
+    },
+}
+
+# serves the recipe read endpoints with async views, see
+# recipe.asyncviews. app.asgi turns it on.
+ASYNC_READ_VIEWS = os.environ.get("ASYNC_READ_VIEWS", "false").lower() in (
+    "1", "true"
+)
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -80,16 +113,89 @@ WSGI_APPLICATION = "app.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# connections come from an in-process pool, see core.db.pool, and go
+# back to it at the end of every request unless DB_CONN_MAX_AGE keeps
+# them with the thread. DB_POOL_MAX_SIZE=0 turns the pool off.
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.postgresql",
+        "ENGINE": "core.db",
         "HOST": os.environ.get("DB_HOST"),
         "NAME": os.environ.get("DB_NAME"),
         "USER": os.environ.get("DB_USER"),
         "PASSWORD": os.environ.get("DB_PASS"),
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+        "POOL": {
+            "MAX_SIZE": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            "MAX_IDLE": int(os.environ.get("DB_POOL_MAX_IDLE", 300)),
+            "TIMEOUT": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            "CHECK_INTERVAL": int(os.environ.get("DB_POOL_CHECK_INTERVAL", 10)),
+        },
     }
 }
 
+# read replicas, a comma separated list of host[:port] serving the
+# same database with the same credentials. the recipe reads go to
+# them, see core.db.router, except for a user who wrote within the
+# last DB_REPLICA_PIN_SECONDS. pointing a replica at DB_HOST gives a
+# stand-in for local runs, the tests use it as a mirror of default.
+DATABASE_REPLICAS = []
+for index, replica in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(","))
+):
+    host, _, port = replica.strip().partition(":")
+    alias = f"replica{index}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": port,
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["core.db.router.ReplicaRouter"]
+REPLICA_PIN_CACHE_ALIAS = "default"
+REPLICA_PIN_SECONDS = int(os.environ.get("DB_REPLICA_PIN_SECONDS", 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# the per-user versions and responses, the token lookups and the
+# replica pins have to be seen by every process, so CACHE_LOCATION
+# points at a shared memcached, see docker-compose.yml. local memory
+# would let each process serve what another one invalidated, it's
+# only used while DEBUG is on and nothing else is configured.
+
+CACHE_LOCATION = os.environ.get("CACHE_LOCATION", "")
+if CACHE_LOCATION:
+    CACHE_BACKEND = os.environ.get(
+        "CACHE_BACKEND", "django.core.cache.backends.memcached.PyMemcacheCache"
+    )
+elif DEBUG:
+    CACHE_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+else:
+    raise ImproperlyConfigured(
+        "CACHE_LOCATION must point at a shared cache when DEBUG is off."
+    )
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": CACHE_LOCATION,
+    }
+}
+
+RECIPE_CACHE_ALIAS = "default"
+RECIPE_CACHE_TIMEOUT = int(os.environ.get("RECIPE_CACHE_TIMEOUT", 300))
+
+AUTH_CACHE_ALIAS = "default"
+AUTH_CACHE_TIMEOUT = int(os.environ.get("AUTH_CACHE_TIMEOUT", 300))
+
+# lifetimes of the signed tokens in seconds, see user.tokens
+ACCESS_TOKEN_LIFETIME = int(os.environ.get("ACCESS_TOKEN_LIFETIME", 15 * 60))
+REFRESH_TOKEN_LIFETIME = int(
+    os.environ.get("REFRESH_TOKEN_LIFETIME", 14 * 24 * 60 * 60)
+)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -133,6 +239,23 @@ MEDIA_URL = "/static/media/"
 STATIC_ROOT = "/vol/web/static"
 MEDIA_ROOT = "/vol/web/media"
 
+# uploads are named after their content, identical files are stored
+# once, see core.storage. files no recipe uses are deleted by the
+# collect_images command once unused for IMAGE_GC_GRACE seconds.
+DEFAULT_FILE_STORAGE = "core.storage.ContentAddressedStorage"
+IMAGE_GC_GRACE = int(os.environ.get("IMAGE_GC_GRACE", 60 * 60))
+
+# worker processes resizing uploaded recipe images, with 0 the images
+# are resized in the request instead.
+IMAGE_RENDITION_WORKERS = int(os.environ.get("IMAGE_RENDITION_WORKERS", 2))
+
+# chunked image uploads are spooled here until they're complete,
+# unfinished uploads are dropped after UPLOAD_SESSION_LIFETIME seconds.
+UPLOAD_SPOOL_DIR = os.environ.get("UPLOAD_SPOOL_DIR", "/vol/web/spool")
+UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", 20 * 1024 * 1024))
+UPLOAD_MAX_CHUNK_SIZE = int(os.environ.get("UPLOAD_MAX_CHUNK_SIZE", 8 * 1024 * 1024))
+UPLOAD_SESSION_LIFETIME = int(os.environ.get("UPLOAD_SESSION_LIFETIME", 24 * 60 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -146,4 +269,4 @@ REST_FRAMEWORK = {
 
 SPECTACULAR_SETTINGS = {
     "COMPONENT_SPLIT_REQUEST": True,
-}
\ No newline at end of file
+}
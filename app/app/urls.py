@@ -23,8 +23,13 @@ from drf_spectacular.views import (
     SpectacularSwaggerView,
 )
 
+from core.storage import PREFIX
+from core.views import metrics
+from recipe.views import serve_image
+
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics", metrics, name="metrics"),
     path("api/schema/", SpectacularAPIView.as_view(), name="api-schema"),
     path(
         "api/docs/",
@@ -33,10 +38,15 @@ urlpatterns = [
     ),
     path("api/user/", include("user.urls")),
     path("api/recipe/", include("recipe.urls")),
+    path(
+        f"{settings.MEDIA_URL.lstrip('/')}{PREFIX}/<path:path>",
+        serve_image,
+        name="image",
+    ),
 ]
 
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL,
         document_root=settings.MEDIA_ROOT
-    )
\ No newline at end of file
+    )
@@ -59,3 +59,7 @@ admin.site.register(get_user_model(), UserAdmin)
 admin.site.register(models.Recipe)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
+admin.site.register(models.RevokedToken)
+admin.site.register(models.ImportCheckpoint)
+admin.site.register(models.UploadSession)
+admin.site.register(models.ImageBlob)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from core import metrics, querylog
+
+        connection_created.connect(metrics.install_wrapper)
+        connection_created.connect(querylog.install_wrapper)
+        metrics.instrument_serializers()
@@ -0,0 +1,80 @@
+"""
+ASGI handler streaming asynchronous content.
+
+Django 3.2 iterates the content of a streaming response on the event
+loop, so a stream that queries the database raises
+SynchronousOnlyOperation there. a StreamingResponse whose content is
+an async iterable as well is iterated with async for instead, as
+Django 4.2 does, so the stream can do its blocking work on a thread.
+"""
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+from django.http import StreamingHttpResponse
+
+
+class StreamingResponse(StreamingHttpResponse):
+    """
+    streaming response whose content may also be an async iterable,
+    the WSGI handler and the test client keep iterating it synchronously.
+    """
+
+    def __init__(self, streaming_content=(), *args, **kwargs):
+        super().__init__(streaming_content, *args, **kwargs)
+        self.async_content = (
+            streaming_content if hasattr(streaming_content, "__aiter__") else None
+        )
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """Django's ASGI handler, iterating async content asynchronously."""
+
+    async def send_response(self, response, send):
+        content = getattr(response, "async_content", None)
+        if content is None:
+            return await super().send_response(response, send)
+
+        await send({
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": _headers(response),
+        })
+        parts = content.__aiter__()
+        try:
+            async for part in parts:
+                for chunk, _ in self.chunk_bytes(response.make_bytes(part)):
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": True,
+                    })
+        finally:
+            # releases the stream's thread and connection when the
+            # client went away before the end.
+            if hasattr(parts, "aclose"):
+                await parts.aclose()
+        await send({"type": "http.response.body"})
+        # sends request_finished, which releases the view's connection.
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def _headers(response):
+    """returns the headers and cookies of a response as ASGI expects them."""
+    headers = [
+        (
+            header.encode("ascii") if isinstance(header, str) else bytes(header),
+            value.encode("latin1") if isinstance(value, str) else bytes(value),
+        )
+        for header, value in response.items()
+    ]
+    headers.extend(
+        (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+        for cookie in response.cookies.values()
+    )
+    return headers
+
+
+def get_asgi_application():
+    """returns the ASGI application, like django.core.asgi's."""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
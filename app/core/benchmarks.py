@@ -0,0 +1,333 @@
+"""
+Latency benchmarks of the API endpoints.
+
+every scenario is requested repeatedly through the test client with
+the real authentication, recording the latency percentiles, then a
+few more times to count its queries and trace the memory it allocates.
+results are keyed by "<scenario>@<recipes>", the number of recipes
+the benchmark user owns, so runs at several dataset sizes can be
+compared with a stored baseline, see the benchmark command.
+the throughput helpers instead drive the WSGI and ASGI applications
+with concurrent requests, see the benchmark_concurrency command.
+"""
+import asyncio
+import io
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import invalidate_user
+from user import authentication
+from user.tokens import issue_pair
+
+PERCENTILES = (50, 95, 99)
+PASSWORD = "benchmark123"
+
+
+def percentile(values, pct):
+    """returns the nearest-rank percentile of the values."""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def image_file():
+    """returns a small PNG to upload."""
+    file = io.BytesIO()
+    Image.new("RGB", (64, 64), color=(200, 120, 40)).save(file, format="PNG")
+    file.name = "benchmark.png"
+    file.seek(0)
+    return file
+
+
+class Scenario:
+    """a request to measure, the path and data are built from the context."""
+
+    def __init__(self, name, path, method="get", data=None, format=None):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.data = data
+        self.format = format
+
+    def request(self, client, context):
+        data = self.data(context) if self.data else None
+        return getattr(client, self.method)(
+            self.path.format(**context), data, format=self.format
+        )
+
+
+SCENARIOS = [
+    Scenario("recipe-list", "/api/recipe/recipes/"),
+    Scenario("recipe-detail", "/api/recipe/recipes/{recipe}/"),
+    Scenario(
+        "recipe-filter",
+        "/api/recipe/recipes/?tags={tag}&ingredients={ingredient}",
+    ),
+    Scenario("recipe-search", "/api/recipe/recipes/?search={term}"),
+    Scenario(
+        "recipe-upload-image",
+        "/api/recipe/recipes/{recipe}/upload_image/",
+        method="post",
+        data=lambda context: {"image": image_file()},
+        format="multipart",
+    ),
+    Scenario("tag-list", "/api/recipe/tags/"),
+    Scenario("ingredient-list", "/api/recipe/ingredients/"),
+    Scenario(
+        "token-create",
+        "/api/user/token/",
+        method="post",
+        data=lambda context: {"email": context["email"], "password": PASSWORD},
+    ),
+]
+
+
+def prepare(recipes):
+    """
+    seeds a user owning the given number of recipes, unless one
+    exists from an earlier run, and returns the context of the scenarios.
+    """
+    prefix = f"bench{recipes}"
+    User = get_user_model()
+    user = User.objects.filter(email__startswith=f"{prefix}-").first()
+    if user is None:
+        call_command(
+            "seed_data",
+            users=1,
+            recipes=recipes,
+            prefix=prefix,
+            password=PASSWORD,
+            stdout=StringIO(),
+        )
+        user = User.objects.get(email__startswith=f"{prefix}-")
+
+    # the cache may be shared with a database where this id is
+    # another user.
+    invalidate_user(user.pk)
+    authentication.invalidate_user(user.pk)
+
+    recipe = Recipe.objects.filter(user=user).order_by("-id").first()
+    return {
+        "user": user,
+        "email": user.email,
+        "recipe": recipe.pk if recipe else 0,
+        "tag": Tag.objects.filter(user=user).order_by("id")[0].name,
+        "ingredient": Ingredient.objects.filter(user=user).order_by("id")[0].name,
+        "term": recipe.title.split()[-1] if recipe else "soup",
+    }
+
+
+def measure(scenario, client, context, iterations, warm=False):
+    """returns the latency, queries and memory of a scenario."""
+    user_id = context["user"].pk
+
+    def request():
+        # the invalidation is a cache write, it's left out of the timing.
+        if not warm:
+            invalidate_user(user_id)
+        started = time.perf_counter()
+        response = scenario.request(client, context)
+        elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise AssertionError(
+                f"{scenario.name} failed with {response.status_code}: "
+                f"{response.content[:200]!r}"
+            )
+        return elapsed
+
+    request()
+    timings = [request() for _ in range(iterations)]
+
+    # counted right away, every request clears the query log.
+    with CaptureQueriesContext(connection) as queries:
+        request()
+    query_count = len(queries)
+
+    # traced separately, tracemalloc slows every allocation down. the
+    # lowest of a few peaks leaves out one-off allocations like caches.
+    peaks = []
+    for _ in range(3):
+        tracemalloc.start()
+        try:
+            request()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    result = {f"p{pct}": round(percentile(timings, pct), 3) for pct in PERCENTILES}
+    result["queries"] = query_count
+    result["memory_kb"] = round(min(peaks) / 1024, 1)
+    return result
+
+
+def run(sizes, iterations, scenarios=None, warm=False, progress=None):
+    """benchmarks the scenarios at every dataset size."""
+    results = {}
+    for size in sizes:
+        context = prepare(size)
+        client = APIClient()
+        token = issue_pair(context["user"])["token"]
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+
+        for scenario in SCENARIOS:
+            if scenarios and scenario.name not in scenarios:
+                continue
+            key = f"{scenario.name}@{size}"
+            results[key] = measure(scenario, client, context, iterations, warm)
+            if progress:
+                progress(key, results[key])
+
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta_ms=1.0):
+    """
+    returns the regressions of the results against the baseline.
+    latency and memory regress when they grow by more than the
+    tolerance (latency also by more than min_delta_ms, to ignore the
+    noise of very fast requests), queries regress on any increase.
+    """
+    regressions = []
+    for key, result in sorted(results.items()):
+        base = baseline.get(key)
+        if base is None:
+            continue
+
+        for metric in [f"p{pct}" for pct in PERCENTILES]:
+            if (
+                result[metric] > base[metric] * (1 + tolerance)
+                and result[metric] - base[metric] > min_delta_ms
+            ):
+                regressions.append(
+                    f"{key} {metric} {base[metric]:.1f}ms -> {result[metric]:.1f}ms"
+                )
+        if result["queries"] > base["queries"]:
+            regressions.append(
+                f"{key} queries {base['queries']} -> {result['queries']}"
+            )
+        if result["memory_kb"] > base["memory_kb"] * (1 + tolerance):
+            regressions.append(
+                f"{key} memory {base['memory_kb']:.0f}KB -> {result['memory_kb']:.0f}KB"
+            )
+
+    return regressions
+
+
+def _split(path):
+    path, _, query = path.partition("?")
+    return path, query
+
+
+def wsgi_throughput(application, path, token, concurrency, requests):
+    """
+    returns the requests per second of a WSGI application called from
+    a pool of threads, the way a threaded server calls it.
+    """
+    path, query = _split(path)
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SCRIPT_NAME": "",
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "HTTP_HOST": "localhost",
+        "HTTP_AUTHORIZATION": f"Token {token}",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+
+    def request(_):
+        statuses = []
+        body = application(
+            dict(environ, **{"wsgi.input": io.BytesIO()}),
+            lambda status, headers, exc_info=None: statuses.append(status),
+        )
+        try:
+            b"".join(body)
+        finally:
+            body.close()
+        return int(statuses[0].split()[0])
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        started = time.perf_counter()
+        statuses = list(pool.map(request, range(requests)))
+        elapsed = time.perf_counter() - started
+
+    _check(statuses)
+    return requests / elapsed
+
+
+def asgi_throughput(application, path, token, concurrency, requests):
+    """
+    returns the requests per second of an ASGI application serving
+    concurrency requests at a time on one event loop.
+    """
+    path, query = _split(path)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query.encode(),
+        "root_path": "",
+        "headers": [
+            (b"host", b"localhost"),
+            (b"authorization", f"Token {token}".encode()),
+        ],
+        "client": ("127.0.0.1", 0),
+        "server": ("localhost", 80),
+    }
+
+    async def request():
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        await application(dict(scope), receive, send)
+        return messages[0]["status"]
+
+    async def run():
+        remaining = iter(range(requests))
+        statuses = []
+
+        async def worker():
+            for _ in remaining:
+                statuses.append(await request())
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return statuses, time.perf_counter() - started
+
+    statuses, elapsed = asyncio.run(run())
+    _check(statuses)
+    return requests / elapsed
+
+
+def _check(statuses):
+    failed = [status for status in statuses if status != 200]
+    if failed:
+        raise AssertionError(f"{len(failed)} requests failed, e.g. with {failed[0]}.")
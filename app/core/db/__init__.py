@@ -0,0 +1,6 @@
+"""
+Postgres database backend with an in-process connection pool.
+
+set "ENGINE" to "core.db" and the "POOL" dict of the database to the
+pool limits, see core.db.pool. a "MAX_SIZE" of 0 turns the pool off.
+"""
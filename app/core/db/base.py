@@ -0,0 +1,84 @@
+"""
+Postgres DatabaseWrapper taking its connections from core.db.pool.
+"""
+import functools
+import time
+
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.creation import DatabaseCreation as BaseCreation
+
+from core import metrics
+from core.db import pool
+
+DEFAULT_POOL = {"MAX_SIZE": 0, "MAX_IDLE": 300, "TIMEOUT": 10, "CHECK_INTERVAL": 10}
+
+
+def connect(settings_dict, alias, conn_params):
+    """opens a connection the way the stock backend does."""
+    return base.DatabaseWrapper(settings_dict, alias).get_new_connection(conn_params)
+
+
+class DatabaseCreation(BaseCreation):
+    """drops the pooled connections before dropping the test database."""
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        pool.close_all()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    borrows a connection from the pool of its alias on connect and
+    returns it on close, Django's CONN_MAX_AGE still decides when a
+    connection is closed.
+    """
+
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+
+    def get_pool(self, conn_params):
+        """returns the pool for the connection parameters, or None."""
+        options = {**DEFAULT_POOL, **self.settings_dict.get("POOL", {})}
+        if options["MAX_SIZE"] < 1:
+            return None
+
+        return pool.get_pool(
+            self.alias,
+            repr(sorted(conn_params.items())),
+            functools.partial(connect, self.settings_dict, self.alias, conn_params),
+            options,
+        )
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        if self.pool is None:
+            return super().get_new_connection(conn_params)
+
+        started = time.perf_counter()
+        try:
+            connection = self.pool.acquire()
+        except pool.PoolTimeout:
+            metrics.POOL_TIMEOUTS.labels(self.alias).inc()
+            raise
+        finally:
+            metrics.POOL_WAIT.labels(self.alias).observe(time.perf_counter() - started)
+        isolation_level = self.settings_dict["OPTIONS"].get("isolation_level")
+        if isolation_level is not None and isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=isolation_level)
+        self.isolation_level = connection.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+
+        with self.wrap_database_errors:
+            if self.in_atomic_block:
+                # Django keeps a connection closed in a transaction around
+                # until the transaction is rolled back, it can't be shared.
+                self.pool.discard(self.connection)
+            else:
+                self.pool.release(self.connection)
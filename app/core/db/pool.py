@@ -0,0 +1,251 @@
+"""
+In-process pool of Postgres connections.
+
+a connection closed by Django goes back to the pool instead of the
+server, and the next request on any thread of the process takes it
+from there, so most requests skip the connection setup. the pool opens
+at most max_size connections, a request finding them all in use waits
+up to timeout seconds for one. connections idle for more than max_idle
+seconds are closed, and one idle for more than check_interval seconds
+is pinged before it's handed out, so a connection the server dropped
+is replaced instead of failing the request.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INERROR,
+    TRANSACTION_STATUS_INTRANS,
+)
+
+logger = logging.getLogger(__name__)
+
+# upper bounds in seconds of the wait time histogram.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    """no connection became free within the pool timeout."""
+
+
+class Pool:
+    """a bounded pool of connections opened by connect."""
+
+    def __init__(self, connect, max_size, max_idle, timeout, check_interval):
+        self.connect = connect
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self.pid = os.getpid()
+        self.retired = False
+
+        self._idle = []
+        self._size = 0
+        self._lock = threading.Condition()
+
+        self._acquired = 0
+        self._waits = 0
+        self._wait_seconds = 0.0
+        self._wait_max = 0.0
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+
+    def acquire(self):
+        """returns a healthy connection, opening one if there's room."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._lock:
+            while True:
+                self._prune()
+                if self._idle:
+                    connection, released = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    connection = None
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    logger.warning(
+                        "no database connection became free within %ss, "
+                        "all %s are in use",
+                        self.timeout,
+                        self.max_size,
+                    )
+                    raise PoolTimeout(
+                        f"no database connection became free within {self.timeout}s."
+                    )
+                self._lock.wait(remaining)
+
+            self._record(time.monotonic() - started)
+
+        if connection is not None and self._healthy(connection, released):
+            return connection
+
+        if connection is not None:
+            self._close(connection)
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            self._created += 1
+        return connection
+
+    def release(self, connection):
+        """returns a connection to the pool, or closes it if it's unusable."""
+        if self.retired or not self._reset(connection):
+            self.discard(connection)
+            return
+
+        with self._lock:
+            self._idle.append((connection, time.monotonic()))
+            self._lock.notify()
+
+    def discard(self, connection):
+        """closes a connection taken from the pool, freeing its place."""
+        self._close(connection)
+        with self._lock:
+            self._size -= 1
+            self._discarded += 1
+            self._lock.notify()
+
+    def close(self):
+        """closes the idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        """returns the size and the wait time counters of the pool."""
+        with self._lock:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "max_size": self.max_size,
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "wait_seconds_total": self._wait_seconds,
+                "wait_seconds_max": self._wait_max,
+                "wait_buckets": dict(
+                    zip(WAIT_BUCKETS + (float("inf"),), self._wait_buckets)
+                ),
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+            }
+
+    def _record(self, waited):
+        # called with the lock held.
+        self._acquired += 1
+        if waited >= WAIT_BUCKETS[0]:
+            self._waits += 1
+        self._wait_seconds += waited
+        self._wait_max = max(self._wait_max, waited)
+        self._wait_buckets[bisect.bisect_left(WAIT_BUCKETS, waited)] += 1
+
+    def _prune(self):
+        # called with the lock held, the oldest connections are first.
+        cutoff = time.monotonic() - self.max_idle
+        while self._idle and self._idle[0][1] < cutoff:
+            connection, _ = self._idle.pop(0)
+            self._size -= 1
+            self._discarded += 1
+            self._close(connection)
+
+    def _healthy(self, connection, released):
+        if connection.closed:
+            return False
+        if time.monotonic() - released < self.check_interval:
+            return True
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            connection.rollback()
+        except Exception:
+            return False
+        return True
+
+    def _reset(self, connection):
+        """ends the transaction a connection was left in, if any."""
+        if connection.closed:
+            return False
+
+        status = connection.info.transaction_status
+        if status in (TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR):
+            try:
+                connection.rollback()
+            except Exception:
+                return False
+            status = connection.info.transaction_status
+
+        return status == TRANSACTION_STATUS_IDLE
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def get_pool(alias, key, connect, options):
+    """
+    returns the pool of a database alias. a new pool replaces the old
+    one when the connection parameters changed, like when the tests
+    switch to the test database, or in a forked process.
+    """
+    with _pools_lock:
+        pool, pool_key = _pools.get(alias, (None, None))
+        if pool is not None and pool_key == key and pool.pid == os.getpid():
+            return pool
+
+        if pool is not None and pool.pid == os.getpid():
+            # connections in use are closed when they come back.
+            pool.retired = True
+            pool.close()
+        pool = Pool(
+            connect,
+            max_size=options["MAX_SIZE"],
+            max_idle=options["MAX_IDLE"],
+            timeout=options["TIMEOUT"],
+            check_interval=options["CHECK_INTERVAL"],
+        )
+        _pools[alias] = (pool, key)
+        return pool
+
+
+def close_all():
+    """closes the idle connections of every pool."""
+    with _pools_lock:
+        pools = [pool for pool, _ in _pools.values()]
+    for pool in pools:
+        pool.close()
+
+
+def stats():
+    """returns the stats of the pool of every database alias."""
+    with _pools_lock:
+        pools = {alias: pool for alias, (pool, _) in _pools.items()}
+    return {alias: pool.stats() for alias, pool in pools.items()}
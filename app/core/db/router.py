@@ -0,0 +1,59 @@
+"""
+Database router sending the recipe reads to the read replicas.
+
+only queries made while the replica_reads context variable is on go to
+a replica, everything else including every write stays on default.
+a write pins its user to default for REPLICA_PIN_SECONDS, so their
+next reads never miss what they just wrote because of replication
+lag. the pin is kept in the cache, for it to hold across processes
+that has to be a shared cache.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_KEY = "db:pin:{user_id}"
+
+replica_reads = contextvars.ContextVar("replica_reads", default=False)
+
+
+def _cache():
+    return caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+
+def pin_primary(user_id):
+    """sends the user's reads to default for the next few seconds."""
+    if settings.DATABASE_REPLICAS:
+        _cache().set(
+            PIN_KEY.format(user_id=user_id), True, settings.REPLICA_PIN_SECONDS
+        )
+
+
+def is_pinned(user_id):
+    """returns whether the user wrote too recently to read a replica."""
+    return bool(_cache().get(PIN_KEY.format(user_id=user_id)))
+
+
+class ReplicaRouter:
+    """routes reads to a random replica while replica reads are on."""
+
+    def db_for_read(self, model, **hints):
+        if replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replicas get the schema through replication.
+        return db not in settings.DATABASE_REPLICAS
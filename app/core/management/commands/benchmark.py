@@ -0,0 +1,133 @@
+"""
+Django command to benchmark the API endpoints.
+
+runs in the test database, seeded with a user per dataset size, and
+prints the latency percentiles, queries and memory of every endpoint.
+with --save-baseline the results are written to the baseline file,
+otherwise they are compared with it and the command fails when
+anything regressed or there is no baseline. the baseline is committed
+as app/benchmark-baseline.json, save it again on the machine the
+comparisons run on, latencies don't carry over between machines.
+"""
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    override_settings,
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from core import benchmarks
+
+BASELINE = os.path.join(settings.BASE_DIR, "benchmark-baseline.json")
+
+
+def parse_sizes(value):
+    """parses a comma separated list of dataset sizes."""
+    try:
+        sizes = [int(size) for size in value.split(",")]
+    except ValueError:
+        raise CommandError(f"expected comma separated numbers, got {value}.")
+    if any(size < 1 for size in sizes):
+        raise CommandError("dataset sizes have to be positive.")
+
+    return sizes
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the endpoints."""
+
+    help = "measures endpoint latency, queries and memory against a baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=parse_sizes,
+            default=[100, 1000, 10000],
+            help="comma separated numbers of recipes of the benchmark user",
+        )
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=[scenario.name for scenario in benchmarks.SCENARIOS],
+            help="only run this scenario, can be repeated",
+        )
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="keep the response cache between requests",
+        )
+        parser.add_argument("--baseline", default=BASELINE)
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="write the results to the baseline instead of comparing",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="allowed relative growth of latency and memory",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="keep the seeded test database for the next run",
+        )
+
+    def handle(self, *args, **options):
+        path = options["baseline"]
+        if not options["save_baseline"] and not os.path.exists(path):
+            raise CommandError(
+                f"no baseline at {path}, pass --save-baseline to create it."
+            )
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root
+            ):
+                results = benchmarks.run(
+                    options["sizes"],
+                    options["iterations"],
+                    scenarios=options["scenario"],
+                    warm=options["warm"],
+                    progress=self._report,
+                )
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+            teardown_test_environment()
+
+        if options["save_baseline"]:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"saved the baseline to {path}."))
+            return
+
+        with open(path) as file:
+            baseline = json.load(file)
+        regressions = benchmarks.compare(results, baseline, options["tolerance"])
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(regression)
+            raise CommandError(f"{len(regressions)} regressions against {path}.")
+
+        self.stdout.write(self.style.SUCCESS(f"no regressions against {path}."))
+
+    def _report(self, key, result):
+        self.stdout.write(
+            f"{key:<32} p50 {result['p50']:8.2f}ms  p95 {result['p95']:8.2f}ms  "
+            f"p99 {result['p99']:8.2f}ms  {result['queries']:3d} queries  "
+            f"{result['memory_kb']:9.1f}KB"
+        )
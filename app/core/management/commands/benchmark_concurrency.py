@@ -0,0 +1,177 @@
+"""
+Django command to compare the request throughput of the WSGI and ASGI
+applications.
+
+runs in the test database, seeded with a user owning the given number
+of recipes, and drives app.wsgi and app.asgi with concurrent requests
+to the recipe reads. every handler runs in its own process, the
+async views are chosen when the urls are imported.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import benchmarks
+from recipe.urls import ASYNC_READS
+from user.tokens import issue_pair
+
+HANDLERS = ("wsgi", "asgi")
+SCENARIOS = [
+    scenario for scenario in benchmarks.SCENARIOS if scenario.name in ASYNC_READS
+]
+
+
+def parse_levels(value):
+    """parses a comma separated list of concurrency levels."""
+    try:
+        levels = [int(level) for level in value.split(",")]
+    except ValueError:
+        raise CommandError(f"expected comma separated numbers, got {value}.")
+    if any(level < 1 for level in levels):
+        raise CommandError("concurrency levels have to be positive.")
+
+    return levels
+
+
+class Command(BaseCommand):
+    """Django command to benchmark the request throughput."""
+
+    help = "compares the concurrent request throughput of WSGI and ASGI."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipes",
+            type=int,
+            default=1000,
+            help="number of recipes of the benchmark user",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=parse_levels,
+            default=[1, 8, 32],
+            help="comma separated numbers of requests in flight",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=400,
+            help="requests per scenario and concurrency level",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=[scenario.name for scenario in SCENARIOS],
+            help="only run this scenario, can be repeated",
+        )
+        parser.add_argument(
+            "--warm",
+            action="store_true",
+            help="keep the response cache between requests",
+        )
+        parser.add_argument(
+            "--keepdb",
+            action="store_true",
+            help="keep the seeded test database for the next run",
+        )
+        # runs the requests of one handler, in the seeded database.
+        parser.add_argument("--worker", choices=HANDLERS, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            results = self._work(options)
+            self.stdout.write(json.dumps(results))
+            return
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options["keepdb"]
+        )
+        try:
+            benchmarks.prepare(options["recipes"])
+            results = {
+                handler: self._spawn(handler, options) for handler in HANDLERS
+            }
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options["keepdb"]
+            )
+            teardown_test_environment()
+
+        self.stdout.write(
+            f"{'scenario':<24} {'concurrency':>11} {'wsgi req/s':>11} "
+            f"{'asgi req/s':>11} {'ratio':>6}"
+        )
+        for key, wsgi in results["wsgi"].items():
+            asgi = results["asgi"][key]
+            name, level = key.rsplit("@", 1)
+            self.stdout.write(
+                f"{name:<24} {level:>11} {wsgi:11.1f} {asgi:11.1f} "
+                f"{asgi / wsgi:6.2f}"
+            )
+
+    def _spawn(self, handler, options):
+        """runs a worker process and returns its results."""
+        env = dict(
+            os.environ,
+            DB_NAME=connection.settings_dict["NAME"],
+            ASYNC_READ_VIEWS="true" if handler == "asgi" else "false",
+        )
+        if not options["warm"]:
+            env["RECIPE_CACHE_TIMEOUT"] = "0"
+
+        command = [
+            sys.executable,
+            os.path.join(settings.BASE_DIR, "manage.py"),
+            "benchmark_concurrency",
+            "--worker",
+            handler,
+            "--recipes",
+            str(options["recipes"]),
+            "--concurrency",
+            ",".join(str(level) for level in options["concurrency"]),
+            "--requests",
+            str(options["requests"]),
+        ]
+        for name in options["scenario"] or []:
+            command += ["--scenario", name]
+
+        process = subprocess.run(command, env=env, capture_output=True, text=True)
+        if process.returncode:
+            raise CommandError(f"the {handler} benchmark failed:\n{process.stderr}")
+
+        return json.loads(process.stdout.strip().splitlines()[-1])
+
+    def _work(self, options):
+        """measures the throughput of one handler."""
+        if options["worker"] == "asgi":
+            from app.asgi import application
+
+            throughput = benchmarks.asgi_throughput
+        else:
+            from app.wsgi import application
+
+            throughput = benchmarks.wsgi_throughput
+
+        context = benchmarks.prepare(options["recipes"])
+        token = issue_pair(context["user"])["token"]
+        results = {}
+        for scenario in SCENARIOS:
+            if options["scenario"] and scenario.name not in options["scenario"]:
+                continue
+            path = scenario.path.format(**context)
+            for level in options["concurrency"]:
+                # the first requests open connections and fill caches.
+                throughput(application, path, token, level, level)
+                results[f"{scenario.name}@{level}"] = round(
+                    throughput(application, path, token, level, options["requests"]),
+                    1,
+                )
+
+        return results
@@ -0,0 +1,25 @@
+"""
+Django command to delete the images no recipe uses anymore.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Django command to garbage collect images."""
+
+    help = "deletes the image files and renditions no recipe uses anymore."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=settings.IMAGE_GC_GRACE,
+            help="seconds an image has to be unused before it's deleted",
+        )
+
+    def handle(self, *args, **options):
+        deleted = images.collect(options["grace"])
+        self.stdout.write(self.style.SUCCESS(f"deleted {deleted} unused images."))
@@ -0,0 +1,296 @@
+"""
+Django command to bulk import recipes for a user.
+
+the input is JSONL or CSV with the columns of the recipe export:
+title, description, time_minutes, price, link, tags and ingredients
+(lists in JSONL, comma separated in CSV).
+each batch is copied into temporary staging tables and merged into
+the recipe, tag, ingredient and link tables with a handful of set
+based statements, then the progress is saved in an ImportCheckpoint
+in the same transaction, so a failed import resumes where it stopped.
+"""
+import csv
+import json
+import os
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.bulkload import allocate_ids, copy_rows
+from core.models import ImportCheckpoint, Ingredient, Recipe, Tag
+from recipe.cache import invalidate_user
+
+STAGING_RECIPES = "import_recipe"
+RECIPE_COLUMNS = ["title", "description", "time_minutes", "price", "link"]
+RELATIONS = (("tags", Tag), ("ingredients", Ingredient))
+
+MAX_PRICE = Decimal("1000")
+# bounds of the integer column, a value outside would fail the COPY.
+MIN_INTEGER, MAX_INTEGER = -(2**31), 2**31 - 1
+
+
+def rate(rows, seconds):
+    """returns the rows per second."""
+    return rows / seconds if seconds > 0 else 0.0
+
+
+def staging_table(relation):
+    return f"import_recipe_{relation}"
+
+
+def read_jsonl(path):
+    """yields the recipes of a JSONL file."""
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # reported as an invalid row by clean().
+                yield line
+
+
+def read_csv(path):
+    """yields the recipes of a CSV file."""
+    with open(path, encoding="utf-8", newline="") as file:
+        for row in csv.DictReader(file):
+            for relation, _ in RELATIONS:
+                row[relation] = (row.get(relation) or "").split(",")
+            yield row
+
+
+READERS = {"jsonl": read_jsonl, "csv": read_csv}
+
+
+def _names(values):
+    """returns the unique names of a tag or ingredient list."""
+    if isinstance(values, str):
+        # comma separated, as in CSV.
+        values = values.split(",")
+    elif values is not None and not isinstance(values, list):
+        raise ValueError("tags and ingredients have to be lists")
+
+    names = set()
+    for value in values or []:
+        if isinstance(value, dict):
+            value = value.get("name")
+        name = str(value or "").strip()
+        if len(name) > 255:
+            raise ValueError(f"name longer than 255 characters: {name[:20]}...")
+        if name:
+            names.add(name)
+
+    return names
+
+
+def clean(row):
+    """returns the validated fields of a row or raises ValueError."""
+    if not isinstance(row, dict):
+        raise ValueError("expected an object")
+
+    title = str(row.get("title") or "").strip()
+    if not title or len(title) > 255:
+        raise ValueError("title is required and at most 255 characters")
+
+    try:
+        time_minutes = int(row.get("time_minutes"))
+        price = Decimal(str(row.get("price"))).quantize(Decimal("0.01"))
+    except (TypeError, ValueError, InvalidOperation):
+        raise ValueError("time_minutes and price have to be numbers")
+    if not MIN_INTEGER <= time_minutes <= MAX_INTEGER:
+        raise ValueError("time_minutes is out of range")
+    if not abs(price) < MAX_PRICE:
+        raise ValueError("price has to be below 1000")
+
+    link = row.get("link") or None
+    if link is not None and len(str(link)) > 255:
+        raise ValueError("link is at most 255 characters")
+
+    fields = (title, row.get("description") or "", time_minutes, price, link)
+    relations = {relation: _names(row.get(relation)) for relation, _ in RELATIONS}
+    return fields, relations
+
+
+class Command(BaseCommand):
+    """Django command to bulk import recipes."""
+
+    help = "imports recipes from a JSONL or CSV file for a user."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="the JSONL or CSV file")
+        parser.add_argument(
+            "--user", required=True, help="email of the user owning the recipes"
+        )
+        parser.add_argument(
+            "--type",
+            choices=list(READERS),
+            help="file type, guessed from the extension by default",
+        )
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="ignore the saved progress and import from the start",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+
+        file_type = options["type"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if file_type not in READERS:
+            raise CommandError("can't tell the file type, pass --type.")
+
+        try:
+            user = get_user_model().objects.get(email=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"no user with the email {options['user']}.")
+
+        source = f"{os.path.abspath(path)}:{os.path.getsize(path)}"
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(user=user, source=source)
+        if options["restart"]:
+            checkpoint.rows_done = 0
+            checkpoint.completed = False
+            checkpoint.save()
+        elif checkpoint.completed:
+            self.stdout.write(f"{path} was already imported, pass --restart to redo it.")
+            return
+        elif checkpoint.rows_done:
+            self.stdout.write(f"resuming after row {checkpoint.rows_done}.")
+
+        rows = islice(READERS[file_type](path), checkpoint.rows_done, None)
+        self._create_staging_tables()
+        try:
+            imported, skipped, elapsed = self._import(
+                user, rows, checkpoint, options["batch_size"]
+            )
+        finally:
+            self._drop_staging_tables()
+
+        checkpoint.completed = True
+        checkpoint.save()
+        invalidate_user(user.pk)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"imported {imported} recipes in {elapsed:.1f}s "
+                f"({rate(imported, elapsed):.0f} rows/s), "
+                f"skipped {skipped} invalid rows."
+            )
+        )
+
+    def _import(self, user, rows, checkpoint, batch_size):
+        """imports the rows batch by batch, returns the totals."""
+        imported = skipped = 0
+        started = time.monotonic()
+
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            valid = []
+            for line, row in enumerate(batch, start=checkpoint.rows_done + 1):
+                try:
+                    valid.append(clean(row))
+                except ValueError as exc:
+                    skipped += 1
+                    self.stderr.write(f"row {line}: {exc}")
+
+            with transaction.atomic():
+                self._load_batch(user, valid)
+                checkpoint.rows_done += len(batch)
+                checkpoint.save()
+
+            imported += len(valid)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{checkpoint.rows_done} rows done, "
+                f"{rate(imported, elapsed):.0f} rows/s"
+            )
+
+        return imported, skipped, time.monotonic() - started
+
+    def _create_staging_tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_RECIPES} ("
+                "id bigint, title varchar(255), description text, "
+                "time_minutes integer, price numeric(5, 2), link varchar(255))"
+            )
+            for relation, _ in RELATIONS:
+                cursor.execute(
+                    f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging_table(relation)} "
+                    "(recipe_id bigint, name varchar(255))"
+                )
+
+    def _drop_staging_tables(self):
+        tables = [STAGING_RECIPES] + [staging_table(r) for r, _ in RELATIONS]
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {', '.join(tables)}")
+
+    def _load_batch(self, user, valid):
+        """copies a batch into the staging tables and merges it."""
+        ids = allocate_ids(Recipe, len(valid))
+        tables = [STAGING_RECIPES] + [staging_table(r) for r, _ in RELATIONS]
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {', '.join(tables)}")
+            copy_rows(
+                STAGING_RECIPES,
+                ["id"] + RECIPE_COLUMNS,
+                ((pk, *fields) for pk, (fields, _) in zip(ids, valid)),
+                cursor,
+            )
+            for relation, _ in RELATIONS:
+                copy_rows(
+                    staging_table(relation),
+                    ["recipe_id", "name"],
+                    (
+                        (pk, name)
+                        for pk, (_, relations) in zip(ids, valid)
+                        for name in relations[relation]
+                    ),
+                    cursor,
+                )
+
+            # temporary tables are never analyzed automatically, without
+            # statistics the planner joins the links with nested loops.
+            cursor.execute(f"ANALYZE {', '.join(tables)}")
+
+            # the unique constraint on (user, name) lets existing names
+            # be skipped instead of looked up first.
+            for relation, model in RELATIONS:
+                cursor.execute(
+                    f"INSERT INTO {model._meta.db_table} (user_id, name, updated_at) "
+                    f"SELECT DISTINCT %s, name, now() FROM {staging_table(relation)} "
+                    "ON CONFLICT (user_id, name) DO NOTHING",
+                    [user.pk],
+                )
+
+            cursor.execute(
+                f"INSERT INTO {Recipe._meta.db_table} "
+                f"(id, user_id, {', '.join(RECIPE_COLUMNS)}, updated_at, "
+                "image_renditions) "
+                f"SELECT id, %s, {', '.join(RECIPE_COLUMNS)}, now(), '{{}}' "
+                f"FROM {STAGING_RECIPES}",
+                [user.pk],
+            )
+
+            for relation, model in RELATIONS:
+                field = Recipe._meta.get_field(relation)
+                cursor.execute(
+                    f"INSERT INTO {field.remote_field.through._meta.db_table} "
+                    f"({field.m2m_column_name()}, {field.m2m_reverse_name()}) "
+                    f"SELECT DISTINCT s.recipe_id, t.id "
+                    f"FROM {staging_table(relation)} s "
+                    f"JOIN {model._meta.db_table} t "
+                    "ON t.user_id = %s AND t.name = s.name",
+                    [user.pk],
+                )
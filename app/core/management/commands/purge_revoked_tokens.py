@@ -0,0 +1,16 @@
+"""
+Django command to delete the revocations of expired tokens.
+"""
+from django.core.management.base import BaseCommand
+
+from user import tokens
+
+
+class Command(BaseCommand):
+    """Django command to purge expired token revocations."""
+
+    help = "deletes the revoked tokens that expired anyway, run it periodically."
+
+    def handle(self, *args, **options):
+        deleted = tokens.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"deleted {deleted} expired revocations."))
@@ -0,0 +1,397 @@
+"""
+Django command to seed the database with synthetic data.
+
+creates users with recipes, tags and ingredients for load and scale
+testing. everything is streamed into the tables with COPY (see
+core.bulkload) a group of users at a time, so memory is bounded by
+--users-per-batch, not by the total.
+each user gets its own random generator derived from --seed, so the
+same options always produce the same data whatever the batch size
+or the number of worker processes.
+
+recipes are copied into a staging table and moved into the recipe
+table with one statement per batch. when the database role is a
+superuser the triggers are skipped for the transaction, the foreign
+key checks included, and that statement computes the search vectors;
+the generated rows reference each other by construction, which leaves
+the database little to do beyond writing the rows and their indexes.
+otherwise the search vector trigger computes the vectors as the rows
+are inserted. no table is altered either way, so seeding takes no
+lock beyond its inserts and can run next to live traffic.
+"""
+import itertools
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.bulkload import allocate_ids, copy_rows, setup_worker
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import invalidate_user
+
+ADJECTIVES = [
+    "baked", "braised", "creamy", "crispy", "fresh", "grilled", "hearty",
+    "herbed", "honey", "lemon", "light", "roasted", "rustic", "smoky",
+    "spiced", "spicy", "steamed", "sticky", "sweet", "tangy", "warm", "zesty",
+]
+DISHES = [
+    "bowl", "bread", "burger", "casserole", "chili", "curry", "dumplings",
+    "noodles", "omelette", "pasta", "pie", "pilaf", "risotto", "salad",
+    "sandwich", "skewers", "soup", "stew", "stir fry", "tacos", "tart", "wrap",
+]
+FOODS = [
+    "apple", "basil", "beans", "beef", "broccoli", "butter", "carrot",
+    "cheese", "chicken", "chickpeas", "coconut", "corn", "cream", "egg",
+    "garlic", "ginger", "lamb", "lentils", "lime", "mushroom", "onion",
+    "paprika", "pepper", "pork", "potato", "rice", "salmon", "spinach",
+    "tofu", "tomato", "yogurt",
+]
+CATEGORIES = [
+    "breakfast", "dessert", "dinner", "gluten free", "keto", "lunch",
+    "quick", "snack", "vegan", "vegetarian", "weeknight", "party",
+]
+
+# the expression of the trigger, see migration 0010.
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('pg_catalog.english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('pg_catalog.english', coalesce(description, '')), 'B')"
+)
+STAGING_RECIPES = "seed_recipe"
+RECIPE_COLUMNS = [
+    "id", "user_id", "title", "description", "time_minutes",
+    "price", "link", "updated_at", "image_renditions",
+]
+# the options the batches are generated from.
+SEED_OPTIONS = [
+    "recipes", "recipe_skew", "tags", "ingredients", "tags_per_recipe",
+    "ingredients_per_recipe", "seed", "prefix",
+]
+
+
+def parse_range(value):
+    """parses "min-max" or a single number into a (min, max) tuple."""
+    low, _, high = value.partition("-")
+    try:
+        low = int(low)
+        high = int(high) if high else low
+    except ValueError:
+        raise CommandError(f"expected a number or a min-max range, got {value}.")
+    if not 0 <= low <= high:
+        raise CommandError(f"invalid range {value}.")
+
+    return low, high
+
+
+def names(vocabulary, count):
+    """returns count unique names, numbered once the vocabulary runs out."""
+    return [
+        vocabulary[i % len(vocabulary)]
+        + (f" {i // len(vocabulary) + 1}" if i >= len(vocabulary) else "")
+        for i in range(count)
+    ]
+
+
+def zipf_weights(count, skew):
+    """cumulative weights of a zipf distribution, skew 0 is uniform."""
+    return list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+class Command(BaseCommand):
+    """Django command to seed synthetic data."""
+
+    help = "creates users with synthetic recipes, tags and ingredients."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10)
+        parser.add_argument(
+            "--recipes", type=int, default=100, help="mean recipes per user"
+        )
+        parser.add_argument(
+            "--recipe-skew",
+            type=float,
+            default=0,
+            help="pareto shape (> 1) of recipes per user, 0 gives every "
+                 "user the mean, lower values give heavier tails",
+        )
+        parser.add_argument("--tags", type=int, default=50, help="tags per user")
+        parser.add_argument(
+            "--ingredients", type=int, default=200, help="ingredients per user"
+        )
+        parser.add_argument(
+            "--tags-per-recipe", type=parse_range, default=(0, 5), metavar="MIN-MAX"
+        )
+        parser.add_argument(
+            "--ingredients-per-recipe",
+            type=parse_range,
+            default=(2, 10),
+            metavar="MIN-MAX",
+        )
+        parser.add_argument(
+            "--popularity-skew",
+            type=float,
+            default=1.0,
+            help="zipf exponent of how often each tag and ingredient is "
+                 "used, 0 picks them uniformly",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--prefix", default="seed", help="prefix of the generated emails"
+        )
+        parser.add_argument(
+            "--password", default="password", help="password of every user"
+        )
+        parser.add_argument(
+            "--users-per-batch",
+            type=int,
+            default=100,
+            help="users written per transaction",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="processes writing batches in parallel",
+        )
+
+    def handle(self, *args, **options):
+        skew = options["recipe_skew"]
+        if skew and skew <= 1:
+            raise CommandError("--recipe-skew has to be above 1, or 0.")
+
+        User = get_user_model()
+        if User.objects.filter(email__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(
+                f"users with the prefix {options['prefix']} exist, pick another one."
+            )
+
+        if options["workers"] < 1:
+            raise CommandError("--workers has to be at least 1.")
+
+        seeder = Seeder(options)
+        batches = [
+            range(start, min(start + options["users_per_batch"], options["users"]))
+            for start in range(0, options["users"], options["users_per_batch"])
+        ]
+
+        executor = None
+        if options["workers"] > 1:
+            # spawned like the image workers, see recipe.images.
+            executor = ProcessPoolExecutor(
+                max_workers=options["workers"],
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=setup_worker,
+                initargs=(connection.settings_dict["NAME"],),
+            )
+
+        totals = dict.fromkeys(["users", "recipes", "links"], 0)
+        started = time.monotonic()
+        try:
+            results = (executor.map if executor else map)(seeder.seed, batches)
+            for counts in results:
+                for key, value in counts.items():
+                    totals[key] += value
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{totals['users']} users, {totals['recipes']} recipes, "
+                    f"{totals['links']} links, "
+                    f"{totals['recipes'] / elapsed:.0f} recipes/s"
+                )
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"seeded {totals['users']} users and {totals['recipes']} recipes "
+                f"in {time.monotonic() - started:.1f}s."
+            )
+        )
+
+
+class Seeder:
+    """
+    writes groups of users with everything they own, in the command's
+    process or in a worker process, so it only keeps picklable state.
+    """
+
+    def __init__(self, options):
+        self.options = {key: options[key] for key in SEED_OPTIONS}
+        self.now = timezone.now()
+        self.password = make_password(options["password"])
+        self.tag_weights = zipf_weights(options["tags"], options["popularity_skew"])
+        self.ingredient_weights = zipf_weights(
+            options["ingredients"], options["popularity_skew"]
+        )
+
+    def seed(self, indexes):
+        """writes a group of users in a transaction and returns the counts."""
+        with transaction.atomic(), connection.cursor() as cursor:
+            skip_triggers = self._is_superuser(cursor)
+            if skip_triggers:
+                # no triggers at all, the foreign key checks included.
+                cursor.execute("SET LOCAL session_replication_role = replica")
+
+            counts = self._seed_users(indexes, cursor, skip_triggers)
+
+            if skip_triggers:
+                cursor.execute("SET LOCAL session_replication_role = DEFAULT")
+
+        return counts
+
+    def _is_superuser(self, cursor):
+        """returns whether the database role may skip the triggers."""
+        cursor.execute("SHOW is_superuser")
+        return cursor.fetchone()[0] == "on"
+
+    def _recipe_count(self, rng):
+        mean, skew = self.options["recipes"], self.options["recipe_skew"]
+        if not skew:
+            return mean
+
+        # scaled so the mean of the pareto draws is the requested mean.
+        return int(rng.paretovariate(skew) * mean * (skew - 1) / skew)
+
+    def _pick(self, rng, ids, weights, bounds):
+        """returns distinct ids, popular ones more often."""
+        count = min(rng.randint(*bounds), len(ids))
+        if not count:
+            return []
+
+        # draws again for the duplicates, so every recipe gets the count.
+        picked = {}
+        while len(picked) < count:
+            picked.update(
+                dict.fromkeys(
+                    rng.choices(ids, cum_weights=weights, k=count - len(picked))
+                )
+            )
+        return list(picked)
+
+    def _seed_users(self, indexes, cursor, skip_triggers):
+        """
+        writes a group of users with everything they own, the search
+        vectors are computed here when the triggers are skipped.
+        """
+        User = get_user_model()
+        options = self.options
+        user_ids = allocate_ids(User, len(indexes), cursor)
+        rngs = [random.Random(f"{options['seed']}-{index}") for index in indexes]
+
+        copy_rows(
+            User._meta.db_table,
+            ["id", "password", "is_superuser", "email", "name", "is_active", "is_staff"],
+            (
+                (
+                    user_id,
+                    self.password,
+                    False,
+                    f"{options['prefix']}-{index}@example.com",
+                    f"{options['prefix']} user {index}",
+                    True,
+                    False,
+                )
+                for user_id, index in zip(user_ids, indexes)
+            ),
+            cursor,
+        )
+
+        named = {}
+        for model, vocabulary, count in (
+            (Tag, CATEGORIES, options["tags"]),
+            (Ingredient, FOODS, options["ingredients"]),
+        ):
+            ids = allocate_ids(model, count * len(user_ids), cursor)
+            named[model] = [ids[i:i + count] for i in range(0, len(ids), count)]
+            copy_rows(
+                model._meta.db_table,
+                ["id", "user_id", "name", "updated_at"],
+                (
+                    (pk, user_id, name, self.now)
+                    for user_id, pks in zip(user_ids, named[model])
+                    for pk, name in zip(pks, names(vocabulary, count))
+                ),
+                cursor,
+            )
+
+        counts = [self._recipe_count(rng) for rng in rngs]
+        recipe_ids = iter(allocate_ids(Recipe, sum(counts), cursor))
+        recipes = []
+        tag_links = []
+        ingredient_links = []
+        for user_id, rng, count, tag_ids, ingredient_ids in zip(
+            user_ids, rngs, counts, named[Tag], named[Ingredient]
+        ):
+            for _ in range(count):
+                recipe_id = next(recipe_ids)
+                title = f"{rng.choice(ADJECTIVES)} {rng.choice(FOODS)} {rng.choice(DISHES)}"
+                recipes.append(
+                    (
+                        recipe_id,
+                        user_id,
+                        title,
+                        f"a {title} for {rng.choice(CATEGORIES)}.",
+                        rng.randint(5, 180),
+                        Decimal(rng.randint(100, 9999)) / 100,
+                        None,
+                        self.now,
+                        "{}",
+                    )
+                )
+                tag_links.extend(
+                    (recipe_id, pk)
+                    for pk in self._pick(
+                        rng, tag_ids, self.tag_weights, options["tags_per_recipe"]
+                    )
+                )
+                ingredient_links.extend(
+                    (recipe_id, pk)
+                    for pk in self._pick(
+                        rng,
+                        ingredient_ids,
+                        self.ingredient_weights,
+                        options["ingredients_per_recipe"],
+                    )
+                )
+
+        table = Recipe._meta.db_table
+        columns = ", ".join(RECIPE_COLUMNS)
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {STAGING_RECIPES} (LIKE {table})"
+        )
+        copy_rows(STAGING_RECIPES, RECIPE_COLUMNS, recipes, cursor)
+        if skip_triggers:
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}, search_vector) "
+                f"SELECT {columns}, {SEARCH_VECTOR} FROM {STAGING_RECIPES}"
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) "
+                f"SELECT {columns} FROM {STAGING_RECIPES}"
+            )
+        cursor.execute(f"DROP TABLE {STAGING_RECIPES}")
+        for relation, links in (("tags", tag_links), ("ingredients", ingredient_links)):
+            field = Recipe._meta.get_field(relation)
+            copy_rows(
+                field.remote_field.through._meta.db_table,
+                [field.m2m_column_name(), field.m2m_reverse_name()],
+                links,
+                cursor,
+            )
+
+        for user_id in user_ids:
+            invalidate_user(user_id)
+
+        return {
+            "users": len(user_ids),
+            "recipes": len(recipes),
+            "links": len(tag_links) + len(ingredient_links),
+        }
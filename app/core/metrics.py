@@ -0,0 +1,167 @@
+"""
+Prometheus metrics of the API.
+
+every request is timed per resolved route, like recipe:recipe-list,
+along with the number and time of its SQL queries and the time its
+serializers spent validating and representing data. the queries are
+counted by an execute wrapper every connection gets when it's created,
+and the serializers by wrapping BaseSerializer.data and is_valid, both
+add to the RequestStats of the request in progress, a context variable
+that follows the request into the thread pool of the async views.
+
+with PROMETHEUS_MULTIPROC_DIR set the metrics are shared through files
+in that directory, so every worker process of a server reports to the
+/metrics endpoint of all of them. the directory has to be emptied
+before the server starts.
+"""
+import contextvars
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from rest_framework.serializers import BaseSerializer
+
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, float("inf"))
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "time to respond to a request.",
+    ["route", "method", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_sql_queries",
+    "SQL queries run by a request.",
+    ["route"],
+    buckets=QUERY_BUCKETS,
+)
+REQUEST_SQL_DURATION = Histogram(
+    "http_request_sql_duration_seconds",
+    "time a request spent in SQL queries.",
+    ["route"],
+)
+REQUEST_SERIALIZER_DURATION = Histogram(
+    "http_request_serializer_duration_seconds",
+    "time a request spent in serializers, including the queries they ran.",
+    ["route"],
+)
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "time taken to get a connection from the pool.",
+    ["alias"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float("inf")),
+)
+POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts",
+    "requests for a connection that timed out.",
+    ["alias"],
+)
+AUTH_CACHE_LOOKUPS = Counter(
+    "auth_cache_lookups",
+    "users the token authentication looked up, by cache hit or miss.",
+    ["result"],
+)
+
+
+class RequestStats:
+    """what a request spent in queries and serializers."""
+
+    __slots__ = ("started", "queries", "sql_seconds", "serializer_seconds", "depth")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.depth = 0
+
+
+current = contextvars.ContextVar("request_stats", default=None)
+
+
+def route_of(request):
+    """returns the name of the route a request resolved to."""
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    return match.view_name or match.route
+
+
+def observe(request, response, stats, seconds):
+    """records a finished request."""
+    route = route_of(request)
+    REQUEST_DURATION.labels(route, request.method, response.status_code).observe(
+        seconds
+    )
+    REQUEST_QUERIES.labels(route).observe(stats.queries)
+    REQUEST_SQL_DURATION.labels(route).observe(stats.sql_seconds)
+    REQUEST_SERIALIZER_DURATION.labels(route).observe(stats.serializer_seconds)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute wrapper adding a query to the request in progress."""
+    stats = current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """connection_created receiver installing record_query once."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _timed(method):
+    """adds the time spent in a serializer method to the request."""
+
+    def timed(self, *args, **kwargs):
+        stats = current.get()
+        if stats is None:
+            return method(self, *args, **kwargs)
+
+        # nested serializers are counted by the outermost one.
+        stats.depth += 1
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            stats.depth -= 1
+            if not stats.depth:
+                stats.serializer_seconds += time.perf_counter() - started
+
+    timed.__wrapped__ = method
+    return timed
+
+
+def instrument_serializers():
+    """times BaseSerializer.data and is_valid, once."""
+    if hasattr(BaseSerializer.is_valid, "__wrapped__"):
+        return
+
+    BaseSerializer.is_valid = _timed(BaseSerializer.is_valid)
+    BaseSerializer.data = property(_timed(BaseSerializer.data.fget))
+
+
+def render():
+    """returns the metrics in the Prometheus text format."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,91 @@
+"""
+Middleware shared by the whole API.
+
+both middleware work sync and async, so under ASGI they add no hop to
+a thread, and keep their per-request state in a context variable that
+follows the request into the thread pool of the async views.
+"""
+import asyncio
+import time
+
+from core import metrics, querylog
+
+
+class ContextMiddleware:
+    """
+    base of a middleware setting a context variable for the duration
+    of a request. subclasses implement start, returning the value, and
+    may implement finish, which gets the response.
+    """
+
+    sync_capable = True
+    async_capable = True
+    variable = None
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # tells Django this middleware is a coroutine.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def start(self, request):
+        raise NotImplementedError
+
+    def finish(self, request, response, value):
+        return response
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        value = self.start(request)
+        token = self.variable.set(value)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.variable.reset(token)
+
+        return self.finish(request, response, value)
+
+    async def __acall__(self, request):
+        value = self.start(request)
+        token = self.variable.set(value)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.variable.reset(token)
+
+        return self.finish(request, response, value)
+
+
+class MetricsMiddleware(ContextMiddleware):
+    """
+    records the duration, queries and serializer time of every request,
+    see core.metrics. it should come first, so the other middleware is
+    part of the time.
+    """
+
+    variable = metrics.current
+
+    def start(self, request):
+        return metrics.RequestStats()
+
+    def finish(self, request, response, stats):
+        metrics.observe(request, response, stats, time.perf_counter() - stats.started)
+        return response
+
+
+class QueryContextMiddleware(ContextMiddleware):
+    """
+    tags the queries of a request with its endpoint and request ID,
+    see core.querylog, and returns the ID in X-Request-ID.
+    """
+
+    variable = querylog.current
+
+    def start(self, request):
+        return querylog.QueryContext(request, querylog.request_id(request))
+
+    def finish(self, request, response, context):
+        response["X-Request-ID"] = context.request_id
+        return response
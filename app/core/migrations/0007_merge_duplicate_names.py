@@ -0,0 +1,48 @@
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """
+    merges tags and ingredients that share a name for the same user
+    into the oldest row, so the uniqueness constraints can be added.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+
+    for model_name, relation in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, relation).through
+        fk = f'{model_name.lower()}_id'
+
+        duplicates = (
+            model.objects.values('user', 'name')
+            .annotate(keep_id=Min('id'), total=Count('id'))
+            .filter(total__gt=1)
+        )
+        for duplicate in duplicates:
+            extras = model.objects.filter(
+                user=duplicate['user'], name=duplicate['name']
+            ).exclude(id=duplicate['keep_id'])
+            recipe_ids = set(
+                through.objects.filter(**{f'{fk}__in': extras})
+                .values_list('recipe_id', flat=True)
+            )
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id, **{fk: duplicate['keep_id']})
+                    for recipe_id in recipe_ids
+                ],
+                ignore_conflicts=True,
+            )
+            extras.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    indexes for the ownership scoped queries of the recipe API.
+    (user, name) on tags and ingredients is already served by
+    the unique constraints added in 0008.
+    the through tables only come with (recipe_id, tag_id), the
+    reverse indexes serve joining from tags and ingredients
+    back to their recipes.
+    """
+
+    # indexes are built concurrently so existing tables stay writable.
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_unique_tag_ingredient_names'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS recipe_tags_tag_recipe_idx '
+            'ON core_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS recipe_tags_tag_recipe_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX CONCURRENTLY IF NOT EXISTS recipe_ingredients_ingredient_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+            'DROP INDEX CONCURRENTLY IF EXISTS recipe_ingredients_ingredient_recipe_idx;',
+        ),
+    ]
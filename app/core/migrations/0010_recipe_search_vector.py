@@ -0,0 +1,56 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# title words weigh more than description words when ranking.
+SEARCH_VECTOR = """
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}title, '')), 'A') ||
+    setweight(to_tsvector('pg_catalog.english', coalesce({row}description, '')), 'B')
+"""
+
+CREATE_TRIGGER = f"""
+UPDATE core_recipe SET search_vector = {SEARCH_VECTOR.format(row='')};
+
+CREATE FUNCTION core_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    -- only rebuild the vector when the searchable text changed.
+    IF TG_OP = 'UPDATE'
+       AND NEW.title IS NOT DISTINCT FROM OLD.title
+       AND NEW.description IS NOT DISTINCT FROM OLD.description THEN
+        NEW.search_vector := OLD.search_vector;
+    ELSE
+        NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_search_vector_trigger
+    BEFORE INSERT OR UPDATE ON core_recipe
+    FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS core_recipe_search_vector_trigger ON core_recipe;
+DROP FUNCTION IF EXISTS core_recipe_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_ownership_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.contrib.postgres.operations import BtreeGinExtension, TrigramExtension
+from django.db import migrations
+
+INDEXED_TABLES = ('core_tag', 'core_ingredient')
+
+
+class Migration(migrations.Migration):
+    """
+    trigram indexes for the tag and ingredient autocomplete.
+    btree_gin lets user_id share the GIN index with the trigrams,
+    so a lookup only visits the requesting user's entries.
+    names are indexed upper-cased, which is the form django
+    compares case-insensitive prefixes in, trigram similarity
+    ignores case either way.
+    """
+
+    dependencies = [
+        ('core', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        BtreeGinExtension(),
+    ] + [
+        migrations.RunSQL(
+            f'CREATE INDEX {table}_name_trgm_idx ON {table} '
+            f'USING gin (user_id, UPPER(name::text) gin_trgm_ops);',
+            f'DROP INDEX IF EXISTS {table}_name_trgm_idx;',
+        )
+        for table in INDEXED_TABLES
+    ]
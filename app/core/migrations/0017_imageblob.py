@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+def backfill_blobs(apps, schema_editor):
+    """counts the references to the images uploaded before blobs existed."""
+    Recipe = apps.get_model("core", "Recipe")
+    ImageBlob = apps.get_model("core", "ImageBlob")
+
+    blobs = {}
+    rows = Recipe.objects.exclude(image="").exclude(image__isnull=True)
+    for name, renditions in rows.values_list("image", "image_renditions").iterator():
+        blob = blobs.setdefault(name, ImageBlob(name=name))
+        blob.refcount += 1
+        blob.renditions = blob.renditions or renditions
+
+    ImageBlob.objects.bulk_create(blobs.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('size', models.BigIntegerField(default=0)),
+                ('refcount', models.IntegerField(default=0)),
+                ('renditions', models.JSONField(blank=True, default=dict)),
+                ('unreferenced_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_blobs, migrations.RunPython.noop),
+    ]
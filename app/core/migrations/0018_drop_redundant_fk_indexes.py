@@ -0,0 +1,65 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def drop_index(name, table, column):
+    """drops the index django created for a foreign key."""
+    return migrations.RunSQL(
+        f'DROP INDEX CONCURRENTLY IF EXISTS {name};',
+        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column});',
+    )
+
+
+def user_field():
+    return models.ForeignKey(
+        db_index=False,
+        on_delete=django.db.models.deletion.CASCADE,
+        to=settings.AUTH_USER_MODEL,
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    drops the single column indexes django creates for foreign keys
+    where an index of 0008 or 0009 leads with the same column:
+    user_id of recipes, tags and ingredients, and tag_id and
+    ingredient_id of the through tables. the planner took them for
+    the same lookups, so the ownership indexes went unused while
+    every write maintained both.
+    """
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0017_imageblob'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                drop_index('core_recipe_user_id_04234149', 'core_recipe', 'user_id'),
+                drop_index('core_tag_user_id_1b670500', 'core_tag', 'user_id'),
+                drop_index(
+                    'core_ingredient_user_id_73e97fe3', 'core_ingredient', 'user_id'
+                ),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='recipe', name='user', field=user_field()
+                ),
+                migrations.AlterField(
+                    model_name='tag', name='user', field=user_field()
+                ),
+                migrations.AlterField(
+                    model_name='ingredient', name='user', field=user_field()
+                ),
+            ],
+        ),
+        drop_index('core_recipe_tags_tag_id_10c0ffea', 'core_recipe_tags', 'tag_id'),
+        drop_index(
+            'core_recipe_ingredients_ingredient_id_a8fec9ee',
+            'core_recipe_ingredients',
+            'ingredient_id',
+        ),
+    ]
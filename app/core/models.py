@@ -5,6 +5,8 @@ import uuid
 import os
 
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import (
     AbstractBaseUser,
@@ -13,11 +15,14 @@ from django.contrib.auth.models import (
 )
 
 def recipe_image_file_path(instance, filename):
-    """generates file path for new recipe image."""
-    ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
+    """
+    the name a recipe image is saved under, the storage replaces it
+    with the sha256 of the content (see core.storage), only the
+    extension is kept.
+    """
+    ext = os.path.splitext(filename)[1].lower()
 
-    return os.path.join('uploads', 'recipe', filename)
+    return f'image{ext}'
 
 class UserManager(BaseUserManager):
     """Manager for the User Model"""
@@ -67,7 +72,11 @@ class User(AbstractBaseUser, PermissionsMixin):
 class Recipe(models.Model):
     """The Recipe Model."""
 
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, null=False)
+    # recipe_user_id_desc_idx leads with user, a separate index on it
+    # would only compete with it and slow down writes.
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, null=False, db_index=False
+    )
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     time_minutes = models.IntegerField()
@@ -76,16 +85,71 @@ class Recipe(models.Model):
     tags = models.ManyToManyField("Tag")
     ingredients = models.ManyToManyField("Ingredient")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # {rendition: {format: file name}} of the resized copies of the
+    # image, filled in by a worker after the upload, see recipe.images.
+    image_renditions = models.JSONField(default=dict, blank=True)
+    # maintained by a database trigger from the title and description,
+    # see migration 0010.
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # serves listing a user's recipes newest first.
+            models.Index(fields=["user", "-id"], name="recipe_user_id_desc_idx"),
+            GinIndex(fields=["search_vector"], name="recipe_search_vector_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
 
+class UserNamedManager(models.Manager):
+    """Manager for models whose names are unique per user."""
+
+    def get_or_create_many(self, user, names):
+        """
+        returns a {name: object} mapping for all of the names.
+        existing names are resolved in one query, the missing ones
+        are inserted in a single statement that skips rows another
+        request created concurrently, and then read back.
+        """
+        names = set(names)
+        if not names:
+            return {}
+
+        objs = {obj.name: obj for obj in self.filter(user=user, name__in=names)}
+        missing = names - objs.keys()
+        if missing:
+            self.bulk_create(
+                [self.model(user=user, name=name) for name in missing],
+                ignore_conflicts=True,
+            )
+            objs.update(
+                (obj.name, obj) for obj in self.filter(user=user, name__in=missing)
+            )
+
+        return objs
+
+
 class Tag(models.Model):
     """The Tag Model."""
 
     name = models.CharField(max_length=255)
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    # the unique (user, name) index serves lookups by user.
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, db_index=False
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserNamedManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"], name="unique_tag_name_per_user"
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -95,7 +159,99 @@ class Ingredient(models.Model):
     """The Ingredient Model."""
 
     name = models.CharField(max_length=255)
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    # the unique (user, name) index serves lookups by user.
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, db_index=False
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserNamedManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "name"], name="unique_ingredient_name_per_user"
+            ),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class RevokedToken(models.Model):
+    """
+    A signed token that was revoked before it expired.
+    rows are only needed until the token would expire anyway.
+    """
+
+    jti = models.CharField(max_length=32, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of a bulk import, see the import_recipes command.
+    it's saved in the same transaction as each batch, so a failed
+    import resumes right after the last batch that was committed.
+    """
+
+    user = models.ForeignKey(
+        get_user_model(), on_delete=models.CASCADE, db_index=False
+    )
+    source = models.CharField(max_length=512)
+    rows_done = models.BigIntegerField(default=0)
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "source"], name="unique_import_source_per_user"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.source} ({self.rows_done} rows)"
+
+
+class UploadSession(models.Model):
+    """
+    A resumable chunked upload of a recipe image, see recipe.uploads.
+    the bytes received so far are spooled to a file named after the id.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    # sha256 of the whole file, as hex.
+    checksum = models.CharField(max_length=64)
+    received = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+
+
+class ImageBlob(models.Model):
+    """
+    A content addressed image file, see core.storage.
+    refcount is the number of recipes using it, once it drops to zero
+    the file and its renditions are deleted by the collect_images
+    command after a grace period.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.IntegerField(default=0)
+    # the renditions made from it, shared by every recipe using it.
+    renditions = models.JSONField(default=dict, blank=True)
+    unreferenced_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} references)"
@@ -0,0 +1,171 @@
+"""
+SQL comments naming the endpoint of every query, and the slow query log.
+
+every query run during a request gets a comment in the sqlcommenter
+format, like /*action='list',request_id='..',route='recipe%3Arecipe-list',
+view='RecipeViewSet'*/, so pg_stat_activity, the server log and
+pg_stat_statements tell which endpoint and which filters, like tags or
+ingredients, produced it. the values are url encoded, so they can't end
+the comment.
+
+a query slower than SLOW_QUERY_MS is logged, for a SLOW_QUERY_SAMPLE_RATE
+share of them, as a JSON line with its SQL, the types of its
+parameters, its EXPLAIN plan and the endpoint.
+"""
+import contextvars
+import json
+import logging
+import random
+import re
+import time
+import uuid
+from urllib.parse import quote
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# the query parameters naming filters, recorded by name only.
+FILTERS = ("tags", "ingredients", "search", "ordering")
+REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+class QueryContext:
+    """the endpoint of the request in progress."""
+
+    def __init__(self, request, request_id):
+        self.request = request
+        self.request_id = request_id
+        self._tags = None
+
+    def tags(self):
+        """returns the tags of the endpoint, once the url is resolved."""
+        if self._tags is not None:
+            return self._tags
+
+        tags = {"request_id": self.request_id}
+        match = getattr(self.request, "resolver_match", None)
+        if match is None:
+            return tags
+
+        tags["route"] = match.view_name or match.route
+        view = getattr(match.func, "cls", match.func)
+        tags["view"] = getattr(view, "__name__", type(view).__name__)
+        action = getattr(match.func, "actions", {}).get(self.request.method.lower())
+        if action:
+            tags["action"] = action
+        filters = [name for name in FILTERS if name in self.request.GET]
+        if filters:
+            tags["filters"] = ",".join(filters)
+
+        self._tags = tags
+        return tags
+
+
+current = contextvars.ContextVar("query_context", default=None)
+
+
+def request_id(request):
+    """returns the X-Request-ID of a request, or a new one."""
+    value = request.headers.get("X-Request-ID", "")
+    return value if REQUEST_ID.match(value) else uuid.uuid4().hex
+
+
+def comment(tags):
+    """returns the tags as a sqlcommenter comment."""
+    pairs = ",".join(
+        f"{key}='{quote(str(value), safe='')}'" for key, value in sorted(tags.items())
+    )
+    return f"/*{pairs}*/"
+
+
+def params_shape(params, many):
+    """describes the parameters of a query without their values."""
+    if params is None:
+        return None
+    if many:
+        return {"rows": len(params)}
+    if isinstance(params, dict):
+        return {key: _shape(value) for key, value in params.items()}
+    return [_shape(value) for value in params]
+
+
+def _shape(value):
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def explain(connection, sql, params):
+    """returns the plan of a query, without running it, or None."""
+    if not EXPLAINABLE.match(sql):
+        return None
+
+    raw = connection.connection
+    try:
+        with raw.cursor() as cursor:
+            # a failing EXPLAIN must not abort the transaction.
+            if not raw.autocommit:
+                cursor.execute("SAVEPOINT query_log_explain")
+            try:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            except Exception:
+                if not raw.autocommit:
+                    cursor.execute("ROLLBACK TO SAVEPOINT query_log_explain")
+                raise
+            if not raw.autocommit:
+                cursor.execute("RELEASE SAVEPOINT query_log_explain")
+    except Exception:
+        return None
+
+    return plan
+
+
+def log_slow(context, sql, params, many, connection, seconds):
+    """writes a slow query to the log as a JSON line."""
+    request = context.request
+    record = {
+        "time": timezone.now().isoformat(),
+        "duration_ms": round(seconds * 1000, 3),
+        "database": connection.alias,
+        "sql": sql,
+        "params": params_shape(params, many),
+        "plan": None if many else explain(connection, sql, params),
+        "method": request.method,
+        "path": request.path,
+        **context.tags(),
+    }
+    logger.warning(json.dumps(record, default=str))
+
+
+def tag_query(execute, sql, params, many, context):
+    """execute wrapper commenting and timing the queries of a request."""
+    query = current.get()
+    if query is None:
+        return execute(sql, params, many, context)
+
+    tagged = comment(query.tags())
+    if params is not None:
+        # the parameters are interpolated with %s, a literal % is %%.
+        tagged = tagged.replace("%", "%%")
+
+    started = time.perf_counter()
+    result = execute(f"{sql} {tagged}", params, many, context)
+    seconds = time.perf_counter() - started
+
+    if (
+        seconds * 1000 >= settings.SLOW_QUERY_MS
+        and random.random() < settings.SLOW_QUERY_SAMPLE_RATE
+    ):
+        log_slow(query, sql, params, many, context["connection"], seconds)
+
+    return result
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """connection_created receiver installing tag_query once."""
+    if tag_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(tag_query)
@@ -0,0 +1,71 @@
+"""
+Content addressed file storage.
+
+files are named after the sha256 of their content, so an identical
+upload is the same file and saving it again writes nothing, and a
+name never points to different content, which lets clients cache it
+forever. the files that are still used are tracked by ImageBlob.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+PREFIX = "images"
+BLOCK_SIZE = 64 * 1024
+
+
+def content_name(digest, ext):
+    """returns the name of the file with the given sha256 and extension."""
+    return "/".join([PREFIX, digest[:2], digest[2:4], f"{digest}{ext.lower()}"])
+
+
+def digest_of(name):
+    """returns the sha256 in a content addressed name, or None."""
+    if not name or not name.startswith(f"{PREFIX}/"):
+        return None
+
+    return os.path.splitext(os.path.basename(name))[0]
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage naming files after their content, the name it's
+    given only contributes the extension.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # the content decides the name, an existing file is the same file.
+        return name
+
+    def _save(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(BLOCK_SIZE):
+            digest.update(chunk)
+        name = content_name(digest.hexdigest(), os.path.splitext(name)[1])
+        if self.exists(name):
+            return name
+
+        # written aside and renamed, so a file with this name is always
+        # complete, even when the same content is saved concurrently.
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        content.seek(0)
+        file = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        try:
+            with file:
+                for chunk in content.chunks(BLOCK_SIZE):
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(file.name, self.file_permissions_mode)
+            os.replace(file.name, path)
+        except BaseException:
+            os.remove(file.name)
+            raise
+
+        return name
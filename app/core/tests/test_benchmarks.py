@@ -0,0 +1,118 @@
+"""
+Tests the endpoint benchmarks.
+"""
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from core import benchmarks
+from core.management.commands.benchmark import BASELINE
+
+
+def result(p50=1.0, p95=2.0, p99=3.0, queries=3, memory_kb=100.0):
+    return {
+        "p50": p50, "p95": p95, "p99": p99,
+        "queries": queries, "memory_kb": memory_kb,
+    }
+
+
+class PercentileTests(TestCase):
+    """tests the nearest-rank percentiles."""
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(benchmarks.percentile(values, 50), 50)
+        self.assertEqual(benchmarks.percentile(values, 99), 99)
+        self.assertEqual(benchmarks.percentile([7], 95), 7)
+
+
+class CompareTests(TestCase):
+    """tests flagging regressions against a baseline."""
+
+    def test_within_tolerance(self):
+        """tests noise below the tolerance isn't flagged."""
+        baseline = {"recipe-list@100": result()}
+        results = {"recipe-list@100": result(p95=2.4, memory_kb=110)}
+
+        self.assertEqual(benchmarks.compare(results, baseline, 0.25), [])
+
+    def test_regressions(self):
+        """tests slower, heavier and chattier requests are flagged."""
+        baseline = {"recipe-list@100": result(p95=20.0)}
+        results = {
+            "recipe-list@100": result(p95=40.0, queries=4, memory_kb=200)
+        }
+
+        regressions = benchmarks.compare(results, baseline, 0.25)
+
+        self.assertEqual(len(regressions), 3)
+        self.assertIn("p95", regressions[0])
+        self.assertIn("queries 3 -> 4", regressions[1])
+        self.assertIn("memory", regressions[2])
+
+    def test_small_latency_changes_ignored(self):
+        """tests fast requests need to slow down by more than a millisecond."""
+        baseline = {"tag-list@100": result(p50=0.5)}
+        results = {"tag-list@100": result(p50=1.2)}
+
+        self.assertEqual(benchmarks.compare(results, baseline, 0.25), [])
+
+    def test_new_scenarios_ignored(self):
+        """tests results missing from the baseline aren't compared."""
+        results = {"tag-list@1000": result(queries=10)}
+
+        self.assertEqual(benchmarks.compare(results, {}, 0.25), [])
+
+
+class RunTests(TestCase):
+    """tests running the scenarios."""
+
+    def test_run(self):
+        """tests every scenario is measured at every size."""
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root
+        ):
+            results = benchmarks.run([5, 10], iterations=2)
+
+        self.assertEqual(
+            set(results),
+            {
+                f"{scenario.name}@{size}"
+                for scenario in benchmarks.SCENARIOS
+                for size in (5, 10)
+            },
+        )
+        for measured in results.values():
+            self.assertLessEqual(measured["p50"], measured["p99"])
+            self.assertGreater(measured["queries"], 0)
+            self.assertGreater(measured["memory_kb"], 0)
+
+    def test_run_selected_scenarios(self):
+        """tests scenarios can be picked by name."""
+        results = benchmarks.run([5], iterations=1, scenarios=["tag-list"])
+
+        self.assertEqual(list(results), ["tag-list@5"])
+
+
+class BaselineTests(TestCase):
+    """tests the baseline the command compares with."""
+
+    def test_baseline_committed(self):
+        """tests the default baseline exists and has every scenario."""
+        with open(BASELINE) as file:
+            baseline = json.load(file)
+
+        names = {key.partition("@")[0] for key in baseline}
+        self.assertEqual(names, {scenario.name for scenario in benchmarks.SCENARIOS})
+
+    def test_missing_baseline_fails(self):
+        """tests comparing without a baseline fails before measuring."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "missing.json")
+            with self.assertRaisesMessage(CommandError, "no baseline"):
+                call_command("benchmark", "--baseline", path)
@@ -0,0 +1,55 @@
+"""
+Tests the bulk loading helpers.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from core import bulkload
+from core.models import Tag
+
+
+class EncodeTests(SimpleTestCase):
+    """tests values are encoded for the COPY text format."""
+
+    def test_encode_values(self):
+        """tests NULLs and special characters are escaped."""
+        row = (None, 1, Decimal("2.50"), "a\tb\nc\\d\re")
+
+        self.assertEqual(
+            bulkload.encode_row(row), "\\N\t1\t2.50\ta\\tb\\nc\\\\d\\re\n"
+        )
+
+    def test_stream_reads_in_pieces(self):
+        """tests the stream returns every row whatever the read size."""
+        rows = [(i, f"name {i}") for i in range(100)]
+        expected = "".join(bulkload.encode_row(row) for row in rows)
+
+        stream = bulkload.RowStream(rows)
+        pieces = iter(lambda: stream.read(7), "")
+
+        self.assertEqual("".join(pieces), expected)
+
+
+class CopyRowsTests(TestCase):
+    """tests rows are loaded with COPY."""
+
+    def test_copy_rows_with_allocated_ids(self):
+        """tests preallocated ids can be copied into a table."""
+        user = get_user_model().objects.create_user(
+            email="copy@example.com", name="copy", password="testpass123"
+        )
+        ids = bulkload.allocate_ids(Tag, 3)
+
+        bulkload.copy_rows(
+            Tag._meta.db_table,
+            ["id", "user_id", "name", "updated_at"],
+            ((pk, user.pk, f"tag\t{pk}", "2024-01-01T00:00Z") for pk in ids),
+        )
+
+        self.assertEqual(len(set(ids)), 3)
+        self.assertEqual(
+            list(Tag.objects.order_by("id").values_list("name", flat=True)),
+            [f"tag\t{pk}" for pk in ids],
+        )
@@ -0,0 +1,184 @@
+"""
+Tests the import_recipes command.
+"""
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import ImportCheckpoint, Recipe, Tag
+from core.management.commands.import_recipes import Command
+
+
+def recipe_row(i, tags=("shared",), ingredients=()):
+    """returns a recipe as it appears in an export."""
+    return {
+        "title": f"recipe {i}",
+        "description": f"line one\ttabbed\nline two {i}",
+        "time_minutes": i,
+        "price": "2.50",
+        "link": None,
+        "tags": list(tags),
+        "ingredients": list(ingredients),
+    }
+
+
+class ImportRecipesTests(TestCase):
+    """tests bulk importing recipes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="import@example.com", name="import", password="testpass123"
+        )
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def write_jsonl(self, rows):
+        return self.write(
+            "recipes.jsonl", "".join(json.dumps(row) + "\n" for row in rows)
+        )
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_recipes", path, "--user", self.user.email, *args,
+            stdout=out, stderr=err,
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_import_jsonl(self):
+        """tests recipes, names and links are merged in."""
+        Tag.objects.create(user=self.user, name="shared")
+        path = self.write_jsonl(
+            [recipe_row(i, ingredients=[f"ingredient {i}", "salt"]) for i in range(5)]
+        )
+
+        out, _ = self.run_import(path, "--batch-size", "2")
+
+        recipes = Recipe.objects.filter(user=self.user).order_by("time_minutes")
+        self.assertEqual(recipes.count(), 5)
+        self.assertEqual(recipes[3].description, "line one\ttabbed\nline two 3")
+        self.assertEqual(recipes[3].price, Decimal("2.50"))
+        self.assertIsNone(recipes[3].link)
+        self.assertEqual(
+            sorted(recipes[3].ingredients.values_list("name", flat=True)),
+            ["ingredient 3", "salt"],
+        )
+        self.assertEqual(Tag.objects.get(user=self.user).recipe_set.count(), 5)
+        self.assertIn("rows/s", out)
+
+    def test_imported_recipes_searchable(self):
+        """tests the search vector trigger fills imported rows."""
+        path = self.write_jsonl([recipe_row(1)])
+
+        self.run_import(path)
+
+        self.assertIsNotNone(Recipe.objects.get(user=self.user).search_vector)
+
+    def test_import_csv(self):
+        """tests the CSV layout of the export can be imported."""
+        path = self.write(
+            "recipes.csv",
+            "id,title,description,time_minutes,price,link,tags,ingredients\n"
+            '1,soup,,10,3.00,,"warm,quick",water\n',
+        )
+
+        self.run_import(path)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(recipe.title, "soup")
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)), ["quick", "warm"]
+        )
+
+    def test_invalid_rows_skipped(self):
+        """tests invalid rows are reported and the rest imported."""
+        rows = [recipe_row(1), {"title": "no numbers"}, recipe_row(3), recipe_row(4)]
+        rows[2]["price"] = "5000"
+        rows[3]["time_minutes"] = 2**31
+        path = self.write_jsonl(rows + [recipe_row(5)])
+
+        out, err = self.run_import(path)
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+        self.assertIn("row 2:", err)
+        self.assertIn("row 3:", err)
+        self.assertIn("row 4: time_minutes is out of range", err)
+        self.assertIn("skipped 3 invalid rows", out)
+
+    def test_names_as_strings(self):
+        """tests a string of names is split like in CSV, not per character."""
+        row = recipe_row(1)
+        row["tags"] = "vegan, quick"
+        bad = recipe_row(2)
+        bad["ingredients"] = {"name": "salt"}
+        path = self.write_jsonl([row, bad])
+
+        out, err = self.run_import(path)
+
+        recipe = Recipe.objects.get(user=self.user)
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)), ["quick", "vegan"]
+        )
+        self.assertIn("row 2: tags and ingredients have to be lists", err)
+
+    def test_resume_after_failure(self):
+        """tests a failed import resumes after the last committed batch."""
+        path = self.write_jsonl([recipe_row(i) for i in range(5)])
+        load_batch = Command._load_batch
+        calls = []
+
+        def failing_load(command, user, valid):
+            calls.append(len(valid))
+            if len(calls) == 2:
+                raise RuntimeError("connection lost")
+            return load_batch(command, user, valid)
+
+        with patch.object(Command, "_load_batch", failing_load):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, "--batch-size", "2")
+
+        checkpoint = ImportCheckpoint.objects.get(user=self.user)
+        self.assertEqual(checkpoint.rows_done, 2)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+        out, _ = self.run_import(path, "--batch-size", "2")
+
+        self.assertIn("resuming after row 2", out)
+        self.assertEqual(
+            sorted(Recipe.objects.values_list("time_minutes", flat=True)),
+            [0, 1, 2, 3, 4],
+        )
+
+    def test_completed_import_not_repeated(self):
+        """tests running a finished import again does nothing."""
+        path = self.write_jsonl([recipe_row(1)])
+        self.run_import(path)
+
+        out, _ = self.run_import(path)
+
+        self.assertIn("already imported", out)
+        self.assertEqual(Recipe.objects.count(), 1)
+
+        self.run_import(path, "--restart")
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_unknown_user(self):
+        """tests an error is raised for unknown users."""
+        path = self.write_jsonl([recipe_row(1)])
+
+        with self.assertRaises(CommandError):
+            call_command("import_recipes", path, "--user", "nobody@example.com")
@@ -0,0 +1,137 @@
+"""
+Tests the request metrics and the /metrics endpoint.
+"""
+import os
+import tempfile
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Recipe
+
+METRICS_URL = reverse("metrics")
+RECIPES_URL = reverse("recipe:recipe-list")
+TOKEN_URL = reverse("user:token")
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class RequestMetricsTests(TestCase):
+    """tests requests are recorded per route."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="metrics@example.com", name="metrics", password="testpass123"
+        )
+        Recipe.objects.create(
+            user=self.user, title="soup", time_minutes=5, price=Decimal("1.00")
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_route_recorded(self):
+        """tests a read records its duration, queries and serializer time."""
+        labels = {"route": "recipe:recipe-list"}
+        before = {
+            "count": sample(
+                "http_request_duration_seconds_count",
+                method="GET", status="200", **labels,
+            ),
+            "queries": sample("http_request_sql_queries_sum", **labels),
+            "sql": sample("http_request_sql_duration_seconds_sum", **labels),
+            "serializer": sample(
+                "http_request_serializer_duration_seconds_sum", **labels
+            ),
+        }
+
+        self.client.get(RECIPES_URL, {"search": "soup"})
+
+        self.assertEqual(
+            sample(
+                "http_request_duration_seconds_count",
+                method="GET", status="200", **labels,
+            ),
+            before["count"] + 1,
+        )
+        self.assertGreater(
+            sample("http_request_sql_queries_sum", **labels), before["queries"]
+        )
+        self.assertGreater(
+            sample("http_request_sql_duration_seconds_sum", **labels), before["sql"]
+        )
+        self.assertGreater(
+            sample("http_request_serializer_duration_seconds_sum", **labels),
+            before["serializer"],
+        )
+
+    def test_named_routes(self):
+        """tests the token endpoint and unknown urls get their own routes."""
+        token = {"route": "user:token", "method": "POST", "status": "200"}
+        unmatched = {"route": "unmatched", "method": "GET", "status": "404"}
+        before = [
+            sample("http_request_duration_seconds_count", **token),
+            sample("http_request_duration_seconds_count", **unmatched),
+        ]
+
+        APIClient().post(
+            TOKEN_URL, {"email": self.user.email, "password": "testpass123"}
+        )
+        self.client.get("/api/missing/")
+
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **token), before[0] + 1
+        )
+        self.assertEqual(
+            sample("http_request_duration_seconds_count", **unmatched), before[1] + 1
+        )
+
+
+class MetricsEndpointTests(TestCase):
+    """tests serving the metrics to Prometheus."""
+
+    @override_settings(DEBUG=True)
+    def test_metrics(self):
+        """tests the metrics are served in the text format."""
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["Content-Type"].startswith("text/plain"))
+        self.assertIn(b"http_request_duration_seconds_bucket", res.content)
+        self.assertIn(b'route="recipe:recipe-list"', res.content)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        """tests a configured token is required."""
+        self.assertEqual(
+            self.client.get(METRICS_URL).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_metrics_denied_without_token(self):
+        """tests the metrics aren't public outside of DEBUG."""
+        res = self.client.get(METRICS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_multiprocess(self):
+        """tests the metrics of all worker processes are read from files."""
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(
+            os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}
+        ):
+            content, _ = metrics.render()
+
+        # no worker wrote to the directory yet, this process' metrics
+        # live in memory.
+        self.assertEqual(content, b"")
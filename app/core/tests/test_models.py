@@ -54,3 +54,10 @@ class TestModels(TestCase):
         tag = Tag.objects.create(user=user, name="TAG")
 
         self.assertEqual(tag.name, str(tag))
+
+    def test_recipe_image_file_path(self):
+        """tests only the extension of an uploaded image name is kept."""
+        self.assertEqual(
+            recipe_image_file_path(None, "../My Photo.JPG"), "image.jpg"
+        )
+        self.assertEqual(recipe_image_file_path(None, "photo"), "image")
@@ -0,0 +1,209 @@
+"""
+Tests the database connection pool.
+"""
+import threading
+import time
+
+from django.db import connection, transaction
+from prometheus_client import REGISTRY
+from django.test import SimpleTestCase, TransactionTestCase
+from psycopg2.extensions import (
+    TRANSACTION_STATUS_IDLE,
+    TRANSACTION_STATUS_INTRANS,
+    TRANSACTION_STATUS_UNKNOWN,
+)
+
+from core.db import pool
+
+
+class FakeInfo:
+    transaction_status = TRANSACTION_STATUS_IDLE
+
+
+class FakeConnection:
+    """stands in for a psycopg2 connection."""
+
+    def __init__(self):
+        self.closed = 0
+        self.info = FakeInfo()
+        self.queries = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, sql):
+                if connection.closed:
+                    raise pool.OperationalError("server closed the connection")
+                connection.queries += 1
+
+        return Cursor()
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.info.transaction_status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def make_pool(max_size=2, max_idle=300, timeout=0.05, check_interval=10):
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection())
+        return opened[-1]
+
+    return pool.Pool(connect, max_size, max_idle, timeout, check_interval), opened
+
+
+class PoolTests(SimpleTestCase):
+    """tests lending out and taking back connections."""
+
+    def test_reuse(self):
+        """tests a released connection is handed out again."""
+        connections, opened = make_pool()
+
+        first = connections.acquire()
+        connections.release(first)
+        second = connections.acquire()
+
+        self.assertIs(first, second)
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(connections.stats()["created"], 1)
+
+    def test_max_size(self):
+        """tests the pool opens no more than max_size and times out."""
+        connections, opened = make_pool(max_size=2)
+        connections.acquire()
+        connections.acquire()
+
+        with self.assertRaises(pool.PoolTimeout), self.assertLogs(pool.logger):
+            connections.acquire()
+
+        stats = connections.stats()
+        self.assertEqual(len(opened), 2)
+        self.assertEqual(stats["in_use"], 2)
+        self.assertEqual(stats["timeouts"], 1)
+
+    def test_wait_for_release(self):
+        """tests a request waits for a connection and the wait is recorded."""
+        connections, _ = make_pool(max_size=1, timeout=5)
+        first = connections.acquire()
+        timer = threading.Timer(0.05, connections.release, [first])
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        second = connections.acquire()
+
+        self.assertIs(first, second)
+        stats = connections.stats()
+        self.assertEqual(stats["acquired"], 2)
+        self.assertEqual(stats["waits"], 1)
+        self.assertGreaterEqual(stats["wait_seconds_max"], 0.04)
+        self.assertEqual(stats["wait_buckets"][0.1], 1)
+        self.assertEqual(sum(stats["wait_buckets"].values()), 2)
+
+    def test_health_check(self):
+        """tests a dropped connection is replaced, a live one pinged."""
+        connections, opened = make_pool(check_interval=0)
+        first = connections.acquire()
+        connections.release(first)
+        self.assertIs(connections.acquire(), first)
+        self.assertEqual(first.queries, 1)
+        connections.release(first)
+
+        first.closed = 1
+        second = connections.acquire()
+
+        self.assertIsNot(second, first)
+        self.assertEqual(len(opened), 2)
+        self.assertEqual(connections.stats()["size"], 1)
+
+    def test_release_resets_transaction(self):
+        """tests an open transaction is rolled back, a broken one discarded."""
+        connections, _ = make_pool()
+        first = connections.acquire()
+        first.info.transaction_status = TRANSACTION_STATUS_INTRANS
+        connections.release(first)
+        self.assertEqual(first.rollbacks, 1)
+        self.assertEqual(connections.stats()["idle"], 1)
+
+        first = connections.acquire()
+        first.info.transaction_status = TRANSACTION_STATUS_UNKNOWN
+        connections.release(first)
+
+        self.assertTrue(first.closed)
+        self.assertEqual(connections.stats()["size"], 0)
+
+    def test_max_idle(self):
+        """tests connections idle for too long are closed."""
+        connections, opened = make_pool(max_idle=0)
+        first = connections.acquire()
+        connections.release(first)
+        time.sleep(0.01)
+
+        second = connections.acquire()
+
+        self.assertTrue(first.closed)
+        self.assertIsNot(first, second)
+        self.assertEqual(connections.stats()["discarded"], 1)
+
+    def test_replaced_pool(self):
+        """tests a pool replaced by new parameters closes what comes back."""
+        options = {"MAX_SIZE": 2, "MAX_IDLE": 300, "TIMEOUT": 1, "CHECK_INTERVAL": 10}
+        self.addCleanup(pool._pools.pop, "pool-test", None)
+        old = pool.get_pool("pool-test", "a", FakeConnection, options)
+        self.assertIs(pool.get_pool("pool-test", "a", FakeConnection, options), old)
+        in_use = old.acquire()
+
+        new = pool.get_pool("pool-test", "b", FakeConnection, options)
+        old.release(in_use)
+
+        self.assertIsNot(new, old)
+        self.assertTrue(in_use.closed)
+        self.assertIn("pool-test", pool.stats())
+
+
+class PooledBackendTests(TransactionTestCase):
+    """tests the database backend borrows from the pool."""
+
+    def test_connection_reused(self):
+        """tests closing the connection keeps the server session."""
+        connection.ensure_connection()
+        pid = connection.connection.get_backend_pid()
+
+        waits = REGISTRY.get_sample_value(
+            "db_pool_wait_seconds_count", {"alias": connection.alias}
+        )
+
+        connection.close()
+        connection.ensure_connection()
+
+        self.assertEqual(connection.connection.get_backend_pid(), pid)
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                "db_pool_wait_seconds_count", {"alias": connection.alias}
+            ),
+            waits + 1,
+        )
+
+    def test_closed_in_transaction(self):
+        """tests a connection closed inside a transaction isn't reused."""
+        connection.ensure_connection()
+        raw = connection.connection
+
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            connection.close()
+            raise RuntimeError
+
+        self.assertTrue(raw.closed)
+        connection.ensure_connection()
+        self.assertIsNot(connection.connection, raw)
@@ -0,0 +1,125 @@
+"""
+Tests tagging queries with their endpoint and the slow query log.
+"""
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import querylog
+from core.models import Recipe, Tag
+
+RECIPES_URL = reverse("recipe:recipe-list")
+
+
+class QueryTaggingTests(TestCase):
+    """tests the queries of a request carry its endpoint."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="tags@example.com", name="tags", password="testpass123"
+        )
+        tag = Tag.objects.create(user=self.user, name="100% vegan")
+        recipe = Recipe.objects.create(
+            user=self.user, title="soup", time_minutes=5, price=Decimal("1.00")
+        )
+        recipe.tags.add(tag)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_queries_tagged(self):
+        """tests the comment names the view, action, filters and request."""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                RECIPES_URL, {"tags": "100% vegan"}, HTTP_X_REQUEST_ID="req-1"
+            )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res["X-Request-ID"], "req-1")
+        selects = [q["sql"] for q in queries if q["sql"].startswith("SELECT")]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertTrue(
+                sql.endswith(
+                    "/*action='list',filters='tags',request_id='req-1',"
+                    "route='recipe%3Arecipe-list',view='RecipeViewSet'*/"
+                ),
+                sql,
+            )
+
+    def test_request_id_generated(self):
+        """tests a missing or malformed request ID is replaced."""
+        res = self.client.get(RECIPES_URL, HTTP_X_REQUEST_ID="*/ DROP TABLE x")
+
+        self.assertRegex(res["X-Request-ID"], r"^[0-9a-f]{32}$")
+
+    def test_queries_outside_requests(self):
+        """tests queries without a request in progress are left alone."""
+        with CaptureQueriesContext(connection) as queries:
+            Recipe.objects.count()
+
+        self.assertNotIn("/*", queries[0]["sql"])
+
+
+class SlowQueryLogTests(TestCase):
+    """tests slow queries are logged as JSON lines."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="slow@example.com", name="slow", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_SAMPLE_RATE=1.0)
+    def test_slow_query_logged(self):
+        """tests a slow query is logged with its plan and endpoint."""
+        with self.assertLogs(querylog.logger, "WARNING") as logs:
+            self.client.get(RECIPES_URL, {"ingredients": "salt"})
+
+        records = [json.loads(line.split(":", 2)[2]) for line in logs.output]
+        record = next(r for r in records if r["sql"].startswith("SELECT"))
+        self.assertEqual(record["route"], "recipe:recipe-list")
+        self.assertEqual(record["action"], "list")
+        self.assertEqual(record["filters"], "ingredients")
+        self.assertEqual(record["path"], RECIPES_URL)
+        self.assertNotIn("/*", record["sql"])
+        self.assertNotIn("salt", json.dumps(record["params"]))
+        self.assertIn("Plan", record["plan"][0])
+
+    @override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_SAMPLE_RATE=0)
+    def test_sampling(self):
+        """tests slow queries outside the sample aren't logged."""
+        with self.assertRaises(AssertionError), self.assertLogs(querylog.logger):
+            self.client.get(RECIPES_URL)
+
+    def test_explain_failure_keeps_transaction(self):
+        """tests a query that can't be explained doesn't break the request."""
+        self.assertIsNone(
+            querylog.explain(connection, "SELECT * FROM missing_table", None)
+        )
+
+        self.assertEqual(Recipe.objects.count(), 0)
+
+
+class HelperTests(SimpleTestCase):
+    """tests the comment and parameter shape helpers."""
+
+    def test_comment_escapes(self):
+        self.assertEqual(
+            querylog.comment({"view": "it's */ here"}),
+            "/*view='it%27s%20%2A%2F%20here'*/",
+        )
+
+    def test_params_shape(self):
+        self.assertEqual(
+            querylog.params_shape([1, "salt", [1, 2]], False), ["int", "str", "list[2]"]
+        )
+        self.assertEqual(querylog.params_shape([(1,), (2,)], True), {"rows": 2})
+        self.assertIsNone(querylog.params_shape(None, False))
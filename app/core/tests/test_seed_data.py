@@ -0,0 +1,155 @@
+"""
+Tests the seed_data command.
+"""
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count, F
+from django.test import TestCase, TransactionTestCase, tag
+from django.test.utils import CaptureQueriesContext
+
+from core.management.commands.seed_data import Seeder
+from core.models import Ingredient, Recipe, Tag
+
+
+def seed(*args):
+    """runs the command quietly."""
+    call_command("seed_data", *args, stdout=StringIO())
+
+
+def snapshot(prefix):
+    """returns the generated content of users, independent of ids."""
+    users = get_user_model().objects.filter(email__startswith=f"{prefix}-")
+    return [
+        (
+            recipe.title,
+            recipe.price,
+            sorted(recipe.tags.values_list("name", flat=True)),
+            sorted(recipe.ingredients.values_list("name", flat=True)),
+        )
+        # workers interleave their ids, each user's recipes are in order.
+        for recipe in Recipe.objects.filter(user__in=users).order_by("user__email", "id")
+    ]
+
+
+class SeedDataTests(TestCase):
+    """tests generating synthetic data."""
+
+    def test_seed_counts(self):
+        """tests users get the requested names and fan-out."""
+        seed(
+            "--users", "3", "--recipes", "20", "--tags", "15", "--ingredients",
+            "40", "--tags-per-recipe", "1-3", "--ingredients-per-recipe", "4",
+            "--users-per-batch", "2",
+        )
+
+        users = get_user_model().objects.filter(email__startswith="seed-")
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(Recipe.objects.count(), 60)
+        self.assertEqual(Tag.objects.count(), 45)
+        self.assertEqual(Ingredient.objects.count(), 120)
+        fan_out = Recipe.objects.annotate(
+            tag_count=Count("tags", distinct=True),
+            ingredient_count=Count("ingredients", distinct=True),
+        )
+        self.assertTrue(all(1 <= r.tag_count <= 3 for r in fan_out))
+        self.assertTrue(all(r.ingredient_count == 4 for r in fan_out))
+        self.assertFalse(Recipe.objects.exclude(tags__user=F("user")).filter(
+            tags__isnull=False
+        ).exists())
+
+    def test_seeded_users_can_log_in(self):
+        """tests the shared password hash is usable."""
+        seed("--users", "1", "--recipes", "1", "--password", "secret123")
+
+        user = get_user_model().objects.get(email="seed-0@example.com")
+        self.assertTrue(user.check_password("secret123"))
+
+    def test_deterministic(self):
+        """tests the same seed always creates the same data."""
+        seed("--users", "2", "--recipes", "5", "--prefix", "a", "--seed", "7")
+        seed(
+            "--users", "2", "--recipes", "5", "--prefix", "b", "--seed", "7",
+            "--users-per-batch", "1",
+        )
+        seed("--users", "2", "--recipes", "5", "--prefix", "c", "--seed", "8")
+
+        self.assertEqual(snapshot("a"), snapshot("b"))
+        self.assertNotEqual(snapshot("a"), snapshot("c"))
+
+    def test_recipe_skew(self):
+        """tests a skewed distribution varies recipes per user."""
+        seed("--users", "20", "--recipes", "10", "--recipe-skew", "1.5")
+
+        counts = set(
+            get_user_model().objects.annotate(n=Count("recipe")).values_list(
+                "n", flat=True
+            )
+        )
+        self.assertGreater(len(counts), 1)
+
+    def test_search_vectors_computed(self):
+        """tests the recipes are searchable without the trigger."""
+        seed("--users", "2", "--recipes", "5")
+
+        recipe = Recipe.objects.first()
+        word = recipe.title.split()[-1]
+        self.assertFalse(Recipe.objects.filter(search_vector__isnull=True).exists())
+        self.assertIn(recipe, Recipe.objects.filter(search_vector=word))
+
+    def test_search_vectors_by_trigger(self):
+        """tests a role that can't skip triggers leaves the table alone."""
+        with mock.patch.object(Seeder, "_is_superuser", return_value=False):
+            with CaptureQueriesContext(connection) as queries:
+                seed("--users", "2", "--recipes", "5")
+
+        self.assertFalse(
+            any("ALTER TABLE" in query["sql"] for query in queries.captured_queries)
+        )
+        recipe = Recipe.objects.first()
+        self.assertIn(recipe, Recipe.objects.filter(search_vector=recipe.title.split()[-1]))
+        self.assertFalse(Recipe.objects.filter(search_vector__isnull=True).exists())
+
+    def test_checks_restored(self):
+        """tests the trigger and the foreign key checks apply again."""
+        seed("--users", "1", "--recipes", "1")
+
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW session_replication_role")
+            self.assertEqual(cursor.fetchone()[0], "origin")
+        recipe = Recipe.objects.create(
+            user=get_user_model().objects.get(), title="lentil soup",
+            time_minutes=5, price="1.00",
+        )
+        self.assertIn(recipe, Recipe.objects.filter(search_vector="lentil"))
+
+    def test_invalid_options(self):
+        """tests bad distributions and reused prefixes are rejected."""
+        with self.assertRaises(CommandError):
+            seed("--recipe-skew", "0.5")
+        with self.assertRaises(CommandError):
+            seed("--workers", "0")
+
+        seed("--users", "1", "--recipes", "1")
+        with self.assertRaises(CommandError):
+            seed("--users", "1", "--recipes", "1")
+
+
+class SeedWorkersTests(TransactionTestCase):
+    """tests seeding in worker processes."""
+
+    @tag("slow")
+    def test_workers(self):
+        """tests workers write the same data to the same database."""
+        seed("--users", "4", "--recipes", "5", "--prefix", "a", "--seed", "3")
+        seed(
+            "--users", "4", "--recipes", "5", "--prefix", "b", "--seed", "3",
+            "--users-per-batch", "1", "--workers", "2",
+        )
+
+        self.assertEqual(Recipe.objects.count(), 40)
+        self.assertEqual(snapshot("a"), snapshot("b"))
@@ -0,0 +1,50 @@
+"""
+Tests the content addressed storage.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage, content_name, digest_of
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """tests naming files after their content."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.storage = ContentAddressedStorage(location=self.dir.name)
+
+    def test_named_after_content(self):
+        """tests the name is the sha256 with the extension kept."""
+        digest = hashlib.sha256(b"pixels").hexdigest()
+
+        name = self.storage.save("uploads/photo.JPG", ContentFile(b"pixels"))
+
+        self.assertEqual(name, f"images/{digest[:2]}/{digest[2:4]}/{digest}.jpg")
+        self.assertEqual(name, content_name(digest, ".JPG"))
+        self.assertEqual(digest_of(name), digest)
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b"pixels")
+
+    def test_duplicates_stored_once(self):
+        """tests saving identical content again writes nothing."""
+        first = self.storage.save("a.png", ContentFile(b"same"))
+        modified = os.stat(self.storage.path(first)).st_mtime_ns
+
+        second = self.storage.save("b.png", ContentFile(b"same"))
+
+        self.assertEqual(first, second)
+        self.assertEqual(os.stat(self.storage.path(first)).st_mtime_ns, modified)
+        self.assertNotEqual(self.storage.save("a.png", ContentFile(b"other")), first)
+        files = [f for _, _, names in os.walk(self.dir.name) for f in names]
+        self.assertEqual(len(files), 2)
+
+    def test_digest_of_other_names(self):
+        """tests names from before content addressing have no digest."""
+        self.assertIsNone(digest_of("uploads/recipe/photo.jpg"))
+        self.assertIsNone(digest_of(""))
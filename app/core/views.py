@@ -0,0 +1,27 @@
+"""
+Views of the core app.
+"""
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework import status
+
+from core import metrics as core_metrics
+
+
+def metrics(request):
+    """
+    serves the Prometheus metrics to requests carrying METRICS_TOKEN
+    as a bearer token. without a token they're only served while
+    DEBUG is on, the metrics aren't public.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    elif not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"
+    ):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+
+    content, content_type = core_metrics.render()
+    return HttpResponse(content, content_type=content_type)
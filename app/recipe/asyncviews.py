@@ -0,0 +1,71 @@
+"""
+Async entry points of the recipe read endpoints, for the ASGI handler.
+
+under ASGI Django calls a sync view through a thread sensitive adapter,
+every such call in the process runs on one shared thread, so requests
+queue behind each other's queries. the views wrapped here are
+coroutines that make a single hop to the thread pool, where the
+authentication, cache, queries and rendering of the request all run,
+in parallel with other requests.
+Django 3.2 has no async ORM or cache, so that one hop is as close to
+native as the read path gets.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def _pooled(view):
+    """runs a view in a pool thread, the database connection is per thread."""
+
+    @functools.wraps(view)
+    def run(request, *args, **kwargs):
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            # rendered here, so Django's own render call has nothing left
+            # to do on the shared thread.
+            if hasattr(response, "render") and callable(response.render):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    return run
+
+
+def async_view(view):
+    """
+    wraps a sync view into a coroutine. reads run in the thread pool,
+    writes keep Django's thread sensitive hop, they are rare and may
+    rely on it.
+    """
+    read = sync_to_async(_pooled(view), thread_sensitive=False)
+    write = sync_to_async(view, thread_sensitive=True)
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return wrapper
+
+
+def wrap_patterns(patterns, names):
+    """returns the url patterns with the named views made async."""
+    return [
+        URLPattern(
+            pattern.pattern,
+            async_view(pattern.callback),
+            pattern.default_args,
+            pattern.name,
+        )
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in patterns
+    ]
@@ -0,0 +1,209 @@
+"""
+Batch create/update of recipes.
+
+every item is validated with the regular recipe serializer, then the
+valid ones are written with a fixed number of statements however many
+recipes, tags and ingredients the batch has:
+all names are resolved at once with get_or_create_many, recipes are
+inserted with bulk_create and changed with bulk_update, and the links
+are diffed against the current ones, so per relation one delete
+removes the dropped links and one insert adds the new ones.
+bulk statements skip the model signals, so the cache invalidation and
+the updated_at timestamps are handled here.
+"""
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext as _
+from rest_framework import status
+
+from core.models import Ingredient, Recipe, Tag
+from recipe.cache import invalidate_user
+
+RELATIONS = (("tags", Tag), ("ingredients", Ingredient))
+
+
+def is_id(value):
+    """whether a JSON value can be a primary key, booleans can't."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class BulkItem:
+    """one entry of a batch and its outcome."""
+
+    def __init__(self, index, data):
+        self.index = index
+        self.data = data
+        self.instance = None
+        self.validated_data = None
+        self.status = None
+        self.errors = None
+
+    @property
+    def valid(self):
+        return self.errors is None
+
+    def fail(self, code, errors):
+        self.status = code
+        self.errors = errors
+
+
+class RecipeBulkWriter:
+    """validates and writes a batch of recipes for a user."""
+
+    def __init__(self, user, serializer_class, context):
+        self.user = user
+        self.serializer_class = serializer_class
+        self.context = context
+
+    def _load_instances(self, items):
+        """attaches the recipes being updated, in a single query."""
+        ids = [item.data["id"] for item in items if "id" in item.data]
+        recipes = Recipe.objects.defer("search_vector").filter(
+            user=self.user, pk__in=[pk for pk in ids if is_id(pk)]
+        ).in_bulk()
+
+        seen = set()
+        for item in items:
+            if "id" not in item.data:
+                continue
+
+            pk = item.data["id"]
+            if not is_id(pk):
+                item.fail(
+                    status.HTTP_400_BAD_REQUEST,
+                    {"id": [_("A valid integer is required.")]},
+                )
+                continue
+            if pk in seen:
+                item.fail(
+                    status.HTTP_400_BAD_REQUEST,
+                    {"id": [_("Listed more than once in the batch.")]},
+                )
+            elif pk not in recipes:
+                item.fail(status.HTTP_404_NOT_FOUND, {"id": [_("Not found.")]})
+            else:
+                item.instance = recipes[pk]
+            seen.add(pk)
+
+    def validate(self, data):
+        """returns the items of a batch with their validation outcome."""
+        items = [BulkItem(index, entry) for index, entry in enumerate(data)]
+        for item in items:
+            if not isinstance(item.data, dict):
+                item.fail(
+                    status.HTTP_400_BAD_REQUEST,
+                    {"non_field_errors": [_("Expected an object.")]},
+                )
+
+        self._load_instances([item for item in items if item.valid])
+
+        for item in items:
+            if not item.valid:
+                continue
+
+            serializer = self.serializer_class(
+                item.instance,
+                data=item.data,
+                partial=item.instance is not None,
+                context=self.context,
+            )
+            if serializer.is_valid():
+                item.validated_data = serializer.validated_data
+            else:
+                item.fail(status.HTTP_400_BAD_REQUEST, serializer.errors)
+
+        return items
+
+    def _resolve_names(self, items):
+        """returns {relation: {name: object}} for every name in the batch."""
+        resolved = {}
+        for relation, model in RELATIONS:
+            names = {
+                entry["name"]
+                for item in items
+                for entry in item.validated_data.get(relation, [])
+            }
+            resolved[relation] = model.objects.get_or_create_many(self.user, names)
+
+        return resolved
+
+    def _write_links(self, items, resolved):
+        """links every item that lists a relation to exactly those objects."""
+        for relation, model in RELATIONS:
+            through = getattr(Recipe, relation).through
+            target = f"{Recipe._meta.get_field(relation).m2m_reverse_field_name()}_id"
+            listed = [item for item in items if relation in item.validated_data]
+            wanted = {
+                (item.instance.pk, resolved[relation][entry["name"]].pk)
+                for item in listed
+                for entry in item.validated_data[relation]
+            }
+            replaced = [
+                item.instance.pk
+                for item in listed
+                if item.status == status.HTTP_200_OK
+            ]
+
+            current = {}
+            if replaced:
+                current = {
+                    (recipe_id, target_id): pk
+                    for pk, recipe_id, target_id in through.objects.filter(
+                        recipe_id__in=replaced
+                    ).values_list("pk", "recipe_id", target)
+                }
+
+            removed = [pk for pair, pk in current.items() if pair not in wanted]
+            if removed:
+                through.objects.filter(pk__in=removed).delete()
+
+            through.objects.bulk_create(
+                [
+                    through(recipe_id=recipe_id, **{target: target_id})
+                    for recipe_id, target_id in wanted
+                    if (recipe_id, target_id) not in current
+                ],
+                ignore_conflicts=True,
+            )
+
+    @transaction.atomic
+    def save(self, items):
+        """writes the valid items and returns the saved recipes in order."""
+        items = [item for item in items if item.valid]
+        if not items:
+            return []
+
+        resolved = self._resolve_names(items)
+        now = timezone.now()
+        fields = set()
+        created = []
+
+        for item in items:
+            values = {
+                field: value
+                for field, value in item.validated_data.items()
+                if field not in dict(RELATIONS)
+            }
+            if item.instance is None:
+                item.instance = Recipe(user=self.user, **values)
+                item.status = status.HTTP_201_CREATED
+                created.append(item.instance)
+            else:
+                for field, value in values.items():
+                    setattr(item.instance, field, value)
+                item.status = status.HTTP_200_OK
+                fields.update(values)
+            item.instance.updated_at = now
+
+        Recipe.objects.bulk_create(created)
+
+        updated = [
+            item.instance for item in items if item.status == status.HTTP_200_OK
+        ]
+        if updated:
+            Recipe.objects.bulk_update(updated, sorted(fields) + ["updated_at"])
+
+        self._write_links(items, resolved)
+        invalidate_user(self.user.pk)
+
+        return [item.instance.pk for item in items]
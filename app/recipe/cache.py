@@ -0,0 +1,79 @@
+"""
+Per-user versioned response cache for the Recipe API.
+
+every user has a version counter that is part of the key of each
+cached response. writes bump the counter instead of deleting
+entries, so invalidation is O(1) and responses cached under an
+older version are never read again, the backend just evicts them.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from core.db.router import pin_primary
+
+VERSION_KEY = "recipe:version:{user_id}"
+RESPONSE_KEY = "recipe:response:{user_id}:{version}:{digest}"
+VALIDATORS_KEY = "{response_key}:validators"
+
+
+def get_cache():
+    """returns the configured cache backend."""
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def _new_version():
+    """
+    starting point for a counter, a timestamp is used so that
+    when a counter gets evicted it restarts above any value
+    it had before.
+    """
+    return time.time_ns()
+
+
+def get_user_version(user_id):
+    """returns the current cache version of a user."""
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+
+    return version
+
+
+def bump_user_version(user_id):
+    """moves a user to a new cache version."""
+    cache = get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def invalidate_user(user_id):
+    """
+    invalidates everything cached for a user.
+    the version is bumped right away and again once the transaction
+    commits, otherwise a read in between could cache the data from
+    before the commit under the new version. the user's reads are
+    pinned to the primary too, the replicas may not have the write yet.
+    """
+    pin_primary(user_id)
+    bump_user_version(user_id)
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+def response_cache_key(request):
+    """returns the cache key of a read for the requesting user."""
+    digest = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return RESPONSE_KEY.format(
+        user_id=request.user.pk,
+        version=get_user_version(request.user.pk),
+        digest=digest,
+    )
@@ -0,0 +1,152 @@
+"""
+Streaming export of a user's recipes.
+
+recipes are read through a server-side cursor a chunk at a time, the
+tags and ingredients of each chunk are loaded with one query per
+relation, and every chunk is encoded and handed to the response
+before the next one is read. memory use depends on the chunk size,
+not on how many recipes the user has.
+the response is sent after the view returned, so the encoded chunks
+are read through an ExportStream, which keeps the view's routing and,
+under ASGI, reads them on a thread of its own.
+"""
+import asyncio
+import csv
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+
+from core.db import router
+from core.models import Recipe
+
+FIELDS = ["id", "title", "description", "time_minutes", "price", "link"]
+RELATIONS = ["tags", "ingredients"]
+
+
+class Echo:
+    """file-like object that returns what is written to it."""
+
+    def write(self, value):
+        return value
+
+
+def _related_names(relation, recipe_ids):
+    """returns {recipe id: [names]} of a relation for a chunk of recipes."""
+    through = getattr(Recipe, relation).through
+    target = Recipe._meta.get_field(relation).m2m_reverse_field_name()
+    links = through.objects.filter(recipe_id__in=recipe_ids).order_by(
+        "recipe_id", f"{target}__name"
+    ).values_list("recipe_id", f"{target}__name")
+
+    names = {}
+    for recipe_id, name in links:
+        names.setdefault(recipe_id, []).append(name)
+
+    return names
+
+
+def iter_chunks(queryset, chunk_size):
+    """yields lists of recipe dicts with their tags and ingredients."""
+    rows = queryset.values(*FIELDS).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+
+        recipe_ids = [row["id"] for row in chunk]
+        related = {
+            relation: _related_names(relation, recipe_ids) for relation in RELATIONS
+        }
+        for row in chunk:
+            for relation in RELATIONS:
+                row[relation] = related[relation].get(row["id"], [])
+
+        yield chunk
+        # drop the chunk before the next one is read, otherwise two
+        # chunks are alive at the peak.
+        del chunk, related
+
+
+def ndjson(queryset, chunk_size):
+    """yields the recipes as newline delimited JSON."""
+    encoder = DjangoJSONEncoder()
+    for chunk in iter_chunks(queryset, chunk_size):
+        data = "".join(encoder.encode(row) + "\n" for row in chunk)
+        del chunk
+        yield data
+
+
+def csv_rows(queryset, chunk_size):
+    """yields the recipes as CSV, names are joined with commas."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(FIELDS + RELATIONS)
+    for chunk in iter_chunks(queryset, chunk_size):
+        data = "".join(
+            writer.writerow(
+                [row[field] for field in FIELDS]
+                + [",".join(row[relation]) for relation in RELATIONS]
+            )
+            for row in chunk
+        )
+        del chunk
+        yield data
+
+
+class ExportStream:
+    """
+    iterable over the parts of an export, sync for WSGI and async for
+    core.asgi.ASGIHandler.
+    ReplicaReadMixin resets the replica routing when the view returns,
+    before the first part is read, so the routing is captured here and
+    set around every part. async iteration reads the parts on one
+    thread of its own, the server-side cursor needs the same
+    connection throughout and the event loop can't run queries.
+    """
+
+    def __init__(self, parts):
+        self._parts = parts
+        self._replica_reads = router.replica_reads.get()
+
+    def _next(self):
+        """returns the next part, None at the end."""
+        token = router.replica_reads.set(self._replica_reads)
+        try:
+            return next(self._parts, None)
+        finally:
+            router.replica_reads.reset(token)
+
+    def _close(self):
+        """closes the stream and the connections of the calling thread."""
+        self._parts.close()
+        connections.close_all()
+
+    def __iter__(self):
+        try:
+            while True:
+                part = self._next()
+                if part is None:
+                    return
+                yield part
+        finally:
+            self._parts.close()
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        thread = ThreadPoolExecutor(max_workers=1)
+        try:
+            while True:
+                part = await loop.run_in_executor(thread, self._next)
+                if part is None:
+                    return
+                yield part
+        finally:
+            await loop.run_in_executor(thread, self._close)
+            thread.shutdown(wait=False)
+
+
+FORMATS = {
+    "ndjson": (ndjson, "application/x-ndjson"),
+    "csv": (csv_rows, "text/csv"),
+}
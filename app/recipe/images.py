@@ -0,0 +1,282 @@
+"""
+Resized renditions of recipe images.
+
+images are content addressed (see core.storage) and counted with an
+ImageBlob, so an image uploaded again is only another reference and
+reuses the renditions that were already made.
+a new image is handed to a pool of worker processes once its upload
+is committed, they write a thumbnail, card and full size copy in WebP
+and JPEG, so the request doesn't wait for the resizing and clients
+never have to download the original. when a worker is done the file
+names are stored on the blob and every recipe using the image.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import django
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Case, F, TextField, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from core.models import ImageBlob, Recipe
+from recipe.cache import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+# the largest width and height of each rendition, images are never
+# enlarged.
+RENDITIONS = {
+    "thumbnail": (200, 200),
+    "card": (640, 480),
+    "full": (1600, 1600),
+}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+# the Pillow feature each format needs.
+CODECS = {"webp": "webp", "jpeg": "jpg"}
+
+_executor = None
+
+
+def available_formats():
+    """returns the formats the installed Pillow can write."""
+    return [ext for ext in FORMATS if features.check(CODECS[ext])]
+
+
+def rendition_name(name, rendition, ext):
+    """returns the file name of a rendition of an image."""
+    directory, filename = os.path.split(name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, "renditions", f"{stem}-{rendition}.{ext}")
+
+
+def rendition_names(renditions):
+    """returns every file name in a renditions mapping."""
+    return [name for files in renditions.values() for name in files.values()]
+
+
+def rendition_urls(renditions, request=None):
+    """returns the renditions mapping with urls instead of file names."""
+    urls = {}
+    for rendition, files in renditions.items():
+        urls[rendition] = {}
+        for ext, name in files.items():
+            url = default_storage.url(name)
+            urls[rendition][ext] = request.build_absolute_uri(url) if request else url
+
+    return urls
+
+
+def _flatten(image):
+    """returns an RGB copy of an image, transparency becomes white."""
+    if image.mode == "RGB":
+        return image
+
+    image = image.convert("RGBA")
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def render(name):
+    """
+    writes the renditions of an image and returns their file names.
+    this runs in a worker process.
+    """
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+
+    formats = available_formats()
+    renditions = {}
+    for rendition, size in RENDITIONS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+        renditions[rendition] = {}
+        for ext in formats:
+            codec, options = FORMATS[ext]
+            output = io.BytesIO()
+            (resized if codec == "WEBP" else _flatten(resized)).save(
+                output, codec, **options
+            )
+            renditions[rendition][ext] = default_storage.save(
+                rendition_name(name, rendition, ext), ContentFile(output.getvalue())
+            )
+
+    return renditions
+
+
+def get_executor():
+    """returns the worker pool, it's started on first use."""
+    global _executor
+    if _executor is None:
+        # spawned rather than forked, a forked worker would inherit the
+        # database connections and the threads of the server. this
+        # module can only be imported once django is set up.
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_RENDITION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+
+    return _executor
+
+
+def _store(name, renditions):
+    """saves finished renditions on the blob and the recipes using it."""
+    ImageBlob.objects.filter(name=name).update(renditions=renditions)
+    recipes = Recipe.objects.filter(image=name)
+    user_ids = set(recipes.values_list("user_id", flat=True))
+    recipes.update(image_renditions=renditions, updated_at=timezone.now())
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+def _done(recipe_id, name, submitter, future):
+    """
+    stores the result of a worker. this runs in a thread of the pool,
+    or in the submitting thread when the worker was already done.
+    """
+    try:
+        _store(name, future.result())
+    except Exception:
+        logger.exception("resizing %s of recipe %s failed", name, recipe_id)
+    finally:
+        if threading.get_ident() != submitter:
+            connection.close()
+
+
+def _submit(recipe_id, name):
+    if not settings.IMAGE_RENDITION_WORKERS:
+        try:
+            renditions = render(name)
+        except Exception:
+            logger.exception("resizing %s of recipe %s failed", name, recipe_id)
+            return
+        _store(name, renditions)
+        return
+
+    future = get_executor().submit(render, name)
+    future.add_done_callback(
+        partial(_done, recipe_id, name, threading.get_ident())
+    )
+
+
+def schedule(recipe):
+    """resizes the image of a recipe once the transaction commits."""
+    name = recipe.image.name
+    transaction.on_commit(lambda: _submit(recipe.pk, name))
+
+
+def release(name):
+    """drops a reference to an image, the last one marks it unused."""
+    ImageBlob.objects.filter(name=name).update(
+        refcount=F("refcount") - 1,
+        unreferenced_at=Case(
+            When(refcount__lte=1, then=Value(timezone.now())),
+            default=F("unreferenced_at"),
+        ),
+    )
+
+
+def set_image(recipe, content, filename):
+    """
+    makes a file the image of a recipe and releases the one it had.
+    an image that was uploaded before is only another reference, it
+    shares the file and the renditions, which are only made for new
+    images.
+    """
+    old = recipe.image.name
+    name = default_storage.save(
+        recipe.image.field.generate_filename(recipe, filename), content
+    )
+
+    with transaction.atomic():
+        blob, _ = ImageBlob.objects.select_for_update().get_or_create(
+            name=name, defaults={"size": content.size}
+        )
+        # the file may have been collected since it was found to
+        # exist, the lock keeps that from happening from here on.
+        if not default_storage.exists(name):
+            default_storage.save(name, content)
+        blob.refcount += 1
+        blob.unreferenced_at = None
+        blob.save()
+
+        recipe.image.name = name
+        recipe.image_renditions = blob.renditions
+        recipe.save()
+        if old:
+            release(old)
+
+    if not blob.renditions:
+        schedule(recipe)
+
+    return recipe
+
+
+def _shared(blob, name):
+    """
+    tells if another image has a rendition with this name, identical
+    renditions of different images are the same file.
+    """
+    return ImageBlob.objects.exclude(pk=blob.pk).annotate(
+        names=Cast("renditions", TextField())
+    ).filter(names__contains=f'"{name}"').exists()
+
+
+def collect(grace):
+    """
+    deletes the images no recipe used for the last grace seconds,
+    with their renditions, and returns how many were deleted.
+    """
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    candidates = list(
+        ImageBlob.objects.filter(
+            refcount__lte=0, unreferenced_at__lt=cutoff
+        ).values_list("pk", flat=True)
+    )
+
+    deleted = 0
+    for pk in candidates:
+        with transaction.atomic():
+            blob = ImageBlob.objects.select_for_update(skip_locked=True).filter(
+                pk=pk, refcount__lte=0
+            ).first()
+            if blob is None:
+                continue
+
+            # only the API counts references, a recipe changed another
+            # way, like in the admin, still keeps its image.
+            references = Recipe.objects.filter(image=blob.name).count()
+            if references:
+                blob.refcount = references
+                blob.unreferenced_at = None
+                blob.save()
+                continue
+
+            # the files go while the blob is locked, an upload of the
+            # same image waits and then writes the file again.
+            default_storage.delete(blob.name)
+            for name in rendition_names(blob.renditions):
+                if not _shared(blob, name):
+                    default_storage.delete(name)
+            blob.delete()
+            deleted += 1
+
+    return deleted
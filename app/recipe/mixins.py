@@ -0,0 +1,201 @@
+"""
+Mixins for the Recipe API views.
+"""
+import hashlib
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from core.db import router
+from recipe.cache import (
+    VALIDATORS_KEY,
+    get_cache,
+    get_user_version,
+    response_cache_key,
+)
+
+
+class ReplicaReadMixin:
+    """
+    serves the reads of a view from the read replicas, see
+    core.db.router, unless the user wrote in the last few seconds.
+    authentication runs before, on default.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method in SAFE_METHODS
+            and not router.is_pinned(request.user.pk)
+        ):
+            self._replica_token = router.replica_reads.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_token is not None:
+                router.replica_reads.reset(self._replica_token)
+
+
+class CachedResponseMixin:
+    """caches successful reads per user, see recipe.cache."""
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        """returns the cached response data or caches the handler's."""
+        cache = get_cache()
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+
+        return response
+
+
+class CachedListModelMixin(CachedResponseMixin):
+    """caches the list action."""
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+
+class CachedRetrieveModelMixin(CachedResponseMixin):
+    """caches the retrieve action."""
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(super().retrieve, request, *args, **kwargs)
+
+
+class ConditionalResponseMixin:
+    """
+    answers conditional reads with 304 Not Modified.
+    the validators are computed before anything is serialized, so a
+    revalidation doesn't serialize the response and usually doesn't
+    touch the database.
+    """
+
+    def _validators(self, request, *parts, last_modified=None):
+        """returns the ETag and Last-Modified of a representation."""
+        fingerprint = "|".join(
+            str(part)
+            for part in (
+                request.build_absolute_uri(),
+                request.accepted_renderer.format,
+                request.user.pk,
+            ) + parts
+        )
+        etag = quote_etag(hashlib.sha256(fingerprint.encode()).hexdigest())
+        if last_modified is not None:
+            last_modified = int(last_modified.timestamp())
+
+        return etag, last_modified
+
+    def _cached_validators(self, request, compute):
+        """returns the cached validators of a read or computes them."""
+        cache = get_cache()
+        key = VALIDATORS_KEY.format(response_key=response_cache_key(request))
+        validators = cache.get(key)
+        if validators is None:
+            validators = compute()
+            cache.set(key, validators, settings.RECIPE_CACHE_TIMEOUT)
+
+        return validators
+
+    def _conditional_response(self, handler, validators, request, *args, **kwargs):
+        """returns 304 when the client's copy is current or runs the handler."""
+        etag, last_modified = validators
+        headers = {"ETag": etag}
+        if last_modified is not None:
+            headers["Last-Modified"] = http_date(last_modified)
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        elif response.status_code == status.HTTP_304_NOT_MODIFIED:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            return response
+
+        if response.status_code in (
+            status.HTTP_200_OK,
+            status.HTTP_304_NOT_MODIFIED,
+        ):
+            for header, value in headers.items():
+                response[header] = value
+
+        return response
+
+
+class ConditionalListModelMixin(ConditionalResponseMixin):
+    """
+    conditional list action, the ETag is derived from the user's
+    cache version, see recipe.cache, which every write of the user
+    moves, deletes included, so it costs no query. there's no
+    Last-Modified, no timestamp of the list changes when an object
+    other than the newest one is removed.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().list,
+            self._validators(request, get_user_version(request.user.pk)),
+            request,
+            *args,
+            **kwargs,
+        )
+
+
+class ConditionalRetrieveModelMixin(ConditionalResponseMixin):
+    """
+    conditional retrieve action, the object is loaded without its
+    relations to compute the validators and they are only prefetched
+    when the full response is needed.
+    """
+
+    _conditional_object = None
+
+    def _retrieve_validators(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = get_object_or_404(
+            queryset, **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(request, instance)
+        self._conditional_object = instance
+        return self._validators(
+            request, instance.updated_at, last_modified=instance.updated_at
+        )
+
+    def get_object(self):
+        instance = self._conditional_object
+        if instance is None:
+            return super().get_object()
+
+        lookups = self.get_queryset()._prefetch_related_lookups
+        prefetch_related_objects([instance], *lookups)
+        return instance
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(
+            super().retrieve,
+            self._cached_validators(
+                request, lambda: self._retrieve_validators(request)
+            ),
+            request,
+            *args,
+            **kwargs,
+        )
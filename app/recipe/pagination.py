@@ -0,0 +1,38 @@
+"""
+Pagination for the Recipe API.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    opaque keyset pagination over the newest recipes first.
+    pages are located by seeking past the last seen id instead
+    of an offset and there's no COUNT(*), so deep pages cost
+    the same as the first one.
+    """
+
+    ordering = "-id"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    # search results are ranked, the id only breaks ties.
+    search_ordering = ("-rank", "-id")
+
+    def get_ordering(self, request, queryset, view):
+        """orders search results by their rank."""
+        if request.query_params.get("search"):
+            return self.search_ordering
+
+        return super().get_ordering(request, queryset, view)
+
+
+class NameCursorPagination(RecipeCursorPagination):
+    """
+    keyset pagination for tags and ingredients ordered by name.
+    names are unique per user so they need no id tie-breaker,
+    which lets the (user, name) index serve the ordering.
+    """
+
+    ordering = "-name"
@@ -2,11 +2,38 @@
 serializers for the recipe API.
 """
 
+import os
+import re
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext as _
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from core.models import *
+from recipe import images
 
 
-class TagSerializer(serializers.ModelSerializer):
+class UniqueNameMixin:
+    """rejects renaming a tag or ingredient to a name the user already has."""
+
+    def validate_name(self, value):
+        """
+        only applies when editing the object directly, nested in a recipe
+        an existing name just means reusing that object.
+        """
+        if self.instance is not None and self.parent is None:
+            clash = self.Meta.model.objects.filter(
+                user=self.context["request"].user, name=value
+            ).exclude(pk=self.instance.pk)
+            if clash.exists():
+                raise serializers.ValidationError(_("This name is already in use."))
+
+        return value
+
+
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """serializer for tags."""
 
     class Meta:
@@ -15,7 +42,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_field = ["id"]
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """serializer for ingredients."""
 
     class Meta:
@@ -24,7 +51,20 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_field = ["id"]
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RenditionsMixin(serializers.Serializer):
+    """adds the urls of the resized copies of the recipe image."""
+
+    renditions = serializers.SerializerMethodField()
+
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_renditions(self, obj):
+        """{rendition: {format: url}}, empty until they're made."""
+        return images.rendition_urls(
+            obj.image_renditions, self.context.get("request")
+        )
+
+
+class RecipeSerializer(RenditionsMixin, serializers.ModelSerializer):
     """Serializer for Recipe."""
 
     tags = TagSerializer(many=True, required=False)
@@ -32,25 +72,29 @@ class RecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ["id", "title", "time_minutes", "price", "link", "tags", "ingredients"]
+        fields = [
+            "id", "title", "time_minutes", "price", "link", "tags", "ingredients",
+            "renditions",
+        ]
         read_only_fields = ["id"]
 
-    def _get_or_create_tags(self, tags, recipe):
-        """saves the list of tags to a specific recipe."""
+    def _get_or_create_tags(self, tags):
+        """returns the tag objects for a list of tags, creating missing ones."""
         auth_user = self.context["request"].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(tag_obj)
+        tag_objs = Tag.objects.get_or_create_many(
+            auth_user, [tag["name"] for tag in tags]
+        )
+        return list(tag_objs.values())
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        """saves a list of ingredients to a specific recipe."""
+    def _get_or_create_ingredients(self, ingredients):
+        """returns the ingredient objects for a list, creating missing ones."""
         auth_user = self.context["request"].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user, **ingredient
-            )
-            recipe.ingredients.add(ingredient_obj)
+        ingredient_objs = Ingredient.objects.get_or_create_many(
+            auth_user, [ingredient["name"] for ingredient in ingredients]
+        )
+        return list(ingredient_objs.values())
 
+    @transaction.atomic
     def create(self, validated_data):
         """
         to create objects with this serializer that has
@@ -74,11 +118,12 @@ class RecipeSerializer(serializers.ModelSerializer):
         ingredients = validated_data.pop("ingredients", [])
         recipe = Recipe.objects.create(**validated_data)  # unpack operator
 
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        recipe.tags.add(*self._get_or_create_tags(tags))
+        recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """
         handles updating for serializers with nested serializers
@@ -91,13 +136,13 @@ class RecipeSerializer(serializers.ModelSerializer):
         tags = validated_data.pop("tags", None)
         ingredients = validated_data.pop("ingredients", None)
 
+        # set() diffs against the current links, so only removed
+        # links are deleted and only new links are inserted.
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_tags(tags))
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(self._get_or_create_ingredients(ingredients))
 
         # normal updating.
         for attr, value in validated_data.items():
@@ -113,15 +158,46 @@ class RecipeDetailSerializer(RecipeSerializer):
     class Meta(RecipeSerializer.Meta):
         fields = RecipeSerializer.Meta.fields + ["description"]
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(RenditionsMixin, serializers.ModelSerializer):
     """Serializer for uploading images to recipe."""
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'renditions']
         read_only_fields = ['id']
         extra_kwargs = {
             'image': {
                 'required': 'True',
             }
         }
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """Serializer for resumable image uploads."""
+
+    offset = serializers.IntegerField(source="received", read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ["id", "filename", "size", "checksum", "offset"]
+        read_only_fields = ["id"]
+
+    def validate_filename(self, value):
+        """keeps only the name, the directory is chosen by the recipe."""
+        name = os.path.basename(value.replace("\\", "/"))
+        if not name:
+            raise serializers.ValidationError(_("must be a file name."))
+        return name
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                _("must be between 1 and %d bytes.") % settings.UPLOAD_MAX_SIZE
+            )
+        return value
+
+    def validate_checksum(self, value):
+        value = value.lower()
+        if not re.fullmatch(r"[0-9a-f]{64}", value):
+            raise serializers.ValidationError(_("must be a hex encoded sha256."))
+        return value
@@ -0,0 +1,79 @@
+"""
+Signal handlers for the Recipe API.
+"""
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient, UploadSession
+from recipe import images, uploads
+from recipe.cache import invalidate_user
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_owner_cache(sender, instance, **kwargs):
+    """invalidates the owner's cached reads when an object changes."""
+    invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_owner_cache_on_links(sender, instance, action, **kwargs):
+    """invalidates the owner's cached reads when recipe links change."""
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate_user(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipes_on_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """marks recipes as modified when their tags or ingredients change."""
+    now = timezone.now()
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            Recipe.objects.filter(pk=instance.pk).update(updated_at=now)
+            instance.updated_at = now
+    elif action in ("post_add", "post_remove"):
+        Recipe.objects.filter(pk__in=pk_set).update(updated_at=now)
+    elif action == "pre_clear":
+        # after clearing there is no way to tell which recipes were linked.
+        instance.recipe_set.update(updated_at=now)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_on_names(sender, instance, created=False, **kwargs):
+    """
+    marks recipes as modified when a tag or ingredient they list
+    is renamed or about to be deleted.
+    """
+    if not created:
+        instance.recipe_set.update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    """drops the reference of a deleted recipe to its image."""
+    if instance.image:
+        images.release(instance.image.name)
+
+
+@receiver(post_delete, sender=UploadSession)
+def discard_upload_spool(sender, instance, **kwargs):
+    """deletes the spooled bytes of a finished or abandoned upload."""
+    # the path is taken now, the id is cleared once the delete is done.
+    path = uploads.spool_path(instance)
+    transaction.on_commit(lambda: uploads.discard(path))
@@ -0,0 +1,132 @@
+"""
+Tests the async recipe read views.
+"""
+import asyncio
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import TransactionTestCase, override_settings
+from django.urls import URLPattern
+from prometheus_client import REGISTRY
+
+from core import benchmarks
+from core.models import Recipe, Tag
+from recipe import asyncviews
+from recipe.urls import ASYNC_READS, router
+from recipe.views import RecipeViewSet
+from user.tokens import issue_pair
+
+# the async views run on a pool thread with their own connection, the
+# data has to be committed for them to see it.
+
+
+class AsyncViewTests(TransactionTestCase):
+    """tests the async views through the ASGI handler."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="async@example.com", name="async", password="testpass123"
+        )
+        self.token = issue_pair(self.user)["token"]
+        Tag.objects.create(user=self.user, name="vegan")
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="soup", time_minutes=5, price=Decimal("1.00")
+        )
+        self.urls = override_settings(ROOT_URLCONF=__name__)
+        self.urls.enable()
+        self.addCleanup(self.urls.disable)
+
+    def request(self, path, method="GET", token=None):
+        """sends a request through the ASGI handler."""
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", f"Token {token or self.token}".encode()),
+            ],
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(ASGIHandler()(scope, receive, send))
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        return messages[0]["status"], body
+
+    def test_wrapped_views_are_coroutines(self):
+        """tests only the named reads are made async."""
+        patterns = asyncviews.wrap_patterns(router.urls, ASYNC_READS)
+
+        wrapped = {
+            pattern.name
+            for pattern in patterns
+            if isinstance(pattern, URLPattern)
+            and asyncio.iscoroutinefunction(pattern.callback)
+        }
+        self.assertEqual(wrapped, ASYNC_READS)
+        callback = next(p for p in patterns if p.name == "recipe-list").callback
+        self.assertIs(callback.cls, RecipeViewSet)
+        self.assertTrue(callback.csrf_exempt)
+
+    def test_list_and_detail(self):
+        """tests the async reads return what the sync views return."""
+        status, body = self.request("/recipes/")
+        self.assertEqual(status, 200)
+        self.assertEqual([r["id"] for r in json.loads(body)["results"]], [self.recipe.id])
+
+        status, body = self.request(f"/recipes/{self.recipe.id}/")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["title"], "soup")
+
+        status, body = self.request("/tags/")
+        self.assertEqual(status, 200)
+        self.assertEqual([t["name"] for t in json.loads(body)["results"]], ["vegan"])
+
+    def test_queries_counted(self):
+        """tests the queries on the pool thread count for the request."""
+        labels = {"route": "recipe-list"}
+        before = REGISTRY.get_sample_value("http_request_sql_queries_sum", labels) or 0
+
+        self.request("/recipes/")
+
+        after = REGISTRY.get_sample_value("http_request_sql_queries_sum", labels)
+        self.assertGreater(after, before)
+
+    def test_authentication(self):
+        """tests the async reads authenticate the request."""
+        status, _ = self.request("/recipes/", token="invalid")
+
+        self.assertEqual(status, 401)
+
+    def test_writes_keep_the_sync_path(self):
+        """tests other methods on a wrapped url still reach the view."""
+        status, _ = self.request(f"/recipes/{self.recipe.id}/", method="DELETE")
+
+        self.assertEqual(status, 204)
+        self.assertFalse(Recipe.objects.exists())
+
+    @override_settings(ALLOWED_HOSTS=["localhost"])
+    def test_throughput(self):
+        """tests the throughput helpers drive both handlers."""
+        for throughput, application in [
+            (benchmarks.wsgi_throughput, WSGIHandler()),
+            (benchmarks.asgi_throughput, ASGIHandler()),
+        ]:
+            rate = throughput(application, "/recipes/", self.token, 4, 8)
+            self.assertGreater(rate, 0)
+
+        with self.assertRaises(AssertionError):
+            benchmarks.wsgi_throughput(WSGIHandler(), "/recipes/", "invalid", 2, 2)
+
+
+urlpatterns = asyncviews.wrap_patterns(router.urls, ASYNC_READS)
@@ -0,0 +1,247 @@
+"""
+Tests the batch create/update endpoint of the recipe API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+BULK_URL = reverse("recipe:recipe-bulk")
+RECIPE_URL = reverse("recipe:recipe-list")
+
+
+def create_recipe(user, **params):
+    """creates and returns a sample recipe."""
+    defaults = {"title": "existing", "time_minutes": 5, "price": Decimal("1.00")}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def payload(title, tags=(), ingredients=()):
+    """returns a recipe payload."""
+    return {
+        "title": title,
+        "time_minutes": 10,
+        "price": "2.50",
+        "tags": [{"name": name} for name in tags],
+        "ingredients": [{"name": name} for name in ingredients],
+    }
+
+
+class BulkRecipeApiTests(TestCase):
+    """Tests creating and updating recipes in batches."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="bulk@example.com", name="bulk", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """tests a batch creates recipes with shared tags once."""
+        res = self.client.post(
+            BULK_URL,
+            [
+                payload("one", tags=["quick", "vegan"], ingredients=["salt"]),
+                payload("two", tags=["quick"]),
+            ],
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r["status"] for r in res.data["results"]],
+            [status.HTTP_201_CREATED] * 2,
+        )
+        one = Recipe.objects.get(user=self.user, title="one")
+        self.assertEqual(res.data["results"][0]["data"]["id"], one.id)
+        self.assertEqual(
+            sorted(one.tags.values_list("name", flat=True)), ["quick", "vegan"]
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_bulk_update(self):
+        """tests items with an id update only the fields they list."""
+        recipe = create_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="old"))
+        other = create_recipe(self.user, title="untouched tags")
+        other.tags.add(Tag.objects.get(name="old"))
+
+        res = self.client.post(
+            BULK_URL,
+            [
+                {"id": recipe.id, "title": "renamed", "tags": [{"name": "new"}]},
+                {"id": other.id, "price": "9.00"},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(recipe.title, "renamed")
+        self.assertEqual(list(recipe.tags.values_list("name", flat=True)), ["new"])
+        self.assertEqual(other.price, Decimal("9.00"))
+        self.assertEqual(other.title, "untouched tags")
+        self.assertEqual(list(other.tags.values_list("name", flat=True)), ["old"])
+
+    def test_bulk_update_keeps_unchanged_links(self):
+        """tests only the links that changed are deleted and inserted."""
+        recipe = create_recipe(self.user)
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name="kept"),
+            Tag.objects.create(user=self.user, name="dropped"),
+        )
+        through = Recipe.tags.through
+        kept = through.objects.get(recipe=recipe, tag__name="kept").pk
+
+        res = self.client.post(
+            BULK_URL,
+            [{"id": recipe.id, "tags": [{"name": "kept"}, {"name": "added"}]}],
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)), ["added", "kept"]
+        )
+        self.assertTrue(through.objects.filter(pk=kept).exists())
+
+    def test_results_have_absolute_urls(self):
+        """tests the returned recipes are serialized with the request."""
+        recipe = create_recipe(
+            self.user, image_renditions={"card": {"jpeg": "images/card.jpeg"}}
+        )
+
+        res = self.client.post(
+            BULK_URL, [{"id": recipe.id, "title": "renamed"}], format="json"
+        )
+
+        url = res.data["results"][0]["data"]["renditions"]["card"]["jpeg"]
+        self.assertTrue(url.startswith("http://testserver/"))
+
+    def test_per_item_errors(self):
+        """tests invalid items are reported while valid ones are saved."""
+        res = self.client.post(
+            BULK_URL, [payload("valid"), {"title": "missing fields"}], format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        first, second = res.data["results"]
+        self.assertEqual(first["status"], status.HTTP_201_CREATED)
+        self.assertEqual(second["status"], status.HTTP_400_BAD_REQUEST)
+        self.assertIn("time_minutes", second["errors"])
+        self.assertTrue(Recipe.objects.filter(title="valid").exists())
+
+    def test_atomic_writes_nothing_on_error(self):
+        """tests the atomic option rejects the whole batch."""
+        res = self.client.post(
+            BULK_URL + "?atomic=true",
+            [payload("valid"), {"title": "missing fields"}],
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            res.data["results"][0]["status"], status.HTTP_424_FAILED_DEPENDENCY
+        )
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_other_users_recipes_not_found(self):
+        """tests a batch can't update recipes of other users."""
+        other_user = get_user_model().objects.create_user(
+            email="bulk2@example.com", name="other", password="testpass123"
+        )
+        recipe = create_recipe(other_user)
+
+        res = self.client.post(
+            BULK_URL, [{"id": recipe.id, "title": "stolen"}], format="json"
+        )
+
+        self.assertEqual(res.data["results"][0]["status"], status.HTTP_404_NOT_FOUND)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, "existing")
+
+    def test_duplicate_ids_rejected(self):
+        """tests a recipe can only be listed once in a batch."""
+        recipe = create_recipe(self.user)
+
+        res = self.client.post(
+            BULK_URL,
+            [{"id": recipe.id, "title": "a"}, {"id": recipe.id, "title": "b"}],
+            format="json",
+        )
+
+        self.assertEqual(
+            [r["status"] for r in res.data["results"]],
+            [status.HTTP_200_OK, status.HTTP_400_BAD_REQUEST],
+        )
+
+    def test_malformed_ids_rejected(self):
+        """tests an id that isn't an integer fails its item, not the batch."""
+        res = self.client.post(
+            BULK_URL,
+            [
+                {"id": [1], "title": "a"},
+                {"id": {}, "title": "b"},
+                {"id": True, "title": "c"},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(
+            [r["status"] for r in res.data["results"]],
+            [status.HTTP_400_BAD_REQUEST] * 3,
+        )
+        self.assertIn("id", res.data["results"][0]["errors"])
+
+    def test_batch_must_be_a_list(self):
+        """tests the body has to be a list of recipes."""
+        res = self.client.post(BULK_URL, payload("single"), format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_size_bounded(self):
+        """tests oversized batches are rejected."""
+        res = self.client.post(BULK_URL, [{}] * 501, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalidates_cached_list(self):
+        """tests the bulk write shows up in the next list."""
+        self.client.get(RECIPE_URL)
+
+        self.client.post(BULK_URL, [payload("new")], format="json")
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual([r["title"] for r in res.data["results"]], ["new"])
+
+    def test_query_count_is_constant(self):
+        """tests the number of queries doesn't grow with the batch."""
+        def batch(size):
+            return [
+                payload(
+                    f"recipe{size}-{i}",
+                    tags=[f"tag{size}-{i}", "shared"],
+                    ingredients=[f"ingredient{size}-{i}"],
+                )
+                for i in range(size)
+            ]
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(BULK_URL, batch(2), format="json")
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(BULK_URL, batch(50), format="json")
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        self.assertEqual(Recipe.objects.count(), 52)
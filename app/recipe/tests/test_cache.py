@@ -0,0 +1,133 @@
+"""
+Tests the per-user response cache of the recipe API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe import cache
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def detail_url(recipe_id):
+    """returns a recipe detail url."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """creates and returns a sample recipe."""
+    defaults = {"title": "cached", "time_minutes": 5, "price": Decimal("1.00")}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ResponseCacheTests(TestCase):
+    """Tests reads are cached and writes invalidate them."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="cache@example.com", name="cache", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_served_from_cache(self):
+        """tests a repeated read doesn't touch the database."""
+        create_recipe(self.user)
+        first = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPE_URL)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+
+    def test_query_params_cached_separately(self):
+        """tests different query parameters get their own entries."""
+        create_recipe(self.user, title="one")
+        create_recipe(self.user, title="two")
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(RECIPE_URL, {"page_size": 1})
+
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_create_invalidates_list(self):
+        """tests creating a recipe shows up in the next list."""
+        self.client.get(RECIPE_URL)
+        payload = {"title": "new", "time_minutes": 5, "price": "2.00"}
+        self.client.post(RECIPE_URL, payload)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual([r["title"] for r in res.data["results"]], ["new"])
+
+    def test_update_invalidates_detail(self):
+        """tests updating a recipe refreshes its cached detail."""
+        recipe = create_recipe(self.user)
+        self.client.get(detail_url(recipe.id))
+        self.client.patch(detail_url(recipe.id), {"title": "changed"})
+
+        res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.data["title"], "changed")
+
+    def test_tag_rename_invalidates_recipes(self):
+        """tests renaming a tag refreshes recipes listing it."""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name="old")
+        recipe.tags.add(tag)
+        self.client.get(RECIPE_URL)
+
+        self.client.patch(reverse("recipe:tag-detail", args=[tag.id]), {"name": "new"})
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.data["results"][0]["tags"][0]["name"], "new")
+
+    def test_link_changes_invalidate(self):
+        """tests adding or removing links refreshes cached reads."""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name="linked")
+        self.client.get(RECIPE_URL)
+
+        recipe.tags.add(tag)
+        self.assertEqual(len(self.client.get(RECIPE_URL).data["results"][0]["tags"]), 1)
+
+        tag.recipe_set.remove(recipe)
+        self.assertEqual(self.client.get(RECIPE_URL).data["results"][0]["tags"], [])
+
+    def test_delete_invalidates_tags(self):
+        """tests deleting a tag removes it from the cached list."""
+        tag = Tag.objects.create(user=self.user, name="gone")
+        self.client.get(TAGS_URL)
+
+        self.client.delete(reverse("recipe:tag-detail", args=[tag.id]))
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data["results"], [])
+
+    def test_other_users_unaffected(self):
+        """tests writes of one user keep other users' versions."""
+        other_user = get_user_model().objects.create_user(
+            email="cache2@example.com", name="other", password="testpass123"
+        )
+        version = cache.get_user_version(other_user.pk)
+
+        create_recipe(self.user)
+
+        self.assertEqual(cache.get_user_version(other_user.pk), version)
+
+    def test_evicted_version_restarts_higher(self):
+        """tests a lost counter never goes back to an older version."""
+        version = cache.get_user_version(self.user.pk)
+        cache.get_cache().delete(cache.VERSION_KEY.format(user_id=self.user.pk))
+
+        self.assertGreater(cache.get_user_version(self.user.pk), version)
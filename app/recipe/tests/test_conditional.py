@@ -0,0 +1,202 @@
+"""
+Tests conditional reads (ETag/Last-Modified) of the recipe API.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils.http import http_date
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.cache import get_cache
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+
+
+def detail_url(recipe_id):
+    """returns a recipe detail url."""
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """creates and returns a sample recipe."""
+    defaults = {"title": "conditional", "time_minutes": 5, "price": Decimal("1.00")}
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalReadTests(TestCase):
+    """Tests clients can revalidate reads with 304 Not Modified."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="conditional@example.com", name="conditional", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_sends_validators(self):
+        """tests the list carries an ETag and no Last-Modified date."""
+        create_recipe(self.user)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res["ETag"].startswith('"'))
+        self.assertFalse(res.has_header("Last-Modified"))
+
+    def test_list_not_modified(self):
+        """tests a matching If-None-Match gets an empty 304."""
+        create_recipe(self.user)
+        etag = self.client.get(RECIPE_URL)["ETag"]
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], etag)
+        self.assertFalse(res.content)
+
+    def test_list_if_modified_since_after_delete(self):
+        """tests deleting an older recipe isn't hidden by If-Modified-Since."""
+        older = create_recipe(self.user)
+        create_recipe(self.user)
+        self.client.get(RECIPE_URL)
+        since = http_date()
+
+        self.client.delete(detail_url(older.id))
+        res = self.client.get(RECIPE_URL, HTTP_IF_MODIFIED_SINCE=since)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_not_modified_skips_serialization(self):
+        """tests a list 304 doesn't query the database."""
+        create_recipe(self.user)
+        etag = self.client.get(RECIPE_URL)["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_delete_changes_list_etag(self):
+        """tests removing a recipe changes the list's ETag."""
+        create_recipe(self.user)
+        recipe = create_recipe(self.user)
+        etag = self.client.get(RECIPE_URL)["ETag"]
+
+        self.client.delete(detail_url(recipe.id))
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res["ETag"], etag)
+
+    def test_query_params_change_etag(self):
+        """tests each page and filter has its own ETag."""
+        create_recipe(self.user)
+
+        first = self.client.get(RECIPE_URL)
+        second = self.client.get(RECIPE_URL, {"page_size": 1})
+
+        self.assertNotEqual(first["ETag"], second["ETag"])
+
+    def test_detail_not_modified(self):
+        """tests a matching detail ETag gets a 304 without relations."""
+        recipe = create_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="quick"))
+        etag = self.client.get(detail_url(recipe.id))["ETag"]
+        get_cache().clear()
+
+        with self.assertNumQueries(1):
+            res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_stale_etag(self):
+        """tests a stale detail ETag gets the updated recipe."""
+        recipe = create_recipe(self.user)
+        etag = self.client.get(detail_url(recipe.id))["ETag"]
+
+        self.client.patch(detail_url(recipe.id), {"title": "changed"})
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["title"], "changed")
+
+    def test_detail_of_other_user_not_found(self):
+        """tests validators aren't computed for other users' recipes."""
+        other_user = get_user_model().objects.create_user(
+            email="conditional2@example.com", name="other", password="testpass123"
+        )
+        recipe = create_recipe(other_user)
+
+        res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(res.has_header("ETag"))
+
+    def test_tag_list_not_modified(self):
+        """tests the tag list can be revalidated."""
+        Tag.objects.create(user=self.user, name="quick")
+        etag = self.client.get(TAGS_URL)["ETag"]
+
+        res = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class RecipeModifiedTests(TestCase):
+    """Tests changes to related names mark recipes as modified."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="modified@example.com", name="modified", password="testpass123"
+        )
+        self.recipe = create_recipe(self.user)
+        self.tag = Tag.objects.create(user=self.user, name="old")
+
+    def _updated_at(self):
+        return Recipe.objects.values_list("updated_at", flat=True).get(
+            pk=self.recipe.pk
+        )
+
+    def test_adding_link_touches_recipe(self):
+        """tests linking a tag updates the recipe's timestamp."""
+        before = self._updated_at()
+
+        self.recipe.tags.add(self.tag)
+
+        self.assertGreater(self._updated_at(), before)
+
+    def test_reverse_clear_touches_recipe(self):
+        """tests clearing a tag's recipes updates their timestamps."""
+        self.recipe.tags.add(self.tag)
+        before = self._updated_at()
+
+        self.tag.recipe_set.clear()
+
+        self.assertGreater(self._updated_at(), before)
+
+    def test_rename_touches_recipe(self):
+        """tests renaming a linked tag updates the recipe's timestamp."""
+        self.recipe.tags.add(self.tag)
+        before = self._updated_at()
+
+        self.tag.name = "new"
+        self.tag.save()
+
+        self.assertGreater(self._updated_at(), before)
+
+    def test_delete_touches_recipe(self):
+        """tests deleting a linked tag updates the recipe's timestamp."""
+        self.recipe.tags.add(self.tag)
+        before = self._updated_at()
+
+        self.tag.delete()
+
+        self.assertGreater(self._updated_at(), before)
@@ -0,0 +1,206 @@
+"""
+Tests the streaming export of the recipe API.
+"""
+import asyncio
+import csv
+import io
+import json
+import tracemalloc
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, tag
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.asgi import ASGIHandler
+from core.models import Recipe, Tag
+from recipe.views import RecipeViewSet
+from user.tokens import issue_pair
+
+EXPORT_URL = reverse("recipe:recipe-export")
+
+
+def create_recipes(user, count, batch_size=5000):
+    """creates count recipes, every tenth one is tagged."""
+    shared, _ = Tag.objects.get_or_create(user=user, name="shared")
+    through = Recipe.tags.through
+    for start in range(0, count, batch_size):
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f"recipe {i}",
+                time_minutes=5,
+                price=Decimal("1.50"),
+            )
+            for i in range(start, min(start + batch_size, count))
+        )
+        through.objects.bulk_create(
+            through(recipe_id=recipe.pk, tag_id=shared.pk)
+            for recipe in recipes[::10]
+        )
+
+
+def consume(response):
+    """returns the streamed body as text."""
+    return b"".join(response.streaming_content).decode()
+
+
+class RecipeExportTests(TestCase):
+    """Tests exporting recipes as NDJSON and CSV."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="export@example.com", name="export", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_export_ndjson(self):
+        """tests the default export is one JSON object per line."""
+        recipe = Recipe.objects.create(
+            user=self.user, title="soup", time_minutes=5, price=Decimal("2.00")
+        )
+        recipe.tags.add(Tag.objects.create(user=self.user, name="warm"))
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        self.assertIn("recipes.ndjson", res["Content-Disposition"])
+        rows = [json.loads(line) for line in consume(res).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["title"], "soup")
+        self.assertEqual(rows[0]["price"], "2.00")
+        self.assertEqual(rows[0]["tags"], ["warm"])
+        self.assertEqual(rows[0]["ingredients"], [])
+
+    def test_export_csv(self):
+        """tests the CSV export has a header and one row per recipe."""
+        create_recipes(self.user, 3)
+
+        res = self.client.get(EXPORT_URL, {"type": "csv"})
+
+        self.assertEqual(res["Content-Type"], "text/csv")
+        rows = list(csv.DictReader(io.StringIO(consume(res))))
+        self.assertEqual([row["title"] for row in rows], [
+            "recipe 2", "recipe 1", "recipe 0"
+        ])
+        self.assertEqual(rows[2]["tags"], "shared")
+
+    def test_export_spans_chunks(self):
+        """tests relations are attached across chunk boundaries."""
+        create_recipes(self.user, 25)
+
+        with mock.patch.object(RecipeViewSet, "export_chunk_size", 4):
+            body = consume(self.client.get(EXPORT_URL))
+
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(sum(1 for row in rows if row["tags"] == ["shared"]), 3)
+
+    def test_export_applies_filters(self):
+        """tests the list filters narrow the export."""
+        create_recipes(self.user, 20)
+
+        body = consume(self.client.get(EXPORT_URL, {"tags": "shared"}))
+
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_export_only_own_recipes(self):
+        """tests other users' recipes are never exported."""
+        other_user = get_user_model().objects.create_user(
+            email="export2@example.com", name="other", password="testpass123"
+        )
+        create_recipes(other_user, 5)
+
+        self.assertEqual(consume(self.client.get(EXPORT_URL)), "")
+
+    def test_unknown_type_rejected(self):
+        """tests unsupported file types are rejected."""
+        res = self.client.get(EXPORT_URL, {"type": "xml"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @tag("slow")
+    def test_memory_is_flat(self):
+        """tests peak memory doesn't grow from 1k to 100k recipes."""
+        def peak_memory():
+            response = self.client.get(EXPORT_URL)
+            tracemalloc.start()
+            try:
+                lines = sum(chunk.count(b"\n") for chunk in response.streaming_content)
+                return lines, tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        create_recipes(self.user, 1000)
+        small_lines, small_peak = peak_memory()
+        create_recipes(self.user, 99000)
+        large_lines, large_peak = peak_memory()
+
+        self.assertEqual((small_lines, large_lines), (1000, 100000))
+        # a 1k export fits in one chunk, later chunks overlap with the
+        # buffers of the one before, so allow for a second chunk.
+        self.assertLess(large_peak, small_peak * 2)
+
+
+class AsgiExportTests(TransactionTestCase):
+    """
+    tests the export through the ASGI handler, the data is committed
+    for the stream's own thread to see it.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="export@example.com", name="export", password="testpass123"
+        )
+        self.token = issue_pair(self.user)["token"]
+
+    def request(self, query=b""):
+        """sends an export through the ASGI handler."""
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": EXPORT_URL,
+            "query_string": query,
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", f"Token {self.token}".encode()),
+            ],
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(ASGIHandler()(scope, receive, send))
+        body = b"".join(message.get("body", b"") for message in messages[1:])
+        return messages[0], body.decode()
+
+    def test_export_streams_under_asgi(self):
+        """tests the chunks are read off the event loop."""
+        create_recipes(self.user, 25)
+
+        with mock.patch.object(RecipeViewSet, "export_chunk_size", 4):
+            start, body = self.request()
+
+        self.assertEqual(start["status"], status.HTTP_200_OK)
+        self.assertIn((b"Content-Type", b"application/x-ndjson"), start["headers"])
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(sum(1 for row in rows if row["tags"] == ["shared"]), 3)
+
+    def test_csv_under_asgi(self):
+        """tests the CSV header is sent under ASGI too."""
+        create_recipes(self.user, 2)
+
+        _, body = self.request(b"type=csv")
+
+        self.assertEqual(len(list(csv.reader(io.StringIO(body)))), 3)
@@ -0,0 +1,208 @@
+"""
+Tests the resized renditions of recipe images.
+"""
+import io
+import os
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import storage
+from core.models import ImageBlob, Recipe
+from recipe import images
+
+
+def upload_url(recipe_id):
+    return reverse("recipe:recipe-upload-image", args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    return reverse("recipe:recipe-detail", args=[recipe_id])
+
+
+def image_file(size=(900, 600), mode="RGB", format="JPEG", name="photo.jpg"):
+    """returns an in-memory image to upload."""
+    file = io.BytesIO()
+    Image.new(mode, size, color=(10, 200, 30, 0)[:len(mode)]).save(file, format)
+    file.name = name
+    file.seek(0)
+    return file
+
+
+class ImageRenditionTests(TestCase):
+    """tests resizing uploaded images."""
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=self.media.name, IMAGE_RENDITION_WORKERS=0
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = get_user_model().objects.create_user(
+            email="images@example.com", name="images", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="soup", time_minutes=5, price=Decimal("1.00")
+        )
+
+    def upload(self, file):
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                upload_url(self.recipe.id), {"image": file}, format="multipart"
+            )
+        self.recipe.refresh_from_db()
+        return res
+
+    def open_rendition(self, rendition, ext):
+        return Image.open(
+            default_storage.open(self.recipe.image_renditions[rendition][ext])
+        )
+
+    def test_upload_creates_renditions(self):
+        """tests every rendition is made in every format, never enlarged."""
+        res = self.upload(image_file())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["renditions"], {})
+        self.assertEqual(set(self.recipe.image_renditions), set(images.RENDITIONS))
+        for rendition, (width, height) in images.RENDITIONS.items():
+            for ext in images.available_formats():
+                image = self.open_rendition(rendition, ext)
+                self.assertLessEqual(image.width, width)
+                self.assertLessEqual(image.height, height)
+                self.assertEqual(image.format, images.FORMATS[ext][0])
+
+        self.assertEqual(self.open_rendition("thumbnail", "jpeg").size, (200, 133))
+        self.assertEqual(self.open_rendition("full", "jpeg").size, (900, 600))
+
+    def test_renditions_in_responses(self):
+        """tests the recipe serializers return the rendition urls."""
+        self.upload(image_file())
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        url = res.data["renditions"]["card"]["jpeg"]
+        self.assertTrue(url.startswith("http://testserver/static/media/images/"))
+        self.assertTrue(url.endswith(".jpeg"))
+        res = self.client.get(reverse("recipe:recipe-list"))
+        self.assertIn("renditions", res.data["results"][0])
+
+    def test_transparent_image(self):
+        """tests transparency is kept in WebP and flattened for JPEG."""
+        self.upload(image_file(mode="RGBA", format="PNG", name="logo.png"))
+
+        self.assertEqual(self.open_rendition("card", "jpeg").mode, "RGB")
+        if "webp" in images.available_formats():
+            self.assertEqual(self.open_rendition("card", "webp").mode, "RGBA")
+
+    def test_duplicate_upload_shares_files(self):
+        """tests an image uploaded again only adds a reference."""
+        self.upload(image_file())
+        other = Recipe.objects.create(
+            user=self.user, title="stew", time_minutes=5, price=Decimal("1.00")
+        )
+
+        with patch("recipe.images.render", wraps=images.render) as render, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                upload_url(other.id), {"image": image_file()}, format="multipart"
+            )
+
+        other.refresh_from_db()
+        render.assert_not_called()
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        self.assertEqual(other.image_renditions, self.recipe.image_renditions)
+        blob = ImageBlob.objects.get(name=other.image.name)
+        self.assertEqual(blob.refcount, 2)
+
+    def test_renditions_stored_for_every_recipe(self):
+        """tests finished renditions reach every recipe using the image."""
+        self.upload(image_file())
+        other = Recipe.objects.create(
+            user=self.user, title="stew", time_minutes=5, price=Decimal("1.00"),
+            image=self.recipe.image.name,
+        )
+        renditions = images.render(self.recipe.image.name)
+
+        images._store(self.recipe.image.name, renditions)
+
+        other.refresh_from_db()
+        self.assertEqual(other.image_renditions, renditions)
+
+    def test_unused_images_collected(self):
+        """tests replaced and deleted images are collected after the grace."""
+        self.upload(image_file())
+        old = self.recipe.image.name
+        old_files = [old] + images.rendition_names(self.recipe.image_renditions)
+        self.upload(image_file(size=(300, 300)))
+        new_files = [self.recipe.image.name] + images.rendition_names(
+            self.recipe.image_renditions
+        )
+
+        self.assertEqual(ImageBlob.objects.get(name=old).refcount, 0)
+        self.assertEqual(images.collect(grace=60), 0)
+        self.assertTrue(all(default_storage.exists(name) for name in old_files))
+
+        self.assertEqual(images.collect(grace=0), 1)
+        self.assertFalse(any(default_storage.exists(name) for name in old_files))
+        self.assertTrue(all(default_storage.exists(name) for name in new_files))
+
+        self.recipe.delete()
+        self.assertEqual(images.collect(grace=0), 1)
+        self.assertFalse(any(default_storage.exists(name) for name in new_files))
+
+    def test_collect_keeps_images_in_use(self):
+        """tests an image set outside the API isn't collected."""
+        self.upload(image_file())
+        ImageBlob.objects.update(refcount=0, unreferenced_at=timezone.now())
+
+        self.assertEqual(images.collect(grace=0), 0)
+        self.assertTrue(default_storage.exists(self.recipe.image.name))
+        self.assertEqual(ImageBlob.objects.get().refcount, 1)
+
+    def test_serve_image(self):
+        """tests content addressed images are cacheable for good."""
+        self.upload(image_file())
+        url = self.recipe.image.url
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("immutable", res["Cache-Control"])
+        self.assertEqual(res["ETag"], f'"{storage.digest_of(self.recipe.image.name)}"')
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res["ETag"])
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn(
+            self.client.get("/static/media/images/../../secret").status_code,
+            [status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND],
+        )
+
+    def test_broken_image_logged(self):
+        """tests a failed resize leaves the recipe without renditions."""
+        with patch("recipe.images.render", side_effect=OSError("truncated")), \
+                self.assertLogs("recipe.images", level="ERROR"):
+            res = self.upload(image_file())
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.recipe.image_renditions, {})
+
+    def test_rendition_name(self):
+        """tests renditions are stored next to the original."""
+        self.assertEqual(
+            images.rendition_name("uploads/recipe/abc.png", "card", "webp"),
+            os.path.join("uploads/recipe/renditions", "abc-card.webp"),
+        )
@@ -0,0 +1,71 @@
+"""
+defines tests for the Ingredients API.
+"""
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient
+from recipe.serializers import IngredientSerializer
+
+INGREDIENTS_URL = reverse("recipe:ingredient-list")
+AUTOCOMPLETE_URL = reverse("recipe:ingredient-autocomplete")
+
+
+def create_user(email="test@example.com", password="testpass123", name="example"):
+    """creates and returns a user."""
+    return get_user_model().objects.create_user(
+        email=email, password=password, name=name
+    )
+
+
+class PublicIngredientsApiTests(TestCase):
+    """Tests unauthorized API requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_auth_required(self):
+        """tests authentication is required to list ingredients."""
+        res = self.client.get(INGREDIENTS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateIngredientsApiTests(TestCase):
+    """Tests authenticated API requests."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user()
+        self.client.force_authenticate(self.user)
+
+    def test_retrieve_ingredients(self):
+        """tests retrieving ingredients list."""
+        Ingredient.objects.create(user=self.user, name="kale")
+        Ingredient.objects.create(user=self.user, name="vanilla")
+
+        res = self.client.get(INGREDIENTS_URL)
+        ingredients = Ingredient.objects.all().order_by("-name")
+        serializer = IngredientSerializer(ingredients, many=True)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_autocomplete(self):
+        """tests autocomplete suggests ingredients by prefix and typos."""
+        for name in ["tomato", "tomatillo", "potato", "basil"]:
+            Ingredient.objects.create(user=self.user, name=name)
+
+        prefix = self.client.get(AUTOCOMPLETE_URL, {"q": "toma"})
+        typo = self.client.get(AUTOCOMPLETE_URL, {"q": "basill"})
+
+        self.assertEqual(prefix.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(ingredient["name"] for ingredient in prefix.data),
+            ["tomatillo", "tomato"],
+        )
+        self.assertEqual([ingredient["name"] for ingredient in typo.data], ["basil"])
@@ -0,0 +1,101 @@
+"""
+Tests the recipe API queries are served by their indexes.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.test import TestCase
+
+from core.models import Recipe, Tag, Ingredient
+
+
+class QueryPlanTests(TestCase):
+    """Tests EXPLAIN plans of the ownership scoped queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = [
+            get_user_model().objects.create_user(
+                email=f"plan{i}@example.com", name=f"plan{i}", password="testpass123"
+            )
+            for i in range(10)
+        ]
+        for user in users:
+            names = [f"name{i}" for i in range(20)]
+            tags = Tag.objects.get_or_create_many(user, names)
+            ingredients = Ingredient.objects.get_or_create_many(user, names)
+            recipes = Recipe.objects.bulk_create(
+                Recipe(user=user, title="plan", time_minutes=5, price="1.00")
+                for _ in range(100)
+            )
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe=recipe, tag=tags[names[i % 20]])
+                for i, recipe in enumerate(recipes)
+            )
+            Recipe.ingredients.through.objects.bulk_create(
+                Recipe.ingredients.through(
+                    recipe=recipe, ingredient=ingredients[names[i % 20]]
+                )
+                for i, recipe in enumerate(recipes)
+            )
+        cls.user = users[0]
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def _explain(self, queryset):
+        """returns the plan postgres picks when it has to choose an index."""
+        with connection.cursor() as cursor:
+            # the seeded tables are small enough for a sequential scan to win,
+            # this asks which index the planner would use at production size.
+            cursor.execute("SET enable_seqscan = off")
+            try:
+                return queryset.explain()
+            finally:
+                cursor.execute("RESET enable_seqscan")
+
+    def test_recipe_list_uses_user_id_index(self):
+        """tests listing recipes scans the (user, -id) index."""
+        plan = self._explain(
+            Recipe.objects.filter(user=self.user).order_by("-id")[:21]
+        )
+
+        self.assertIn("recipe_user_id_desc_idx", plan)
+        self.assertNotIn("Sort", plan)
+
+    def test_tag_list_uses_user_name_index(self):
+        """tests listing tags scans the (user, name) index."""
+        plan = self._explain(Tag.objects.filter(user=self.user).order_by("-name")[:21])
+
+        self.assertIn("unique_tag_name_per_user", plan)
+
+    def test_ingredient_list_uses_user_name_index(self):
+        """tests listing ingredients scans the (user, name) index."""
+        plan = self._explain(
+            Ingredient.objects.filter(user=self.user).order_by("-name")[:21]
+        )
+
+        self.assertIn("unique_ingredient_name_per_user", plan)
+
+    def _filtered(self, relation, names):
+        """returns the semi-join the recipe list filters with."""
+        target = Recipe._meta.get_field(relation).m2m_reverse_field_name()
+        links = getattr(Recipe, relation).through.objects.filter(
+            recipe=OuterRef("pk"),
+            **{f"{target}__user": self.user, f"{target}__name__in": names},
+        )
+        return Recipe.objects.filter(Exists(links), user=self.user).order_by("-id")
+
+    def test_tag_filter_uses_reverse_through_index(self):
+        """tests filtering by tag reaches the through rows from the tag side."""
+        plan = self._explain(self._filtered("tags", ["name1", "name2"])[:21])
+
+        self.assertIn("unique_tag_name_per_user", plan)
+        self.assertIn("recipe_tags_tag_recipe_idx", plan)
+
+    def test_ingredient_filter_uses_reverse_through_index(self):
+        """tests filtering by ingredient reaches the through rows by index."""
+        plan = self._explain(self._filtered("ingredients", ["name1"])[:21])
+
+        self.assertIn("unique_ingredient_name_per_user", plan)
+        self.assertIn("recipe_ingredients_ingredient_recipe_idx", plan)
@@ -4,12 +4,16 @@ Tests the recipe API.
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.db import connection
+from django.db.models.signals import m2m_changed
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework.test import APIClient
 from rest_framework import status
 
-from core.models import Recipe
+from core.models import Recipe, Tag, Ingredient
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import RecipeViewSet
 
 from decimal import Decimal
 
@@ -70,7 +74,7 @@ class PrivateRecipeApiTest(TestCase):
         recipes = Recipe.objects.all().order_by("-id")
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_retrieve_user_recipes(self):
         """tests getting recipes only related to user."""
@@ -85,7 +89,35 @@ class PrivateRecipeApiTest(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
+
+    def test_recipes_are_paginated(self):
+        """tests walking every page with the cursor returns each recipe once."""
+        recipes = [create_recipe_user(user=self.user) for _ in range(5)]
+
+        seen = []
+        res = self.client.get(RECIPE_URL, {"page_size": 2})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data["results"]), 2)
+            seen += [recipe["id"] for recipe in res.data["results"]]
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+
+        self.assertEqual(seen, sorted((r.id for r in recipes), reverse=True))
+        self.assertNotIn("count", res.data)
+
+    def test_page_size_is_bounded(self):
+        """tests clients can't request pages above the maximum size."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL, {"page_size": 100000})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("LIMIT 101", ctx.captured_queries[0]["sql"])
+        self.assertFalse(
+            any("COUNT(" in query["sql"] for query in ctx.captured_queries)
+        )
 
     def test_get_recipe_detail(self):
         """tests get recipe detail."""
@@ -107,3 +139,336 @@ class PrivateRecipeApiTest(TestCase):
         res = self.client.post(RECIPE_URL, payload)
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def _tagged_recipe(self, title, tags=(), ingredients=()):
+        """creates a recipe linked to the named tags and ingredients."""
+        recipe = create_recipe_user(user=self.user)
+        recipe.title = title
+        recipe.save()
+        recipe.tags.add(*Tag.objects.get_or_create_many(self.user, tags).values())
+        recipe.ingredients.add(
+            *Ingredient.objects.get_or_create_many(self.user, ingredients).values()
+        )
+        return recipe
+
+    def _result_titles(self, params):
+        """returns the titles a filtered recipe list responds with."""
+        res = self.client.get(RECIPE_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return sorted(recipe["title"] for recipe in res.data["results"])
+
+    def test_filter_by_tags(self):
+        """tests filtering returns recipes with any of the tags once each."""
+        self._tagged_recipe("both", tags=["vegan", "quick"])
+        self._tagged_recipe("vegan", tags=["vegan"])
+        self._tagged_recipe("none", tags=["dessert"])
+
+        self.assertEqual(
+            self._result_titles({"tags": "vegan,quick"}), ["both", "vegan"]
+        )
+
+    def test_filter_by_ingredients(self):
+        """tests filtering recipes by ingredients."""
+        self._tagged_recipe("eggs", ingredients=["eggs", "salt"])
+        self._tagged_recipe("salad", ingredients=["lettuce"])
+
+        self.assertEqual(self._result_titles({"ingredients": "eggs"}), ["eggs"])
+
+    def test_filter_match_all(self):
+        """tests match=all only returns recipes with every listed name."""
+        self._tagged_recipe("both", tags=["vegan", "quick"], ingredients=["rice"])
+        self._tagged_recipe("vegan", tags=["vegan"], ingredients=["rice"])
+        self._tagged_recipe("no-rice", tags=["vegan", "quick"])
+
+        params = {"tags": "vegan,quick", "ingredients": "rice", "match": "all"}
+        self.assertEqual(self._result_titles(params), ["both"])
+
+    def test_filter_ignores_other_users_tags(self):
+        """tests another user's tag with the same name doesn't match."""
+        other_user = get_user_model().objects.create_user(
+            "filter@AnotherExample.com", "other", "otherpass123"
+        )
+        recipe = self._tagged_recipe("mine", tags=["vegan"])
+        recipe.tags.set([Tag.objects.create(user=other_user, name="dessert")])
+
+        self.assertEqual(self._result_titles({"tags": "dessert"}), [])
+
+    def test_filter_without_distinct(self):
+        """tests filtering uses semi-joins instead of DISTINCT."""
+        self._tagged_recipe("both", tags=["vegan", "quick"])
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPE_URL, {"tags": "vegan,quick"})
+
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn("DISTINCT", sql)
+
+    def test_filter_match_all_bounded(self):
+        """tests match=all rejects more names than the limit."""
+        limit = RecipeViewSet.max_match_all_names
+        names = ",".join(f"tag{i}" for i in range(limit + 1))
+
+        res = self.client.get(RECIPE_URL, {"tags": names, "match": "all"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("tags", res.data)
+        res = self.client.get(RECIPE_URL, {"tags": names})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_filter_invalid_match_error(self):
+        """tests an unknown match mode is rejected."""
+        res = self.client.get(RECIPE_URL, {"tags": "vegan", "match": "some"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_create_recipe_with_tags(self):
+        """tests creating a recipe creates only the missing tags."""
+        Tag.objects.create(user=self.user, name="breakfast")
+        payload = {
+            "title": "pancakes",
+            "time_minutes": 20,
+            "price": Decimal("2.50"),
+            "tags": [{"name": "breakfast"}, {"name": "sweet"}, {"name": "sweet"}],
+            "ingredients": [{"name": "flour"}, {"name": "milk"}],
+        }
+        res = self.client.post(RECIPE_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data["id"])
+        self.assertEqual(
+            sorted(recipe.tags.values_list("name", flat=True)), ["breakfast", "sweet"]
+        )
+        self.assertEqual(recipe.ingredients.count(), 2)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_create_recipe_reuses_tags(self):
+        """tests recipes sharing tag names share the same tag rows."""
+        payload = {
+            "title": "toast",
+            "time_minutes": 5,
+            "price": Decimal("1.00"),
+            "tags": [{"name": "quick"}],
+        }
+        self.client.post(RECIPE_URL, payload, format="json")
+        self.client.post(RECIPE_URL, payload, format="json")
+
+        self.assertEqual(Tag.objects.filter(user=self.user, name="quick").count(), 1)
+        self.assertEqual(Tag.objects.get(name="quick").recipe_set.count(), 2)
+
+
+class RecipeQueryCountTests(TestCase):
+    """Tests the recipe endpoints issue a fixed number of queries."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="queries@example.com", name="queries", password="testtest123123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create_recipes(self, count):
+        """creates recipes each linked to a couple of tags and ingredients."""
+        for i in range(count):
+            recipe = create_recipe_user(user=self.user)
+            for name in (f"tag{i}", "shared"):
+                tag, _ = Tag.objects.get_or_create(user=self.user, name=name)
+                ingredient, _ = Ingredient.objects.get_or_create(
+                    user=self.user, name=name
+                )
+                recipe.tags.add(tag)
+                recipe.ingredients.add(ingredient)
+
+    def _count_queries(self, method, url, data=None):
+        """returns the number of queries a request issued."""
+        with CaptureQueriesContext(connection) as ctx:
+            res = getattr(self.client, method)(url, data, format="json")
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        """tests listing recipes doesn't scale queries with recipes."""
+        self._create_recipes(1)
+        few = self._count_queries("get", RECIPE_URL)
+        self._create_recipes(10)
+        many = self._count_queries("get", RECIPE_URL)
+
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 3)
+
+    def test_retrieve_query_count(self):
+        """tests retrieving a recipe prefetches its relations."""
+        self._create_recipes(1)
+        recipe = Recipe.objects.get(user=self.user)
+
+        self.assertLessEqual(self._count_queries("get", details_url(recipe.id)), 3)
+
+    def test_partial_update_query_count(self):
+        """tests updating a recipe doesn't scale queries with relations."""
+        self._create_recipes(1)
+        recipe = Recipe.objects.get(user=self.user)
+        few = self._count_queries("patch", details_url(recipe.id), {"title": "a"})
+        for i in range(10):
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f"extra{i}"))
+        many = self._count_queries("patch", details_url(recipe.id), {"title": "b"})
+
+        self.assertEqual(few, many)
+
+    def test_create_query_count_is_constant(self):
+        """tests creating a recipe doesn't scale queries with tags."""
+        def payload(count):
+            return {
+                "title": "queries",
+                "time_minutes": 5,
+                "price": "1.00",
+                "tags": [{"name": f"tag{i}"} for i in range(count)],
+                "ingredients": [{"name": f"ingredient{i}"} for i in range(count)],
+            }
+
+        with CaptureQueriesContext(connection) as few:
+            self.client.post(RECIPE_URL, payload(1), format="json")
+        with CaptureQueriesContext(connection) as many:
+            self.client.post(RECIPE_URL, payload(20), format="json")
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+
+
+class RecipeM2MWriteScalingTests(TestCase):
+    """
+    Benchmarks the through-table rows written when a recipe's tags
+    change, across recipe sizes.
+    """
+
+    RECIPE_SIZES = [1, 10, 100]
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="writes@example.com", name="writes", password="testtest123123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _rows_written(self, recipe, tag_names):
+        """replaces the recipe's tags and returns the through rows written."""
+        written = []
+
+        def receiver(action, pk_set, **kwargs):
+            if action in ("post_add", "post_remove"):
+                written.append(len(pk_set))
+            elif action == "post_clear":
+                written.append(None)
+
+        m2m_changed.connect(receiver, sender=Recipe.tags.through)
+        try:
+            res = self.client.patch(
+                details_url(recipe.id),
+                {"tags": [{"name": name} for name in tag_names]},
+                format="json",
+            )
+        finally:
+            m2m_changed.disconnect(receiver, sender=Recipe.tags.through)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn(None, written)
+        return sum(written)
+
+    def test_tag_update_writes_are_constant(self):
+        """tests swapping one tag writes two rows whatever the recipe size."""
+        rows = {}
+        for size in self.RECIPE_SIZES:
+            recipe = create_recipe_user(user=self.user)
+            names = [f"{size}-tag{i}" for i in range(size)]
+            recipe.tags.add(*Tag.objects.get_or_create_many(self.user, names).values())
+
+            rows[size] = self._rows_written(recipe, names[1:] + [f"{size}-new"])
+            self.assertEqual(
+                sorted(recipe.tags.values_list("name", flat=True)),
+                sorted(names[1:] + [f"{size}-new"]),
+            )
+
+        self.assertEqual(rows, {size: 2 for size in self.RECIPE_SIZES})
+
+    def test_unchanged_tags_write_nothing(self):
+        """tests resending the same tags leaves the links untouched."""
+        recipe = create_recipe_user(user=self.user)
+        names = ["a", "b", "c"]
+        recipe.tags.add(*Tag.objects.get_or_create_many(self.user, names).values())
+
+        self.assertEqual(self._rows_written(recipe, names), 0)
+
+
+class RecipeSearchApiTests(TestCase):
+    """Tests full-text search over recipes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="search@example.com", name="search", password="testtest123123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create(self, title, description=""):
+        """creates a recipe with a title and description."""
+        return Recipe.objects.create(
+            user=self.user,
+            title=title,
+            description=description,
+            time_minutes=10,
+            price=Decimal("1.00"),
+        )
+
+    def _search(self, search, **params):
+        """returns the titles a search responds with in order."""
+        res = self.client.get(RECIPE_URL, {"search": search, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [recipe["title"] for recipe in res.data["results"]]
+
+    def test_search_matches_stemmed_words(self):
+        """tests searching matches different forms of a word."""
+        self._create("Blueberry pancakes")
+        self._create("Tomato soup")
+
+        self.assertEqual(self._search("pancake"), ["Blueberry pancakes"])
+
+    def test_search_ranks_title_above_description(self):
+        """tests title matches rank ahead of description matches."""
+        self._create("Curry rice", "served with a mango chutney")
+        self._create("Mango lassi", "a sweet yogurt drink")
+
+        self.assertEqual(self._search("mango"), ["Mango lassi", "Curry rice"])
+
+    def test_search_tracks_updates(self):
+        """tests the search index follows edits to the title."""
+        recipe = self._create("Plain toast")
+        res = self.client.patch(details_url(recipe.id), {"title": "French toast"})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self._search("french"), ["French toast"])
+        self.assertEqual(self._search("plain"), [])
+
+    def test_search_limited_to_user(self):
+        """tests search only returns the user's recipes."""
+        other_user = get_user_model().objects.create_user(
+            "search@AnotherExample.com", "other", "otherpass123"
+        )
+        Recipe.objects.create(
+            user=other_user, title="Lemon tart", time_minutes=5, price=Decimal("1")
+        )
+
+        self.assertEqual(self._search("lemon"), [])
+
+    def test_search_is_paginated(self):
+        """tests paging through ranked results returns each recipe once."""
+        for i in range(5):
+            self._create(f"Noodles {i}", "noodles " * i)
+
+        titles = []
+        res = self.client.get(RECIPE_URL, {"search": "noodles", "page_size": 2})
+        while True:
+            titles += [recipe["title"] for recipe in res.data["results"]]
+            if not res.data["next"]:
+                break
+            res = self.client.get(res.data["next"])
+
+        self.assertEqual(sorted(titles), [f"Noodles {i}" for i in range(5)])
+        self.assertEqual(titles, self._search("noodles", page_size=5))
@@ -0,0 +1,134 @@
+"""
+Tests routing the recipe reads to the read replicas.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import router
+from core.models import Recipe
+
+RECIPE_URL = reverse("recipe:recipe-list")
+TAGS_URL = reverse("recipe:tag-list")
+REPLICA = "replica-test"
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    tests the routing against a stand-in replica, an alias of the test
+    database, the data is committed for it to see.
+    """
+
+    def setUp(self):
+        connections.databases[REPLICA] = dict(connections[DEFAULT_DB_ALIAS].settings_dict)
+        self.addCleanup(connections.databases.pop, REPLICA)
+        self.addCleanup(connections[REPLICA].close)
+        replicas = override_settings(DATABASE_REPLICAS=[REPLICA])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        cache.clear()
+
+        self.user = get_user_model().objects.create_user(
+            email="replica@example.com", name="replica", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url):
+        """returns a read and the queries each database ran for it."""
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, len(primary), len(replica)
+
+    def test_reads_use_replica(self):
+        """tests the list reads of an idle user run on the replica."""
+        Recipe.objects.create(
+            user=self.user, title="soup", time_minutes=5, price=Decimal("1.00")
+        )
+        cache.clear()
+
+        for url in [RECIPE_URL, TAGS_URL]:
+            _, primary, replica = self.get(url)
+            self.assertEqual(primary, 0, url)
+            self.assertGreater(replica, 0, url)
+
+        self.assertFalse(router.replica_reads.get())
+
+    def test_read_your_writes(self):
+        """tests a user's reads stay on the primary right after a write."""
+        with CaptureQueriesContext(connections[REPLICA]) as replica:
+            res = self.client.post(
+                RECIPE_URL, {"title": "soup", "time_minutes": 5, "price": "1.00"}
+            )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(replica), 0)
+
+        res, primary, replica = self.get(RECIPE_URL)
+
+        self.assertEqual(replica, 0)
+        self.assertGreater(primary, 0)
+        self.assertEqual([r["title"] for r in res.data["results"]], ["soup"])
+
+        # a url that isn't cached yet, once the pin expired.
+        cache.delete(router.PIN_KEY.format(user_id=self.user.pk))
+        _, _, replica = self.get(f"{RECIPE_URL}?page_size=2")
+        self.assertGreater(replica, 0)
+
+    def test_export_streams_from_replica(self):
+        """tests the export's chunks keep the view's routing."""
+        Recipe.objects.bulk_create(
+            Recipe(user=self.user, title=f"soup {i}", time_minutes=5, price=Decimal("1.00"))
+            for i in range(3)
+        )
+        cache.delete(router.PIN_KEY.format(user_id=self.user.pk))
+        res = self.client.get(reverse("recipe:recipe-export"))
+
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                body = b"".join(res.streaming_content)
+
+        self.assertEqual(len(body.splitlines()), 3)
+        self.assertEqual(len(primary), 0)
+        self.assertGreater(len(replica), 0)
+        self.assertFalse(router.replica_reads.get())
+
+    def test_pin_is_per_user(self):
+        """tests a write only pins its own user."""
+        other = get_user_model().objects.create_user(
+            email="other@example.com", name="other", password="testpass123"
+        )
+        Recipe.objects.create(
+            user=other, title="stew", time_minutes=5, price=Decimal("1.00")
+        )
+
+        self.assertTrue(router.is_pinned(other.pk))
+        self.assertFalse(router.is_pinned(self.user.pk))
+
+    def test_router(self):
+        """tests writes and migrations stay on default."""
+        routing = router.ReplicaRouter()
+
+        self.assertIsNone(routing.db_for_read(Recipe))
+        token = router.replica_reads.set(True)
+        self.addCleanup(router.replica_reads.reset, token)
+        self.assertEqual(routing.db_for_read(Recipe), REPLICA)
+        self.assertEqual(routing.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+        self.assertFalse(routing.allow_migrate(REPLICA, "core"))
+        self.assertTrue(routing.allow_migrate(DEFAULT_DB_ALIAS, "core"))
+
+    def test_no_replicas(self):
+        """tests nothing is pinned without replicas."""
+        with override_settings(DATABASE_REPLICAS=[]):
+            router.pin_primary(self.user.pk)
+
+        self.assertFalse(router.is_pinned(self.user.pk))
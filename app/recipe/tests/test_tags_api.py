@@ -12,6 +12,7 @@ from core.models import Tag
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse("recipe:tag-list")
+AUTOCOMPLETE_URL = reverse("recipe:tag-autocomplete")
 
 
 def detail_url(tag_id):
@@ -57,7 +58,7 @@ class PrivateTagsApiTests(TestCase):
         serializer = TagSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data["results"], serializer.data)
 
     def test_tags_limited_to_user(self):
         """tests tags returned are for authenticated user."""
@@ -70,5 +71,76 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]["name"], tag.name)
+        self.assertEqual(len(res.data["results"]), 1)
+        self.assertEqual(res.data["results"][0]["name"], tag.name)
+
+    def test_tags_paginated_by_name(self):
+        """tests paging through tags keeps the name ordering."""
+        names = ["a", "b", "c", "d", "e"]
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {"page_size": 3})
+        first = [tag["name"] for tag in res.data["results"]]
+        res = self.client.get(res.data["next"])
+        second = [tag["name"] for tag in res.data["results"]]
+
+        self.assertEqual(first + second, sorted(names, reverse=True))
+        self.assertIsNone(res.data["next"])
+
+    def test_rename_tag_to_existing_name_error(self):
+        """tests renaming a tag onto another of the user's tags fails."""
+        Tag.objects.create(user=self.user, name="dinner")
+        tag = Tag.objects.create(user=self.user, name="lunch")
+
+        res = self.client.patch(detail_url(tag.id), {"name": "dinner"})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, "lunch")
+
+    def test_autocomplete_prefix(self):
+        """tests autocomplete suggests tags starting with the text."""
+        for name in ["Breakfast", "brunch", "dinner"]:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "br"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(tag["name"] for tag in res.data), ["Breakfast", "brunch"]
+        )
+
+    def test_autocomplete_fuzzy(self):
+        """tests autocomplete tolerates typos and ranks closer names first."""
+        Tag.objects.create(user=self.user, name="vegetarian")
+        Tag.objects.create(user=self.user, name="vegetables")
+        Tag.objects.create(user=self.user, name="spicy")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "vegetarain"})
+        names = [tag["name"] for tag in res.data]
+
+        self.assertEqual(names[0], "vegetarian")
+        self.assertNotIn("spicy", names)
+
+    def test_autocomplete_limit(self):
+        """tests autocomplete caps the number of suggestions."""
+        for i in range(30):
+            Tag.objects.create(user=self.user, name=f"tag{i:02}")
+
+        default = self.client.get(AUTOCOMPLETE_URL, {"q": "tag"})
+        capped = self.client.get(AUTOCOMPLETE_URL, {"q": "tag", "limit": 1000})
+
+        self.assertEqual(len(default.data), 10)
+        self.assertEqual(len(capped.data), 25)
+
+    def test_autocomplete_limited_to_user(self):
+        """tests autocomplete only suggests the user's tags."""
+        user2 = create_user(
+            email="test2@example.com", password="testpass123", name="test2"
+        )
+        Tag.objects.create(user=user2, name="comfort-food")
+
+        res = self.client.get(AUTOCOMPLETE_URL, {"q": "comfort"})
+
+        self.assertEqual(res.data, [])
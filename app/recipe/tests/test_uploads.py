@@ -0,0 +1,285 @@
+"""
+Tests resumable chunked image uploads.
+"""
+import hashlib
+import io
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, UploadSession
+from recipe import uploads
+
+
+def start_url(recipe_id):
+    return reverse("recipe:recipe-start-upload", args=[recipe_id])
+
+
+def upload_url(session_id):
+    return reverse("recipe:upload-detail", args=[session_id])
+
+
+def image_bytes():
+    """returns a JPEG large enough to need a few chunks."""
+    file = io.BytesIO()
+    Image.effect_noise((200, 200), 64).convert("RGB").save(file, "JPEG")
+    return file.getvalue()
+
+
+class ChunkedUploadTests(TestCase):
+    """tests uploading recipe images in chunks."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        settings = override_settings(
+            MEDIA_ROOT=os.path.join(self.dir.name, "media"),
+            UPLOAD_SPOOL_DIR=os.path.join(self.dir.name, "spool"),
+            IMAGE_RENDITION_WORKERS=0,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = get_user_model().objects.create_user(
+            email="uploads@example.com", name="uploads", password="testpass123"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user, title="soup", time_minutes=5, price=Decimal("1.00")
+        )
+        self.data = image_bytes()
+
+    def start(self, data=None, **fields):
+        data = self.data if data is None else data
+        payload = {
+            "filename": "photo.jpg",
+            "size": len(data),
+            "checksum": hashlib.sha256(data).hexdigest(),
+        }
+        payload.update(fields)
+        return self.client.post(start_url(self.recipe.id), payload)
+
+    def put(self, session_id, start, chunk, size=None):
+        size = len(self.data) if size is None else size
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(
+                upload_url(session_id),
+                chunk,
+                content_type="application/octet-stream",
+                HTTP_CONTENT_RANGE=f"bytes {start}-{start + len(chunk) - 1}/{size}",
+            )
+
+    def test_upload_in_chunks(self):
+        """tests chunks are accepted in order and attached once complete."""
+        res = self.start()
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data["offset"], 0)
+        session_id = res.data["id"]
+
+        step = len(self.data) // 3 + 1
+        for start in range(0, len(self.data), step):
+            res = self.put(session_id, start, self.data[start:start + step])
+            if start + step < len(self.data):
+                self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+                self.assertEqual(res.data["offset"], start + step)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn("image", res.data)
+        self.recipe.refresh_from_db()
+        with self.recipe.image.open("rb") as file:
+            self.assertEqual(file.read(), self.data)
+        self.assertTrue(self.recipe.image.name.endswith(".jpg"))
+        self.assertIn("thumbnail", self.recipe.image_renditions)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.dir.name, "spool")), [])
+
+    def test_resume_after_interrupted_chunk(self):
+        """tests the bytes that arrived count and the upload continues."""
+        session_id = self.start().data["id"]
+        self.put(session_id, 0, self.data[:100])
+
+        # the chunk claims more bytes than the body carries.
+        res = self.client.put(
+            upload_url(session_id),
+            self.data[100:400],
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes 100-999/{len(self.data)}",
+        )
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.client.get(upload_url(session_id)).data["offset"], 400)
+
+        res = self.put(session_id, 400, self.data[400:])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_out_of_order_chunk(self):
+        """tests a chunk not starting at the offset is refused."""
+        session_id = self.start().data["id"]
+
+        res = self.put(session_id, 100, self.data[100:200])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data["offset"], 0)
+
+    def test_offset_rechecked_after_streaming(self):
+        """tests a chunk is refused when the offset moved while it arrived."""
+        session_id = self.start().data["id"]
+        receive_chunk = uploads.receive_chunk
+
+        def concurrent(session, stream, length):
+            received = receive_chunk(session, stream, length)
+            UploadSession.objects.filter(pk=session.pk).update(received=50)
+            return received
+
+        with mock.patch.object(uploads, "receive_chunk", concurrent):
+            res = self.put(session_id, 0, self.data[:100])
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data["offset"], 50)
+        self.assertEqual(os.listdir(os.path.join(self.dir.name, "spool")), [])
+
+    def test_checksum_mismatch(self):
+        """tests a corrupted upload is rejected and discarded."""
+        session_id = self.start(checksum="0" * 64).data["id"]
+
+        res = self.put(session_id, 0, self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(os.path.join(self.dir.name, "spool")), [])
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_not_an_image(self):
+        """tests a complete upload has to be an image."""
+        data = b"not an image" * 100
+        session_id = self.start(data).data["id"]
+
+        res = self.put(session_id, 0, data, size=len(data))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_invalid_ranges(self):
+        """tests malformed, out of bounds and oversized chunks."""
+        session_id = self.start().data["id"]
+        size = len(self.data)
+
+        for header in ["0-99", f"bytes 0-99/{size + 1}", f"bytes 0-{size}/{size}"]:
+            res = self.client.put(
+                upload_url(session_id),
+                self.data[:100],
+                content_type="application/octet-stream",
+                HTTP_CONTENT_RANGE=header,
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST, header)
+
+        with override_settings(UPLOAD_MAX_CHUNK_SIZE=50):
+            res = self.put(session_id, 0, self.data[:100])
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_start_validation(self):
+        """tests uploads above the limit or without a sha256 are refused."""
+        with override_settings(UPLOAD_MAX_SIZE=100):
+            res = self.start()
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("size", res.data)
+
+        res = self.start(checksum="abc")
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("checksum", res.data)
+
+        res = self.start(filename="../../etc/passwd.jpg")
+        self.assertEqual(res.data["filename"], "passwd.jpg")
+
+    def test_other_users_upload(self):
+        """tests uploads are private to their user."""
+        session_id = self.start().data["id"]
+        other = get_user_model().objects.create_user(
+            email="other@example.com", name="other", password="testpass123"
+        )
+        self.client.force_authenticate(other)
+
+        res = self.put(session_id, 0, self.data)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(
+            self.client.post(
+                start_url(self.recipe.id), {}
+            ).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+
+    def test_abandon_upload(self):
+        """tests deleting an upload removes the spooled bytes."""
+        session_id = self.start().data["id"]
+        self.put(session_id, 0, self.data[:100])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.delete(upload_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(os.listdir(os.path.join(self.dir.name, "spool")), [])
+
+    def test_expired_uploads_purged(self):
+        """tests uploads nobody continued are dropped."""
+        session_id = self.start().data["id"]
+        UploadSession.objects.filter(pk=session_id).update(
+            updated_at=timezone.now() - timedelta(days=2)
+        )
+
+        self.start()
+
+        self.assertFalse(UploadSession.objects.filter(pk=session_id).exists())
+
+    def test_parse_content_range(self):
+        self.assertEqual(uploads.parse_content_range("bytes 10-19/100", 100), (10, 10))
+
+
+class StreamingConnectionTests(TransactionTestCase):
+    """tests a chunk streams in without a database connection."""
+
+    def test_connection_released_while_streaming(self):
+        user = get_user_model().objects.create_user(
+            email="streaming@example.com", name="streaming", password="testpass123"
+        )
+        recipe = Recipe.objects.create(
+            user=user, title="soup", time_minutes=5, price=Decimal("1.00")
+        )
+        session = UploadSession.objects.create(
+            user=user, recipe=recipe, filename="photo.jpg", size=200, checksum="0"
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        receive_chunk = uploads.receive_chunk
+        connected = []
+
+        def streaming(*args):
+            connected.append(connection.connection is not None)
+            return receive_chunk(*args)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            UPLOAD_SPOOL_DIR=directory
+        ), mock.patch.object(uploads, "receive_chunk", streaming):
+            res = client.put(
+                upload_url(session.pk),
+                b"x" * 100,
+                content_type="application/octet-stream",
+                HTTP_CONTENT_RANGE="bytes 0-99/200",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(connected, [False])
+        session.refresh_from_db()
+        self.assertEqual(session.received, 100)
@@ -0,0 +1,150 @@
+"""
+Resumable chunked uploads of recipe images.
+
+a client starts an UploadSession with the name, size and sha256 of the
+file, then PUTs the bytes in order with a Content-Range header. each
+chunk is copied from the request stream to a file a block at a time,
+so memory stays flat whatever the size, and only then appended to the
+spool file of the session under a short lock. the bytes that made it
+to disk count even when the connection drops halfway, the client asks
+for the offset and continues from there.
+once the last byte arrives the checksum is verified and the file is
+attached to the recipe image.
+"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.http import UnreadablePostError
+from django.utils import timezone
+from PIL import Image
+
+from core.models import UploadSession
+from recipe import images
+
+BLOCK_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadError(Exception):
+    """a chunk or a finished upload that can't be accepted."""
+
+
+def spool_path(session):
+    """returns the file the bytes of a session are spooled to."""
+    return os.path.join(settings.UPLOAD_SPOOL_DIR, f"{session.pk}.part")
+
+
+def discard(path):
+    """deletes a spool file."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def purge_expired():
+    """deletes the sessions nobody continued within their lifetime."""
+    cutoff = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_LIFETIME)
+    UploadSession.objects.filter(updated_at__lt=cutoff).delete()
+
+
+def parse_content_range(value, size):
+    """returns the (start, length) of a "bytes start-end/size" header."""
+    match = CONTENT_RANGE.match(value or "")
+    if match is None:
+        raise UploadError("Content-Range must look like bytes start-end/size.")
+
+    start, end, total = (int(group) for group in match.groups())
+    if total != size or end < start or end >= size:
+        raise UploadError(f"Content-Range must be within the {size} bytes announced.")
+    if end - start + 1 > settings.UPLOAD_MAX_CHUNK_SIZE:
+        raise UploadError(
+            f"chunks can be at most {settings.UPLOAD_MAX_CHUNK_SIZE} bytes."
+        )
+
+    return start, end - start + 1
+
+
+def receive_chunk(session, stream, length):
+    """
+    copies up to length bytes of the stream to a file of their own, and
+    returns its path and how many bytes arrived. the client decides how
+    long this takes, so it runs with nothing locked.
+    """
+    os.makedirs(settings.UPLOAD_SPOOL_DIR, exist_ok=True)
+    received = 0
+    with tempfile.NamedTemporaryFile(
+        dir=settings.UPLOAD_SPOOL_DIR,
+        prefix=f"{session.pk}.",
+        suffix=".chunk",
+        delete=False,
+    ) as chunk:
+        try:
+            while received < length:
+                block = stream.read(min(BLOCK_SIZE, length - received))
+                if not block:
+                    break
+                chunk.write(block)
+                received += len(block)
+        except (OSError, UnreadablePostError):
+            # the client went away, what arrived is kept.
+            pass
+
+    return chunk.name, received
+
+
+def write_chunk(session, chunk_path, start):
+    """
+    copies a received chunk to the spool file at start. the caller
+    stores the new offset, anything beyond it in the file is
+    overwritten by the next chunk.
+    """
+    path = spool_path(session)
+    with open(chunk_path, "rb") as chunk, open(
+        path, "r+b" if os.path.exists(path) else "wb"
+    ) as spool:
+        spool.seek(start)
+        shutil.copyfileobj(chunk, spool, BLOCK_SIZE)
+        spool.truncate()
+
+
+def checksum(path):
+    """returns the sha256 of a file, read a block at a time."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(BLOCK_SIZE), b""):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def finish(session):
+    """
+    verifies a complete upload and attaches it to the recipe.
+    the session is deleted either way, a corrupt upload has to start
+    over.
+    """
+    path = spool_path(session)
+    try:
+        if checksum(path) != session.checksum:
+            raise UploadError("the checksum of the uploaded file doesn't match.")
+
+        try:
+            with Image.open(path) as image:
+                image.verify()
+        except Exception:
+            raise UploadError("the uploaded file isn't a valid image.")
+
+        recipe = session.recipe
+        with open(path, "rb") as file:
+            images.set_image(recipe, File(file), session.filename)
+    finally:
+        session.delete()
+
+    return recipe
@@ -2,11 +2,13 @@
 Urls for the Recipe endpoint.
 """
 
+from django.conf import settings
 from django.urls import (
     path,
     include,
 )
 from rest_framework.routers import DefaultRouter
+from recipe.asyncviews import wrap_patterns
 from recipe.views import *
 
 
@@ -14,6 +16,14 @@ router = DefaultRouter()
 router.register("recipes", RecipeViewSet)
 router.register("tags", TagViewSet)
 router.register("ingredients", IngredientViewSet)
+router.register("uploads", ImageUploadViewSet, basename="upload")
+
+# the reads served by async views under ASGI.
+ASYNC_READS = {"recipe-list", "recipe-detail", "tag-list", "ingredient-list"}
+
+routes = router.urls
+if settings.ASYNC_READ_VIEWS:
+    routes = wrap_patterns(routes, ASYNC_READS)
 
 app_name = "recipe"
-urlpatterns = [path("", include(router.urls))]
+urlpatterns = [path("", include(routes))]
@@ -1,10 +1,25 @@
 """
 Views for the Recipe API.
 """
+import os
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramSimilarity,
+)
+from django.db.models import Exists, F, FloatField, OuterRef, Q
+from django.db.models.functions import Cast, Upper
+from django.db import connection, transaction
+from django.http import HttpResponseNotModified
+from django.utils.translation import gettext as _
+from django.views import static
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 from drf_spectacular.utils import (
@@ -14,8 +29,21 @@ from drf_spectacular.utils import (
     OpenApiTypes
 )
 
+from core import storage
+from core.asgi import StreamingResponse
 from core.models import *
 from recipe.serializers import *
+from recipe import export, images, uploads
+from recipe.bulk import RecipeBulkWriter
+from recipe.pagination import RecipeCursorPagination, NameCursorPagination
+from recipe.mixins import (
+    CachedListModelMixin,
+    CachedRetrieveModelMixin,
+    ConditionalListModelMixin,
+    ConditionalRetrieveModelMixin,
+    ReplicaReadMixin,
+)
+from user.authentication import CachedTokenAuthentication
 
 @extend_schema_view(
     list=extend_schema(
@@ -29,17 +57,73 @@ from recipe.serializers import *
                 'ingredients',
                 OpenApiTypes.STR,
                 description='csv of ingredients'
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='full-text search over titles and descriptions, '
+                            'results are ordered by relevance'
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                description='whether recipes need any (default) or all '
+                            'of the listed tags and ingredients, all takes '
+                            'at most 10 names of each',
+                enum=['any', 'all']
             )
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(
+    ReplicaReadMixin,
+    ConditionalListModelMixin,
+    ConditionalRetrieveModelMixin,
+    CachedListModelMixin,
+    CachedRetrieveModelMixin,
+    viewsets.ModelViewSet,
+):
     """Defines basic views for the recipe endpoint."""
 
-    queryset = Recipe.objects.all()
+    # the search vector is only ever read by the database.
+    queryset = Recipe.objects.defer('search_vector')
     serializer_class = RecipeDetailSerializer
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    max_bulk_size = 500
+    export_chunk_size = 1000
+    # match=all adds a semi-join per name.
+    max_match_all_names = 10
+
+    def _filter_related(self, queryset, relation, names):
+        """
+        keeps recipes linked to the named tags or ingredients.
+        each filter is an EXISTS semi-join against the through table,
+        so recipes never multiply and no DISTINCT is needed.
+        """
+        through = getattr(Recipe, relation).through
+        target = Recipe._meta.get_field(relation).m2m_reverse_field_name()
+        links = through.objects.filter(
+            recipe=OuterRef('pk'), **{f'{target}__user': self.request.user}
+        )
+
+        if self.request.query_params.get('match') == 'all':
+            names = set(names)
+            if len(names) > self.max_match_all_names:
+                raise ValidationError({
+                    relation: _('at most %d names with match=all.')
+                    % self.max_match_all_names
+                })
+            for name in names:
+                queryset = queryset.filter(
+                    Exists(links.filter(**{f'{target}__name': name}))
+                )
+            return queryset
+
+        return queryset.filter(
+            Exists(links.filter(**{f'{target}__name__in': names}))
+        )
 
     def get_queryset(self):
         """
@@ -49,20 +133,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         tags = self.request.query_params.get('tags')
         ingredients = self.request.query_params.get('ingredients')
+        search = self.request.query_params.get('search')
+        match = self.request.query_params.get('match', 'any')
         queryset = self.queryset
 
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': _('must be either any or all.')})
+
         if tags:
             tag_names = tags.split(',')
-            queryset = queryset.filter(tags__name__in=tag_names)
+            queryset = self._filter_related(queryset, 'tags', tag_names)
 
         if ingredients:
             ingredient_names = ingredients.split(',')
-            queryset = queryset.filter(ingredients__name__in=ingredient_names)
-        
-        return queryset.filter(
+            queryset = self._filter_related(
+                queryset, 'ingredients', ingredient_names
+            )
+
+        if search:
+            query = SearchQuery(search, config='english', search_type='websearch')
+            # cast to double precision so the rank survives the round trip
+            # through the pagination cursor exactly.
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+            )
+
+        queryset = queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
-        
+        ).order_by('-id')
+
+        # the nested tags and ingredients would otherwise cost
+        # two extra queries per recipe, prefetching loads them
+        # in a fixed number of queries no matter how many recipes.
+        if self.action in ("list", "retrieve", "update", "partial_update"):
+            queryset = queryset.prefetch_related("tags", "ingredients")
+
+        return queryset
 
     def get_serializer_class(self):
         """returns the needed serializer by default uses the one with description."""
@@ -70,6 +176,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeSerializer
         elif self.action == 'upload_image':
             return RecipeImageSerializer
+        elif self.action == 'start_upload':
+            return UploadSessionSerializer
 
         return self.serializer_class
     
@@ -82,16 +190,189 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            # identical images share a file, and a new image has no
+            # renditions until a worker made them after the commit.
+            image = serializer.validated_data['image']
+            images.set_image(recipe, image, image.name)
+            return Response(
+                self.get_serializer(recipe).data, status=status.HTTP_200_OK
+            )
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['POST'], detail=True, url_path='uploads')
+    def start_upload(self, request, pk=None):
+        """
+        starts a resumable upload of the recipe image, the bytes are
+        then sent to the returned upload in chunks, see ImageUploadViewSet.
+        """
+        recipe = self.get_object()
+        uploads.purge_expired()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user, recipe=recipe)
+
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @extend_schema(
+        request=RecipeDetailSerializer(many=True),
+        parameters=[
+            OpenApiParameter(
+                'atomic',
+                OpenApiTypes.BOOL,
+                description='write nothing when any recipe is invalid'
+            )
+        ]
+    )
+    @action(methods=['POST'], detail=False)
+    def bulk(self, request):
+        """
+        creates or updates a batch of recipes, items with an id are
+        partial updates. every item gets its own status and either its
+        data or its errors, see recipe.bulk for how they are written.
+        """
+        if not isinstance(request.data, list):
+            raise ValidationError(_('Expected a list of recipes.'))
+        if len(request.data) > self.max_bulk_size:
+            raise ValidationError(
+                _('At most %(size)d recipes per batch.') % {'size': self.max_bulk_size}
+            )
+
+        atomic = request.query_params.get('atomic', '').lower() in ('1', 'true')
+        writer = RecipeBulkWriter(
+            request.user, RecipeDetailSerializer, self.get_serializer_context()
+        )
+        items = writer.validate(request.data)
+        failed = any(not item.valid for item in items)
+
+        if atomic and failed:
+            for item in items:
+                if item.valid:
+                    item.status = status.HTTP_424_FAILED_DEPENDENCY
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            writer.save(items)
+            response_status = (
+                status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK
+            )
+
+        saved = self.queryset.filter(
+            user=request.user,
+            pk__in=[
+                item.instance.pk
+                for item in items
+                if item.status in (status.HTTP_200_OK, status.HTTP_201_CREATED)
+            ],
+        ).prefetch_related('tags', 'ingredients').in_bulk()
+
+        context = self.get_serializer_context()
+        results = []
+        for item in items:
+            result = {'index': item.index, 'status': item.status}
+            if not item.valid:
+                result['errors'] = item.errors
+            elif item.instance is not None and item.instance.pk in saved:
+                result['data'] = RecipeDetailSerializer(
+                    saved[item.instance.pk], context=context
+                ).data
+            results.append(result)
+
+        return Response({'results': results}, status=response_status)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'type',
+                OpenApiTypes.STR,
+                description='file type of the export',
+                enum=list(export.FORMATS)
+            )
+        ],
+        responses={(200, 'application/x-ndjson'): OpenApiTypes.STR}
+    )
+    @action(methods=['GET'], detail=False)
+    def export(self, request):
+        """
+        streams every recipe of the user, the list filters apply.
+        see recipe.export for how memory is kept flat.
+        """
+        file_type = request.query_params.get('type', 'ndjson')
+        if file_type not in export.FORMATS:
+            raise ValidationError(
+                {'type': _('must be one of %s.') % ', '.join(export.FORMATS)}
+            )
+
+        encode, content_type = export.FORMATS[file_type]
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingResponse(
+            export.ExportStream(encode(queryset, self.export_chunk_size)),
+            content_type=content_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{file_type}"'
+        )
+        return response
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
 
+class AutocompleteMixin:
+    """adds a type-ahead lookup over the names of the user's objects."""
+
+    autocomplete_limit = 10
+    max_autocomplete_limit = 25
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                required=True,
+                description='the text typed so far'
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='number of suggestions, at most 25'
+            )
+        ]
+    )
+    @action(methods=['GET'], detail=False)
+    def autocomplete(self, request):
+        """
+        suggests names that start with or closely resemble the text.
+        both matches are served by the trigram index on upper(name)
+        and the best matches come first.
+        """
+        term = request.query_params.get('q', '').strip()
+        try:
+            limit = int(request.query_params.get('limit', self.autocomplete_limit))
+        except ValueError:
+            raise ValidationError({'limit': _('must be a number.')})
+        limit = max(1, min(limit, self.max_autocomplete_limit))
+
+        if not term:
+            return Response([])
+
+        queryset = self.get_queryset().annotate(
+            upper_name=Upper('name')
+        ).filter(
+            Q(upper_name__startswith=term.upper()) |
+            Q(upper_name__trigram_similar=term.upper())
+        ).annotate(
+            similarity=TrigramSimilarity('name', term)
+        ).order_by('-similarity', 'name')[:limit]
+
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
 class TagViewSet(
+    ReplicaReadMixin,
+    AutocompleteMixin,
+    ConditionalListModelMixin,
+    CachedListModelMixin,
     mixins.ListModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -101,8 +382,9 @@ class TagViewSet(
 
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = NameCursorPagination
 
     def get_queryset(self):
         """
@@ -113,6 +395,10 @@ class TagViewSet(
 
 
 class IngredientViewSet(
+    ReplicaReadMixin,
+    AutocompleteMixin,
+    ConditionalListModelMixin,
+    CachedListModelMixin,
     mixins.ListModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -122,8 +408,9 @@ class IngredientViewSet(
 
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = NameCursorPagination
 
     def get_queryset(self):
         """
@@ -131,3 +418,133 @@ class IngredientViewSet(
         to only list ingredients related to the user.
         """
         return self.queryset.filter(user=self.request.user).order_by("-name")
+
+
+class ImageUploadViewSet(
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Receives the chunks of resumable image uploads.
+    GET returns the offset to continue from, PUT sends the bytes from
+    that offset on and DELETE abandons the upload.
+    """
+
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """only the uploads of the authenticated user."""
+        return self.queryset.filter(user=self.request.user)
+
+    @extend_schema(
+        request={'application/octet-stream': OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                'Content-Range',
+                OpenApiTypes.STR,
+                OpenApiParameter.HEADER,
+                required=True,
+                description='bytes start-end/size of the chunk, end included'
+            )
+        ],
+        responses={
+            200: RecipeImageSerializer,
+            202: UploadSessionSerializer,
+            409: UploadSessionSerializer,
+        }
+    )
+    def update(self, request, pk=None):
+        """
+        writes a chunk of the file. answers 202 with the new offset
+        while bytes are missing, 409 with the offset when the chunk
+        doesn't start at it, and 200 with the recipe image once the
+        upload is complete.
+        the chunk streams in with nothing locked and without a database
+        connection, a slow client would otherwise keep a row lock and one
+        of the pooled connections for the whole transfer. the upload is
+        only locked to append the chunk and move the offset, so parallel
+        requests for it can't interleave.
+        """
+        session = get_object_or_404(self.get_queryset(), pk=pk)
+        try:
+            start, length = uploads.parse_content_range(
+                request.headers.get('Content-Range'), session.size
+            )
+        except uploads.UploadError as exc:
+            raise ValidationError({'detail': str(exc)})
+
+        if start != session.received:
+            return Response(
+                self.get_serializer(session).data,
+                status=status.HTTP_409_CONFLICT
+            )
+
+        chunk, written = None, 0
+        if request.stream is not None:
+            if not connection.in_atomic_block:
+                # hands the connection back to the pool, see core.db.
+                connection.close()
+            chunk, written = uploads.receive_chunk(session, request.stream, length)
+
+        try:
+            with transaction.atomic():
+                session = get_object_or_404(
+                    self.get_queryset().select_for_update(), pk=pk
+                )
+                # another request for the upload got in meanwhile.
+                if start != session.received:
+                    return Response(
+                        self.get_serializer(session).data,
+                        status=status.HTTP_409_CONFLICT
+                    )
+
+                if written:
+                    uploads.write_chunk(session, chunk, start)
+                session.received = start + written
+                session.save()
+                if session.received < session.size:
+                    return Response(
+                        self.get_serializer(session).data,
+                        status=status.HTTP_202_ACCEPTED
+                    )
+
+                # a failed upload is still deleted, so the error is returned
+                # rather than raised out of the transaction.
+                try:
+                    recipe = uploads.finish(session)
+                except uploads.UploadError as exc:
+                    return Response(
+                        {'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+                    )
+        finally:
+            if chunk is not None:
+                uploads.discard(chunk)
+
+        serializer = RecipeImageSerializer(
+            recipe, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+def serve_image(request, path):
+    """
+    serves a content addressed image, see core.storage.
+    the name changes whenever the content does, so clients and proxies
+    can keep it for good, and the hash in it is the ETag.
+    """
+    etag = f'"{os.path.splitext(os.path.basename(path))[0]}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponseNotModified()
+    else:
+        response = static.serve(
+            request,
+            path,
+            document_root=os.path.join(settings.MEDIA_ROOT, storage.PREFIX)
+        )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
@@ -0,0 +1,149 @@
+"""
+Authentication classes for the API.
+
+CachedTokenAuthentication is a drop-in replacement for DRF's
+TokenAuthentication that keeps the token to user lookup in the cache,
+so an authenticated request doesn't have to join Token and User.
+the cache has two levels, token key -> user id and user id -> user,
+so a change to a user only has to drop one entry, see user.signals.
+the password hash is never cached, only its fingerprint, a cached
+user comes back with the password deferred. hits and misses are
+counted in core.metrics.
+
+signed access tokens (see user.tokens) are accepted under the same
+keyword and only need the cached user, legacy keys still work.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core import metrics
+from user import tokens
+
+TOKEN_KEY = "auth:token:{key}"
+USER_KEY = "auth:user:{user_id}"
+
+
+def get_cache():
+    """returns the configured cache backend."""
+    return caches[settings.AUTH_CACHE_ALIAS]
+
+
+def _delete(key):
+    """
+    drops a cache entry right away and again once the transaction
+    commits, so a request reading the old row in between can't put
+    it back.
+    """
+    cache = get_cache()
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidate_token(key):
+    """drops a cached token."""
+    _delete(TOKEN_KEY.format(key=key))
+
+
+def invalidate_user(user_id):
+    """drops a cached user, every token pointing to it is reloaded."""
+    _delete(USER_KEY.format(user_id=user_id))
+
+
+def _user_fields():
+    """returns the user fields that are cached."""
+    return [
+        field.attname
+        for field in get_user_model()._meta.concrete_fields
+        if field.attname != "password"
+    ]
+
+
+def _cached(user):
+    """returns the cache entry of a user, without the password hash."""
+    return {
+        "fields": [getattr(user, name) for name in _user_fields()],
+        "fp": tokens.fingerprint(user),
+    }
+
+
+def _restore(entry):
+    """returns the user and fingerprint of a cache entry."""
+    user = get_user_model().from_db(DEFAULT_DB_ALIAS, _user_fields(), entry["fields"])
+    return user, entry["fp"]
+
+
+def _count(result):
+    """counts a cache hit or miss of the user lookup."""
+    metrics.AUTH_CACHE_LOOKUPS.labels(result).inc()
+
+
+def get_user(user_id):
+    """
+    returns an active user and the fingerprint of its password from
+    the cache or the database, (None, None) when there is none.
+    """
+    cache = get_cache()
+    key = USER_KEY.format(user_id=user_id)
+    entry = cache.get(key)
+    if entry is not None:
+        _count("hit")
+        return _restore(entry)
+
+    _count("miss")
+    user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+    if user is None:
+        return None, None
+
+    cache.set(key, _cached(user), settings.AUTH_CACHE_TIMEOUT)
+    return user, tokens.fingerprint(user)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """token authentication backed by the cache."""
+
+    def authenticate_credentials(self, key):
+        if tokens.is_signed(key):
+            return self._signed_credentials(key)
+
+        return self._legacy_credentials(key)
+
+    def _signed_credentials(self, key):
+        try:
+            payload = tokens.decode(key, tokens.ACCESS)
+        except tokens.InvalidToken:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        user, fingerprint = get_user(payload["uid"])
+        if user is None or not user.is_active or fingerprint != payload["fp"]:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        return (user, payload)
+
+    def _legacy_credentials(self, key):
+        cache = get_cache()
+        user_id = cache.get(TOKEN_KEY.format(key=key))
+        if user_id is not None:
+            entry = cache.get(USER_KEY.format(user_id=user_id))
+            if entry is not None:
+                user = _restore(entry)[0]
+                if user.is_active:
+                    _count("hit")
+                    return (user, self.get_model()(key=key, user=user))
+
+        _count("miss")
+        user, token = super().authenticate_credentials(key)
+        timeout = settings.AUTH_CACHE_TIMEOUT
+        cache.set_many(
+            {
+                TOKEN_KEY.format(key=token.key): user.pk,
+                USER_KEY.format(user_id=user.pk): _cached(user),
+            },
+            timeout,
+        )
+
+        return (user, token)
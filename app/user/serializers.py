@@ -5,6 +5,9 @@ from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from user import tokens
+from user.authentication import get_user
+
 
 class UserSerializer(serializers.ModelSerializer):
     """serializer for the user object."""
@@ -54,3 +57,42 @@ class AuthTokenSerializer(serializers.Serializer):
 
         attrs["user"] = user
         return attrs
+
+
+class RefreshTokenSerializer(serializers.Serializer):
+    """serializer for exchanging a refresh token."""
+
+    refresh = serializers.CharField(trim_whitespace=False)
+
+    def validate(self, attrs):
+        """checks the refresh token and resolves its user."""
+        msg = _("Invalid or expired refresh token.")
+        try:
+            payload = tokens.decode(attrs["refresh"], tokens.REFRESH)
+        except tokens.InvalidToken:
+            raise serializers.ValidationError(msg, code="authorization")
+
+        user, fingerprint = get_user(payload["uid"])
+        if user is None or fingerprint != payload["fp"]:
+            raise serializers.ValidationError(msg, code="authorization")
+
+        attrs["payload"] = payload
+        attrs["user"] = user
+        return attrs
+
+
+class RevokeTokenSerializer(serializers.Serializer):
+    """serializer for revoking an access or a refresh token."""
+
+    token = serializers.CharField(trim_whitespace=False)
+
+    def validate(self, attrs):
+        """decodes the token, whichever type it is."""
+        for token_type in (tokens.ACCESS, tokens.REFRESH):
+            try:
+                attrs["payload"] = tokens.decode(attrs["token"], token_type)
+                return attrs
+            except tokens.InvalidToken:
+                continue
+
+        raise serializers.ValidationError(_("Invalid or expired token."))
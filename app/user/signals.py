@@ -0,0 +1,25 @@
+"""
+Signal handlers for the User API.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import invalidate_token, invalidate_user
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """stops a deleted token from authenticating from the cache."""
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_changed_user(sender, instance, **kwargs):
+    """
+    reloads a user on its next request after any change, this covers
+    password and is_active changes made through save().
+    """
+    invalidate_user(instance.pk)
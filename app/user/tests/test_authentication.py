@@ -0,0 +1,118 @@
+"""
+Tests the cached token authentication.
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import USER_KEY, get_cache
+
+ME_URL = reverse("user:me")
+RECIPE_URL = reverse("recipe:recipe-list")
+
+
+def lookups(result):
+    """returns how often the user lookup hit or missed the cache."""
+    return REGISTRY.get_sample_value(
+        "auth_cache_lookups_total", {"result": result}
+    ) or 0
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Tests tokens are served from the cache and invalidated."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.hits, self.misses = lookups("hit"), lookups("miss")
+        self.user = get_user_model().objects.create_user(
+            email="auth@example.com", name="auth", password="testpass123"
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def test_repeated_requests_hit_cache(self):
+        """tests only the first request looks the token up."""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data["email"], self.user.email)
+        self.assertEqual(lookups("hit") - self.hits, 1)
+        self.assertEqual(lookups("miss") - self.misses, 1)
+
+    def test_password_hash_not_cached(self):
+        """tests the cache holds no password hash and saving keeps it."""
+        self.client.get(ME_URL)
+
+        cached = get_cache().get(USER_KEY.format(user_id=self.user.pk))
+        self.assertNotIn(self.user.password, str(cached))
+        res = self.client.patch(ME_URL, {"name": "renamed"})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, "renamed")
+        self.assertTrue(self.user.check_password("testpass123"))
+
+    def test_cache_used_by_recipe_views(self):
+        """tests the recipe views authenticate from the cache."""
+        self.client.get(RECIPE_URL)
+
+        self.assertEqual(self.client.get(RECIPE_URL).status_code, status.HTTP_200_OK)
+        self.assertEqual(lookups("hit") - self.hits, 1)
+
+    def test_invalid_token_rejected(self):
+        """tests unknown tokens are still rejected."""
+        self.client.credentials(HTTP_AUTHORIZATION="Token invalid")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        """tests deleting a token stops it from authenticating."""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """tests deactivating a user stops its token at once."""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_reloads_user(self):
+        """tests a password change isn't hidden by the cached user."""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {"password": "newpass123"})
+        self.client.get(ME_URL)
+
+        self.assertEqual(lookups("miss") - self.misses, 2)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password("newpass123"))
+
+    def test_profile_change_visible(self):
+        """tests the cached user doesn't serve a stale profile."""
+        self.client.get(ME_URL)
+
+        user = get_user_model().objects.get(pk=self.user.pk)
+        user.name = "renamed"
+        user.save()
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["name"], "renamed")
@@ -0,0 +1,172 @@
+"""
+Tests the signed access and refresh tokens.
+"""
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import RevokedToken
+from user import tokens
+from user.authentication import get_cache
+
+TOKEN_URL = reverse("user:token")
+REFRESH_URL = reverse("user:token-refresh")
+REVOKE_URL = reverse("user:token-revoke")
+ME_URL = reverse("user:me")
+
+
+class SignedTokenTests(TestCase):
+    """Tests issuing, refreshing and revoking signed tokens."""
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = get_user_model().objects.create_user(
+            email="tokens@example.com", name="tokens", password="testpass123"
+        )
+        self.client = APIClient()
+
+    def _obtain(self):
+        res = self.client.post(
+            TOKEN_URL, {"email": "tokens@example.com", "password": "testpass123"}
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data
+
+    def _me(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {access}")
+        res = self.client.get(ME_URL)
+        self.client.credentials()
+        return res
+
+    def test_obtain_pair(self):
+        """tests the token endpoint issues a pair without writing rows."""
+        data = self._obtain()
+
+        self.assertEqual(set(data), {"token", "refresh", "expires_in"})
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(self._me(data["token"]).status_code, status.HTTP_200_OK)
+
+    def test_access_needs_no_queries(self):
+        """tests a signed token authenticates without the database."""
+        access = self._obtain()["token"]
+        self._me(access)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {access}")
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["email"], self.user.email)
+
+    def test_expired_access_rejected(self):
+        """tests access tokens stop working after their lifetime."""
+        access = self._obtain()["token"]
+
+        with override_settings(ACCESS_TOKEN_LIFETIME=-1):
+            res = self._me(access)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_tampered_access_rejected(self):
+        """tests altered tokens are rejected."""
+        access = self._obtain()["token"]
+
+        res = self._me(access[:-1] + ("A" if access[-1] != "A" else "B"))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_token_not_accepted_as_access(self):
+        """tests refresh tokens can't authenticate requests."""
+        refresh = self._obtain()["refresh"]
+
+        self.assertEqual(self._me(refresh).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_invalidates_tokens(self):
+        """tests changing the password invalidates issued tokens."""
+        data = self._obtain()
+
+        self.user.set_password("changed123")
+        self.user.save()
+
+        self.assertEqual(
+            self._me(data["token"]).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        res = self.client.post(REFRESH_URL, {"refresh": data["refresh"]})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_refresh_rotates(self):
+        """tests a refresh token gives a new pair and can't be reused."""
+        refresh = self._obtain()["refresh"]
+
+        res = self.client.post(REFRESH_URL, {"refresh": refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res.data["refresh"], refresh)
+        self.assertEqual(self._me(res.data["token"]).status_code, status.HTTP_200_OK)
+        res = self.client.post(REFRESH_URL, {"refresh": refresh})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reused_refresh_in_flight_rejected(self):
+        """tests a refresh racing with its own rotation fails."""
+        refresh = self._obtain()["refresh"]
+        payload = tokens.decode(refresh, tokens.REFRESH)
+        RevokedToken.objects.create(jti=payload["jti"], expires_at="2999-01-01T00:00Z")
+
+        with mock.patch.object(tokens, "is_revoked", return_value=False):
+            res = self.client.post(REFRESH_URL, {"refresh": refresh})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_revoke_access(self):
+        """tests a revoked access token stops working at once."""
+        access = self._obtain()["token"]
+        self._me(access)
+
+        res = self.client.post(REVOKE_URL, {"token": access})
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self._me(access).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocation_checked_per_token(self):
+        """tests a checked token is answered from the cache."""
+        access = self._obtain()["token"]
+        payload = tokens.decode(access, tokens.ACCESS)
+        RevokedToken.objects.create(jti="other", expires_at="2999-01-01T00:00Z")
+
+        with self.assertNumQueries(0):
+            self.assertFalse(tokens.is_revoked(payload))
+
+    def test_revocation_expires_with_token(self):
+        """tests a revocation is kept until the token's own expiry."""
+        access = self._obtain()["token"]
+        payload = tokens.decode(access, tokens.ACCESS)
+
+        self.client.post(REVOKE_URL, {"token": access})
+
+        revoked = RevokedToken.objects.get(jti=payload["jti"])
+        self.assertEqual(revoked.expires_at.timestamp(), payload["exp"])
+
+    def test_revoke_keeps_expired_revocations(self):
+        """tests revoking doesn't purge rows, the command does."""
+        RevokedToken.objects.create(jti="old", expires_at="2000-01-01T00:00Z")
+        RevokedToken.objects.create(jti="new", expires_at="2999-01-01T00:00Z")
+
+        self.client.post(REVOKE_URL, {"token": self._obtain()["token"]})
+        self.assertTrue(RevokedToken.objects.filter(jti="old").exists())
+        call_command("purge_revoked_tokens", stdout=StringIO())
+
+        self.assertFalse(RevokedToken.objects.filter(jti="old").exists())
+        self.assertTrue(RevokedToken.objects.filter(jti="new").exists())
+
+    def test_legacy_tokens_still_accepted(self):
+        """tests existing DRF tokens keep working."""
+        token = Token.objects.create(user=self.user)
+
+        self.assertEqual(self._me(token.key).status_code, status.HTTP_200_OK)
@@ -0,0 +1,155 @@
+"""
+Signed, expiring access and refresh tokens.
+
+tokens are signed with django.core.signing so they can be verified
+without touching the database. each token carries the user id, its
+type, a unique id (jti), its expiry (exp) and a fingerprint of the
+password hash, so changing the password invalidates every token
+issued before.
+revoked tokens are kept in core.RevokedToken until they expire, the
+purge_revoked_tokens command deletes them afterwards. whether a token
+is revoked is cached per jti until the token expires, so checking
+costs one cache read however many tokens were revoked.
+"""
+import hashlib
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import RevokedToken
+
+ACCESS = "access"
+REFRESH = "refresh"
+
+REVOKED_KEY = "auth:revoked:{jti}"
+
+
+class InvalidToken(Exception):
+    """raised when a token is malformed, expired, or revoked."""
+
+
+def get_cache():
+    """returns the cache shared with the token authentication."""
+    return caches[settings.AUTH_CACHE_ALIAS]
+
+
+def _lifetime(token_type):
+    """returns how many seconds a token type is valid."""
+    if token_type == ACCESS:
+        return settings.ACCESS_TOKEN_LIFETIME
+
+    return settings.REFRESH_TOKEN_LIFETIME
+
+
+def _salt(token_type):
+    return f"user.tokens.{token_type}"
+
+
+def fingerprint(user):
+    """returns a short digest of the user's password hash."""
+    return hashlib.sha256(user.password.encode()).hexdigest()[:16]
+
+
+def is_signed(key):
+    """tells signed tokens apart from legacy DRF token keys."""
+    return signing.Signer().sep in key
+
+
+def issue(user, token_type):
+    """returns a new signed token of the given type for the user."""
+    payload = {
+        "uid": user.pk,
+        "typ": token_type,
+        "jti": uuid.uuid4().hex,
+        "exp": int(time.time()) + _lifetime(token_type),
+        "fp": fingerprint(user),
+    }
+    return signing.dumps(payload, salt=_salt(token_type), compress=True)
+
+
+def issue_pair(user):
+    """returns the response body of a newly issued token pair."""
+    return {
+        "token": issue(user, ACCESS),
+        "refresh": issue(user, REFRESH),
+        "expires_in": settings.ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def decode(token, token_type):
+    """
+    returns the payload of a token after checking its signature,
+    age and revocation, the user fingerprint is checked by the caller.
+    """
+    try:
+        payload = signing.loads(
+            token, salt=_salt(token_type), max_age=_lifetime(token_type)
+        )
+    except signing.BadSignature as exc:
+        raise InvalidToken(str(exc)) from exc
+
+    if is_revoked(payload):
+        raise InvalidToken("Token has been revoked.")
+
+    return payload
+
+
+def expires_at(payload):
+    """returns when a decoded token expires."""
+    if "exp" in payload:
+        return datetime.fromtimestamp(payload["exp"], dt_timezone.utc)
+
+    # tokens issued before exp was added expire by their lifetime.
+    return timezone.now() + timedelta(seconds=_lifetime(payload["typ"]))
+
+
+def _remaining(payload):
+    """returns the seconds a decoded token is still valid, at least one."""
+    return max(1, int((expires_at(payload) - timezone.now()).total_seconds()))
+
+
+def is_revoked(payload):
+    """
+    tells whether a decoded token was revoked. the answer is cached
+    until the token expires, so only the first check of a token
+    reads the database.
+    """
+    cache = get_cache()
+    key = REVOKED_KEY.format(jti=payload["jti"])
+    revoked = cache.get(key)
+    if revoked is None:
+        revoked = RevokedToken.objects.filter(jti=payload["jti"]).exists()
+        # add doesn't overwrite a revocation cached meanwhile.
+        cache.add(key, revoked, _remaining(payload))
+
+    return revoked
+
+
+def revoke(payload):
+    """
+    revokes a decoded token until it would have expired, returns
+    False when it already was.
+    the cached answer is dropped right away and the revocation cached
+    once it's committed, so a rolled back revocation isn't cached.
+    """
+    _, created = RevokedToken.objects.get_or_create(
+        jti=payload["jti"], defaults={"expires_at": expires_at(payload)}
+    )
+    key = REVOKED_KEY.format(jti=payload["jti"])
+    get_cache().delete(key)
+    transaction.on_commit(
+        lambda: get_cache().set(key, True, _remaining(payload))
+    )
+    return created
+
+
+def purge_expired():
+    """deletes the revocations of tokens that expired anyway."""
+    deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -10,5 +10,7 @@ app_name = "user"
 urlpatterns = [
     path("create/", CreateUserView.as_view(), name="create"),
     path("token/", CreateTokenView.as_view(), name="token"),
+    path("token/refresh/", RefreshTokenView.as_view(), name="token-refresh"),
+    path("token/revoke/", RevokeTokenView.as_view(), name="token-revoke"),
     path("me/", ManageUserView.as_view(), name="me"),
 ]
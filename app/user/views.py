@@ -1,9 +1,14 @@
 """
 Views for the user API.
 """
-from rest_framework import generics, authentication, permissions
+from django.db import transaction
+from django.utils.translation import gettext as _
+from rest_framework import exceptions, generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from user import tokens
+from user.authentication import CachedTokenAuthentication
 from user.serializers import *
 
 
@@ -18,17 +23,55 @@ class CreateUserView(generics.CreateAPIView):
 
 
 class CreateTokenView(ObtainAuthToken):
-    """create a new auth token for user."""
+    """
+    issues a signed access token and a refresh token for the user,
+    nothing is written to the database.
+    """
 
     serializer_class = AuthTokenSerializer
     renderer_classses = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(tokens.issue_pair(serializer.validated_data["user"]))
+
+
+class RefreshTokenView(CreateTokenView):
+    """
+    exchanges a refresh token for a new token pair, the refresh
+    token is rotated so each one can only be used once.
+    """
+
+    serializer_class = RefreshTokenSerializer
+
+    @transaction.atomic
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if not tokens.revoke(serializer.validated_data["payload"]):
+            raise exceptions.ValidationError(_("Refresh token already used."))
+
+        return Response(tokens.issue_pair(serializer.validated_data["user"]))
+
+
+class RevokeTokenView(CreateTokenView):
+    """revokes an access or a refresh token before it expires."""
+
+    serializer_class = RevokeTokenSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tokens.revoke(serializer.validated_data["payload"])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """manages the authenticated user."""
 
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permissions_classes = [permissions.IsAuthenticated]
 
     def get_object(self):